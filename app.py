@@ -1,8 +1,18 @@
+import os
+import tempfile
+from functools import partial
+
 import streamlit as st
-import copy
 from site_class_reference import render_site_class_table
-from backend import calculate_site_class
-from report_generator import generate_site_class_report
+from depth_profile import DepthProfile
+from result_cache import shared_cache, canonical_site_key
+from result_store import ResultStore
+from high_resolution import read_profile
+from profile_chart import step_series, downsample_minmax, vs_profile_chart
+from report_jobs import report_jobs, DONE, FAILED, UNKNOWN
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_MIME = "application/zip"
 
 st.markdown("""
     <style>
@@ -15,177 +25,486 @@ st.markdown("""
 st.set_page_config(layout="wide")
 st.title("Site Class Determination - IS 1893 : 2025",anchor=False)
 
+
+@st.cache_resource
+def persistent_store():
+    # One store per server process; results and reports
+    # outlive the session that computed them
+    return ResultStore()
+
+
+shared_cache.store = persistent_store()
+
 # -------------------------
 # TOP INPUTS
 # -------------------------
 
+TABLE_MODE = "Layer table"
+PROFILE_MODE = "High-resolution profile (CPT / MASW)"
+PROJECT_MODE = "Project reports (many boreholes)"
+
+input_mode = st.radio(
+    "Input",
+    [TABLE_MODE, PROFILE_MODE, PROJECT_MODE],
+    horizontal=True,
+    label_visibility="collapsed"
+)
+
 col1, col2  = st.columns(2,vertical_alignment='bottom',gap='large')
 
 with col1:
-    depth = st.number_input(
-        "Depth of Influence (m)",
-        min_value=1.0,
-        value=1.0,
-        step=0.1
-    )
+    if input_mode != PROJECT_MODE:
+        depth = st.number_input(
+            "Depth of Influence (m)",
+            min_value=1.0,
+            value=1.0,
+            step=0.1
+        )
+        vs_curve_slot = st.empty()
 
 with col2:
-    num_layers = st.number_input(
-        "Number of Soil Layers",
-        min_value=1,
-        max_value=20,
-        value=1,
-        step=1
-    )
+    if input_mode == TABLE_MODE:
+        num_layers = st.number_input(
+            "Number of Soil Layers",
+            min_value=1,
+            max_value=20,
+            value=1,
+            step=1
+        )
+    elif input_mode == PROFILE_MODE:
+        profile_file = st.file_uploader(
+            "Profile file: depth or thickness and Vs per interval, "
+            "optionally soil type, fines and N1",
+            type=["csv", "txt", "xlsx"]
+        )
+    else:
+        project_file = st.file_uploader(
+            "Borehole logs: NDJSON, long-format CSV or workbook, "
+            "each site with its own depth of influence",
+            type=["ndjson", "jsonl", "json", "csv", "xlsx"]
+        )
 
 
 st.divider()
 
-# -------------------------
-# SESSION INITIALIZATION
-# -------------------------
+def table_layer(i, row):
+    # Layer dict of one widget row, as site_data holds it
+    return {
+        "layer": i + 1,
+        "thickness": float(row["thickness"]),
+        "soil_type": row["soil_type"],
+        "fines_less_than_15": row["fines"],
+        "n1": int(row["n_value"]),
+        "vsi": float(row["vs_value"])
+    }
 
-if "layers_input" not in st.session_state:
-    st.session_state.layers_input = []
-
-# Resize safely if layer count changes
-if len(st.session_state.layers_input) != int(num_layers):
-    st.session_state.layers_input = [
-        {
-            "thickness": 1.0,
-            "soil_type": "Saturated Sands",
-            "fines": "Yes",
-            "n_value": 10,
-            "vs_value": 180.0
-        }
-        for _ in range(int(num_layers))
-    ]
 
-    st.session_state.pop("calculation_result", None)
-    st.session_state.pop("report_file", None)
-    st.session_state.pop("last_calculated_input", None)
+def layer_table_inputs(num_layers):
+    """
+    Widget table with one row per layer. Keeps the layer dicts
+    and their total thickness in session state, rebuilding only
+    the rows that changed. Returns the changed row indices and
+    whether the table was reset.
+    """
+
+    # -------------------------
+    # SESSION INITIALIZATION
+    # -------------------------
+
+    if "layers_input" not in st.session_state:
+        st.session_state.layers_input = []
+
+    # Resize safely if layer count changes
+    if len(st.session_state.layers_input) != int(num_layers):
+        st.session_state.layers_input = [
+            {
+                "thickness": 1.0,
+                "soil_type": "Saturated Sands",
+                "fines": "Yes",
+                "n_value": 10,
+                "vs_value": 180.0
+            }
+            for _ in range(int(num_layers))
+        ]
+        st.session_state.table_layers = [
+            table_layer(i, row)
+            for i, row in enumerate(st.session_state.layers_input)
+        ]
+        st.session_state.table_total = sum(
+            layer["thickness"] for layer in st.session_state.table_layers
+        )
+        reset = True
 
-# -------------------------
-# TABLE HEADER
-# -------------------------
+        st.session_state.pop("calculation_result", None)
+        st.session_state.pop("report_job", None)
+        st.session_state.pop("last_calculated_key", None)
+    else:
+        reset = False
+
+    changed = []
+
+    # -------------------------
+    # TABLE HEADER
+    # -------------------------
+
+    header = st.columns([1,1,2,1,1,1])
+    header[0].markdown("**Layer**")
+    header[1].markdown("**Thickness (m)**")
+    header[2].markdown("**Soil Type**")
+    header[3].markdown("**Fines < 15%**")
+    header[4].markdown("**(N₁)₆₀**")
+    header[5].markdown("**Vₛᵢ (m/s)**")
+
+    # -------------------------
+    # DYNAMIC ROWS
+    # -------------------------
+
+    for i in range(int(num_layers)):
+
+        row = st.columns([1,1,2,1,1,1])
+        row[0].write(f"Layer {i+1}")
+
+        # Thickness (> 0)
+        thickness = row[1].number_input(
+            "Thickness",
+            min_value=0.00,
+            value=float(st.session_state.layers_input[i]["thickness"]),
+            step=0.1,
+            key=f"th_{i}",
+            label_visibility="collapsed"
+        )
 
-header = st.columns([1,1,2,1,1,1])
-header[0].markdown("**Layer**")
-header[1].markdown("**Thickness (m)**")
-header[2].markdown("**Soil Type**")
-header[3].markdown("**Fines < 15%**")
-header[4].markdown("**(N₁)₆₀**")
-header[5].markdown("**Vₛᵢ (m/s)**")
+        # Soil Type
+        soil_type = row[2].selectbox(
+            "Soil Type",
+            ["Saturated Sands", "Dry Sands", "Clays", "Others"],
+            index=["Saturated Sands", "Dry Sands", "Clays", "Others"]
+            .index(st.session_state.layers_input[i]["soil_type"]),
+            key=f"soil_{i}",
+            label_visibility="collapsed"
+        )
 
-# -------------------------
-# DYNAMIC ROWS
-# -------------------------
+        # Fines rule
+        disable_fines = soil_type in ["Clays", "Others"]
 
-for i in range(int(num_layers)):
+        fines = row[3].selectbox(
+            "Fines",
+            ["Yes", "No"],
+            key=f"fines_{i}",
+            disabled=disable_fines,
+            label_visibility="collapsed"
+        )
 
-    row = st.columns([1,1,2,1,1,1])
-    row[0].write(f"Layer {i+1}")
+        # N1 rule
+        disable_n = soil_type == "Others"
+
+        n_value = row[4].number_input(
+            "N1",
+            min_value=0,
+            step=1,
+            value=int(st.session_state.layers_input[i]["n_value"]),
+            key=f"n_{i}",
+            disabled=disable_n,
+            label_visibility="collapsed"
+        )
 
-    # Thickness (> 0)
-    thickness = row[1].number_input(
-        "Thickness",
-        min_value=0.00,
-        value=float(st.session_state.layers_input[i]["thickness"]),
-        step=0.1,
-        key=f"th_{i}",
-        label_visibility="collapsed"
-    )
+        # Vsi rule
+        if soil_type == "Others":
+            activate_vs = True
+        else:
+            activate_vs = n_value < 10
+
+        vs_value = row[5].number_input(
+            "Vsi",
+            min_value=0.00,
+            value=float(st.session_state.layers_input[i]["vs_value"]),
+            step=1.0,
+            key=f"vs_{i}",
+            disabled=not activate_vs,
+            label_visibility="collapsed"
+        )
 
-    # Soil Type
-    soil_type = row[2].selectbox(
-        "Soil Type",
-        ["Saturated Sands", "Dry Sands", "Clays", "Others"],
-        index=["Saturated Sands", "Dry Sands", "Clays", "Others"]
-        .index(st.session_state.layers_input[i]["soil_type"]),
-        key=f"soil_{i}",
-        label_visibility="collapsed"
+        # Update session state live, only for rows that changed
+        row_input = {
+            "thickness": thickness,
+            "soil_type": soil_type,
+            "fines": "" if disable_fines else fines,
+            "n_value": 0 if disable_n else n_value,
+            "vs_value": vs_value if activate_vs else 0.0
+        }
+        if row_input != st.session_state.layers_input[i]:
+            st.session_state.layers_input[i] = row_input
+            st.session_state.table_layers[i] = table_layer(i, row_input)
+            changed.append(i)
+
+    # Re-summed exactly rather than updated by differences, so
+    # the depth check sees the same total as the backend
+    if changed:
+        st.session_state.table_total = sum(
+            layer["thickness"] for layer in st.session_state.table_layers
+        )
+
+    return changed, reset
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def vs_curve_series(layers_key, _layers):
+    # Keyed on the layers alone, as the curve does not depend on
+    # the depth of influence; downsampled to the chart's resolution
+    profile = DepthProfile(_layers)
+    depths, vs, _ = profile.sweep(0.1, profile.total_thickness, 0.1)
+    keep = downsample_minmax(depths, vs)
+    return depths[keep], vs[keep]
+
+
+def draw_vs_curve(slot, layers):
+    """
+    Live weighted Vs against depth of influence, in slot.
+    Always writes to the slot, so a fragment keeps its place.
+    """
+
+    total_thickness = sum(layer["thickness"] for layer in layers)
+    if total_thickness <= 0:
+        slot.empty()
+        return
+
+    layers_key = canonical_site_key({"depth_of_influence": 0, "layers": layers})
+    try:
+        curve_depths, curve_vs = vs_curve_series(layers_key, layers)
+    except ValueError:
+        slot.empty()
+        return
+
+    slot.line_chart(
+        {"Depth of Influence (m)": curve_depths, "Vs (m/s)": curve_vs},
+        x="Depth of Influence (m)",
+        y="Vs (m/s)",
+        height=160
     )
 
-    # Fines rule
-    disable_fines = soil_type in ["Clays", "Others"]
 
-    fines = row[3].selectbox(
-        "Fines",
-        ["Yes", "No"],
-        key=f"fines_{i}",
-        disabled=disable_fines,
-        label_visibility="collapsed"
+@st.fragment
+def layer_editor(num_layers, depth, curve_slot):
+    """
+    The layer grid and the live curve. Editing a cell reruns
+    only this fragment; the page reruns when the edit changes
+    what is shown outside it (depth validity, or a result that
+    no longer matches the inputs).
+    """
+
+    changed, reset = layer_table_inputs(num_layers)
+
+    layers = st.session_state.table_layers
+    draw_vs_curve(curve_slot, layers)
+
+    if changed and not reset:
+        valid = st.session_state.table_total >= depth
+        if (valid != st.session_state.get("rendered_valid", valid)
+                or "last_calculated_key" in st.session_state):
+            st.rerun()
+
+
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_profile_layers(data, filename):
+    # Parsed once per uploaded file, not on every rerun
+    return read_profile(data, filename)
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def vs_profile_series(site_key, _site_data):
+    # Keyed on the canonical site key alone, so long profiles are
+    # not rehashed; only the downsampled points reach the browser
+    profile = DepthProfile.from_site_data(_site_data)
+    depth, vs = step_series(profile.thickness, profile.vsi)
+    keep = downsample_minmax(depth, vs)
+    return depth[keep], vs[keep]
+
+
+def download_report_button(job_id):
+    # Downloads the finished report, or waits for (or renders)
+    # it when clicked before the job is done
+    if report_jobs.status(job_id) == DONE:
+        data = report_jobs.result(job_id)
+    else:
+        data = partial(
+            report_jobs.report_bytes,
+            st.session_state["site_input_data"],
+            st.session_state["calculation_result"],
+            st.session_state["last_calculated_key"],
+            job_id
+        )
+
+    st.download_button(
+        "Download Report",
+        data=data,
+        file_name="Site_Class_Report.xlsx",
+        mime=XLSX_MIME,
+        use_container_width=True,
+        type='primary'
     )
 
-    # N1 rule
-    disable_n = soil_type == "Others"
-
-    n_value = row[4].number_input(
-        "N1",
-        min_value=0,
-        step=1,
-        value=int(st.session_state.layers_input[i]["n_value"]),
-        key=f"n_{i}",
-        disabled=disable_n,
-        label_visibility="collapsed"
+
+@st.fragment(run_every=0.5)
+def pending_report_button(job_id):
+    # Polls the background job; only this fragment reruns until
+    # the job ends (or is evicted from the queue), then the page
+    # picks up the bytes or the error and the fragment is no
+    # longer drawn, which stops the polling
+    if report_jobs.status(job_id) in (DONE, FAILED, UNKNOWN):
+        st.rerun()
+    download_report_button(job_id)
+
+
+def report_failed(job_id):
+    # The failed job is dropped at once so a retry renders afresh;
+    # only its error is kept for the message
+    error = report_jobs.discard(job_id)
+    st.session_state.pop("report_job", None)
+    st.session_state["report_error"] = str(error) or type(error).__name__
+
+
+def retry_report():
+    st.session_state.pop("report_error", None)
+    st.session_state["report_job"] = report_jobs.submit(
+        st.session_state["site_input_data"],
+        st.session_state["calculation_result"],
+        st.session_state["last_calculated_key"]
     )
 
-    # Vsi rule
-    if soil_type == "Others":
-        activate_vs = True
-    else:
-        activate_vs = n_value < 10
-
-    vs_value = row[5].number_input(
-        "Vsi",
-        min_value=0.00,
-        value=float(st.session_state.layers_input[i]["vs_value"]),
-        step=1.0,
-        key=f"vs_{i}",
-        disabled=not activate_vs,
-        label_visibility="collapsed"
+
+def discard_report_bundle():
+    bundle = st.session_state.pop("report_bundle", None)
+    if bundle is not None:
+        bundle["file"].discard()
+
+
+def project_reports(project_file):
+    """
+    Bulk mode: the report of every borehole in the uploaded file,
+    rendered in a process pool and streamed into one zip on disk,
+    then offered as a single download.
+    """
+
+    from borehole_archive import read_log_records
+    from report_bundle import BundleFile, write_report_zip
+
+    # The zip is deleted with the session state that holds it; one
+    # swept from the shared directory is simply rendered again
+    bundle = st.session_state.get("report_bundle")
+    if bundle is not None and (project_file is None
+                               or bundle["upload"] != project_file.file_id
+                               or not bundle["file"].exists()):
+        discard_report_bundle()
+        bundle = None
+
+    if project_file is None:
+        return
+
+    if bundle is None:
+        if not st.button("Render All Reports", type="primary"):
+            return
+
+        # The readers take a path; xlsx is read in streaming mode
+        suffix = os.path.splitext(project_file.name)[1].lower()
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as upload:
+            upload.write(project_file.getvalue())
+
+        status = st.empty()
+        bundle_file = BundleFile()
+        try:
+            counts = write_report_zip(
+                read_log_records(upload.name), bundle_file.path,
+                progress=lambda done: status.caption(f"{done} sites done")
+            )
+        except BaseException:
+            bundle_file.discard()
+            raise
+        finally:
+            os.remove(upload.name)
+        status.empty()
+
+        bundle = {"upload": project_file.file_id, "file": bundle_file, "counts": counts}
+        st.session_state["report_bundle"] = bundle
+
+    counts = bundle["counts"]
+    st.caption(
+        f"{counts['reports']} reports rendered"
+        + (f", {counts['errors']} sites failed (see summary.csv)" if counts["errors"] else "")
+    )
+    stem = os.path.splitext(project_file.name)[0]
+    st.download_button(
+        "Download Reports (zip)",
+        # Read only on click; Streamlit's media store keeps the
+        # bytes until the next rerun
+        data=bundle["file"].read,
+        file_name=f"{stem}_Site_Class_Reports.zip",
+        mime=ZIP_MIME,
+        type='primary'
     )
 
-    # Update session state live
-    st.session_state.layers_input[i] = {
-        "thickness": thickness,
-        "soil_type": soil_type,
-        "fines": "" if disable_fines else fines,
-        "n_value": 0 if disable_n else n_value,
-        "vs_value": vs_value if activate_vs else 0.0
-    }
 
 # st.divider()
 
+if input_mode == PROJECT_MODE:
+    project_reports(project_file)
+    st.stop()
+
+if input_mode == TABLE_MODE:
+    layer_editor(num_layers, float(depth), vs_curve_slot)
+    layers = st.session_state.table_layers
+    total_thickness = st.session_state.table_total
+else:
+    layers = []
+    if profile_file is not None:
+        try:
+            layers = load_profile_layers(profile_file.getvalue(), profile_file.name)
+        except ValueError as e:
+            st.error(f"Could not read the profile: {e}")
+    total_thickness = sum(layer["thickness"] for layer in layers)
+    if layers:
+        st.caption(
+            f"{len(layers)} intervals, {total_thickness:.2f} m in total"
+        )
+
+site_data = {
+        "depth_of_influence": float(depth),
+        "num_layers": len(layers),
+        "layers": layers
+    }
+
 # -------------------------
 # DEPTH VALIDATION
 # -------------------------
 
-total_thickness = sum(layer["thickness"] for layer in st.session_state.layers_input)
 valid_depth = total_thickness >= depth
+st.session_state["rendered_valid"] = valid_depth
 
 # If inputs become invalid after a previous calculation,
 # automatically clear results
 if not valid_depth:
     st.session_state.pop("calculation_result", None)
-    st.session_state.pop("report_file", None)
-    st.warning("Total thickness must be greater than or equal to Depth of Influence.")
+    st.session_state.pop("report_job", None)
+    if layers:
+        st.warning("Total thickness must be greater than or equal to Depth of Influence.")
 
-site_data = {
-        "depth_of_influence": float(depth),
-        "num_layers": int(num_layers),
-        "layers": []
-    }
+# Invalidate previous calculation if inputs changed
+site_key = canonical_site_key(site_data)
+
+if st.session_state.get("last_calculated_key", site_key) != site_key:
+    st.session_state.pop("calculation_result", None)
+    st.session_state.pop("report_job", None)
+    st.session_state.pop("last_calculated_key", None)
+
+# -------------------------
+# LIVE Vs vs DEPTH CURVE
+# -------------------------
+
+# The layer editor draws its own curve
+if input_mode == PROFILE_MODE:
+    draw_vs_curve(vs_curve_slot, layers)
 
-for i, layer in enumerate(st.session_state.layers_input):
-        site_data["layers"].append({
-            "layer": i + 1,
-            "thickness": float(layer["thickness"]),
-            "soil_type": layer["soil_type"],
-            "fines_less_than_15": layer["fines"],
-            "n1": int(layer["n_value"]),
-            "vsi": float(layer["vs_value"])
-        })
 # -------------------------
 # BUTTONS (Centered)
 # -------------------------
@@ -208,63 +527,57 @@ with btn2:
         if calculate_clicked:
 
     # Recompute validation at click time (hard sanity check)
-            total_thickness = sum(layer["thickness"] for layer in st.session_state.layers_input)
+            total_thickness = sum(layer["thickness"] for layer in site_data["layers"])
             valid_depth_click = total_thickness >= depth
 
-            st.session_state["just_calculated"] = True
-
             if not valid_depth_click:
                 st.warning("Total thickness must be greater than or equal to Depth of Influence.")
                 
                 # Clear old results if any
                 st.session_state.pop("calculation_result", None)
-                st.session_state.pop("report_file", None)
+                st.session_state.pop("report_job", None)
+                st.session_state.pop("report_error", None)
 
             else:
-                result = calculate_site_class(site_data)
-                # print(result)
+                # Identical inputs, from this or any other session,
+                # are answered from the shared cache. The report is
+                # rendered in the background.
+                result, _ = shared_cache.get_or_compute(site_data, key=site_key)
 
                 st.session_state["site_input_data"] = site_data
-                st.session_state["last_calculated_input"] = copy.deepcopy(site_data)
+                st.session_state["last_calculated_key"] = site_key
                 st.session_state["calculation_result"] = result
-
-                for i, layer in enumerate(st.session_state.layers_input):
-                    site_data["layers"].append({
-                        "layer": i + 1,
-                        "thickness": float(layer["thickness"]),
-                        "soil_type": layer["soil_type"],
-                        "fines_less_than_15": layer["fines"],
-                        "n1": int(layer["n_value"]),
-                        "vsi": float(layer["vs_value"])
-                    })
-                # Invalidate previous calculation if inputs changed
-                if "last_calculated_input" in st.session_state:
-
-                    if not st.session_state.get("just_calculated", False):
-                        
-                        if site_data != st.session_state["last_calculated_input"]:
-                            st.session_state.pop("calculation_result", None)
-                            st.session_state.pop("report_file", None)
-                            st.session_state.pop("last_calculated_input", None)
-                        
-                    st.session_state["just_calculated"] = False
-
-                file_path = generate_site_class_report(site_data, result)
-                st.session_state["report_file"] = file_path
+                st.session_state["report_job"] = report_jobs.submit(
+                    site_data, result, site_key
+                )
+                st.session_state.pop("report_error", None)
     
         # -------- Write Report Button --------
     with colB:
 
-        if "report_file" in st.session_state:
-            with open(st.session_state["report_file"], "rb") as f:
-                st.download_button(
-                    "Download Report",
-                    data=f,
-                    file_name="Site_Class_Report.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True,
-                    type='primary'
-                )
+        if "report_job" in st.session_state:
+            job_id = st.session_state["report_job"]
+            status = report_jobs.status(job_id)
+            if status == FAILED:
+                report_failed(job_id)
+            elif status == UNKNOWN:
+                # Evicted from the shared queue; a fresh job comes
+                # straight from the cache if the report was done
+                retry_report()
+
+        if "report_job" in st.session_state:
+            job_id = st.session_state["report_job"]
+            if report_jobs.status(job_id) == DONE:
+                download_report_button(job_id)
+            else:
+                pending_report_button(job_id)
+        elif "report_error" in st.session_state:
+            st.error(f"Report could not be generated: {st.session_state['report_error']}")
+            st.button(
+                "Retry Report",
+                on_click=retry_report,
+                use_container_width=True
+            )
         else:
             st.button(
                 "Download Report",
@@ -299,6 +612,20 @@ if "calculation_result" in st.session_state:
             )
             # st.success(f"Site Class: {result['site_class']}")
 
+        site_input = st.session_state["site_input_data"]
+        chart_depth, chart_vs = vs_profile_series(
+            st.session_state["last_calculated_key"], site_input
+        )
+        st.altair_chart(
+            vs_profile_chart(
+                chart_depth,
+                chart_vs,
+                site_input["depth_of_influence"],
+                result["weighted_vs"]
+            ),
+            use_container_width=True
+        )
+
         st.divider()
     render_site_class_table()
 
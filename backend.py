@@ -1,61 +1,59 @@
-def compute_layer_vsi(layer):
+from code_editions import classify, get_edition
+
+SOIL_TYPES = ["Saturated Sands", "Dry Sands", "Clays", "Others"]
+
+
+def compute_layer_vsi(layer, correlation=None):
+    """
+    Vsi of one layer from the edition's N1 correlation,
+    IS 1893 : 2025 unless another correlation is given.
+    """
+
+    if correlation is None:
+        correlation = get_edition()["correlation"]
 
     soil = layer["soil_type"]
     n1 = layer["n1"]
     fines = layer["fines_less_than_15"]
     user_vsi = layer["vsi"]
 
-    # Always use user Vsi for Others
-    if soil == "Others":
+    # Always use user Vsi for soils without a correlation (Others)
+    exponents = correlation["exponents"].get(soil)
+    if exponents is None:
         return user_vsi
 
     # Correlation not valid when N1 < 10
-    if n1 < 10:
+    if n1 < correlation["n1_min"]:
         return user_vsi
 
-    # Determine exponent
-    if soil == "Dry Sands":
-        exponent = 0.5 if fines == "Yes" else 0.3
-
-    elif soil == "Saturated Sands":
-        exponent = 0.4 if fines == "Yes" else 0.3
-
-    elif soil == "Clays":
-        exponent = 0.3
+    exponent = exponents[fines == "Yes"]
 
-    else:
-        return user_vsi
-
-    return 80 * (n1 ** exponent)
+    return correlation["coefficient"] * (n1 ** exponent)
 
 
-def compute_weighted_vs(site_data):
+def accumulate_weighted_vs(depth, rows):
     """
-    Computes weighted harmonic average Vs
-    considering depth of influence truncation.
+    Truncated harmonic average over layer rows of
+    (layer, thickness, soil_type, fines, n1, vsi), in order.
+    Rows are consumed lazily, so layers below the depth of
+    influence are never evaluated.
     Returns weighted_vs, layers_used, breakdown list.
     """
 
-    depth = site_data["depth_of_influence"]
-    layers = site_data["layers"]
-
     cumulative_depth = 0
     numerator = 0
     denominator = 0
     breakdown = []
 
-    for layer in layers:
-
-        ti_original = layer["thickness"]
+    for layer_no, ti_original, soil, fines, n1, vsi in rows:
 
         # Apply truncation if needed
-        if cumulative_depth + ti_original > depth:
+        cut = cumulative_depth + ti_original > depth
+        if cut:
             ti = depth - cumulative_depth
         else:
             ti = ti_original
 
-        vsi = compute_layer_vsi(layer)
-
         if vsi <= 0:
             raise ValueError("Vsi must be greater than zero.")
 
@@ -65,12 +63,17 @@ def compute_weighted_vs(site_data):
         denominator += ti_over_vsi
         cumulative_depth += ti
 
+        # cumulative + (depth - cumulative) can round to one ulp
+        # short of the depth; the cut layer always ends exactly there
+        if cut:
+            numerator = cumulative_depth = depth
+
         breakdown.append({
-            "layer": layer["layer"],
+            "layer": layer_no,
             "effective_thickness": ti,
-            "soil_type": layer["soil_type"],
-            "fines": layer["fines_less_than_15"],
-            "n1": layer["n1"],
+            "soil_type": soil,
+            "fines": fines,
+            "n1": n1,
             "computed_vsi": vsi,
             "ti_over_vsi": ti_over_vsi
         })
@@ -89,35 +92,59 @@ def compute_weighted_vs(site_data):
     weighted_vs = numerator / denominator
 
     return weighted_vs, len(breakdown), breakdown
- 
 
 
+def compute_weighted_vs(site_data, edition=None):
+    """
+    Computes weighted harmonic average Vs
+    considering depth of influence truncation.
+    Editions with a fixed averaging depth use it instead
+    of the site's depth of influence.
+    Returns weighted_vs, layers_used, breakdown list.
+    """
+
+    edition = get_edition(edition)
+    correlation = edition["correlation"]
+
+    depth = site_data["depth_of_influence"]
+    if edition["depth"] is not None:
+        depth = edition["depth"]
+    layers = site_data["layers"]
+
+    rows = (
+        (
+            layer["layer"],
+            layer["thickness"],
+            layer["soil_type"],
+            layer["fines_less_than_15"],
+            layer["n1"],
+            compute_layer_vsi(layer, correlation),
+        )
+        for layer in layers
+    )
+
+    return accumulate_weighted_vs(depth, rows)
+
 
-def determine_site_class(weighted_vs):
+def determine_site_class(weighted_vs, edition=None):
     """
-    Determines site class per Table 4.
+    Determines site class per Table 4, or per the
+    thresholds of another code edition.
     """
 
-    if weighted_vs >= 1500:
-        return "A"
-    elif weighted_vs >= 760:
-        return "B"
-    elif weighted_vs >= 360:
-        return "C"
-    elif weighted_vs >= 180:
-        return "D"
-    else:
-        return "E"
+    return classify(weighted_vs, edition)
 
 
-def calculate_site_class(site_data):
+def calculate_site_class(site_data, edition=None):
     """
     Main backend engine.
     """
 
-    weighted_vs, layers_used, breakdown = compute_weighted_vs(site_data)
+    edition = get_edition(edition)
+
+    weighted_vs, layers_used, breakdown = compute_weighted_vs(site_data, edition)
 
-    site_class = determine_site_class(weighted_vs)
+    site_class = determine_site_class(weighted_vs, edition)
 
     return {
         "weighted_vs": weighted_vs,
@@ -0,0 +1,442 @@
+import numpy as np
+
+from backend import SOIL_TYPES
+from code_editions import EDITIONS, get_edition
+
+
+def exponent_table(correlation):
+    """
+    Exponent of the N1 correlation for each [soil code, fines flag],
+    soil codes in SOIL_TYPES order. NaN marks soils that always
+    use the user Vsi; the extra last row covers unknown codes.
+    """
+
+    table = np.full((len(SOIL_TYPES) + 1, 2), np.nan)
+    for code, soil in enumerate(SOIL_TYPES):
+        if soil in correlation["exponents"]:
+            table[code] = correlation["exponents"][soil]
+    return table
+
+
+_DEFAULT = get_edition()
+
+# Default edition (IS 1893 : 2025) tables
+EXPONENTS = exponent_table(_DEFAULT["correlation"])
+CLASS_THRESHOLDS = _DEFAULT["thresholds"]
+CLASS_LABELS = _DEFAULT["classes"]
+
+
+def sites_to_columns(sites):
+    """
+    Flattens a list of site_data dicts into the columnar
+    arrays accepted by calculate_site_class_batch.
+    """
+
+    from site_model import SiteArray
+
+    return SiteArray.from_sites(sites).columns()
+
+
+def _vsi_table(n_values, correlation):
+    """
+    Correlated Vsi for every [soil code * 2 + fines, N1 value],
+    NaN where compute_layer_vsi falls back to the user Vsi.
+    np.power may differ from the C pow() of the scalar path in
+    the last ulp, so the table is filled with Python floats.
+    """
+
+    exponents = exponent_table(correlation)
+    coefficient = correlation["coefficient"]
+    n1_min = correlation["n1_min"]
+
+    table = np.full((exponents.size, len(n_values)), np.nan)
+
+    for row, exponent in enumerate(exponents.ravel()):
+        if np.isnan(exponent):
+            continue
+        exponent = float(exponent)
+        table[row] = [
+            coefficient * (n ** exponent) if n >= n1_min else np.nan
+            for n in map(float, n_values)
+        ]
+
+    return table
+
+
+def compute_layer_vsi_batch(soil_code, fines, n1, vsi, correlation=None):
+    """
+    Vectorized compute_layer_vsi over flat layer arrays.
+    """
+
+    if correlation is None:
+        correlation = _DEFAULT["correlation"]
+
+    soil_code = np.asarray(soil_code)
+    fines = np.asarray(fines, dtype=bool)
+    n1 = np.asarray(n1, dtype=np.float64)
+    vsi = np.asarray(vsi, dtype=np.float64)
+
+    n_layers = len(n1)
+    if n_layers == 0:
+        return vsi.copy()
+
+    # Unknown soil codes behave like "Others"
+    unknown = len(EXPONENTS) - 1
+    if soil_code.min() < 0 or soil_code.max() > unknown:
+        soil_code = np.where((soil_code < 0) | (soil_code > unknown), unknown, soil_code)
+
+    # Table row of each layer; small, so it is kept in int8
+    row = soil_code.astype(np.int8) * 2
+    row += fines
+
+    # SPT counts are integers, so the lookup column is usually
+    # N1 itself; anything else goes through a sorted index.
+    with np.errstate(invalid="ignore"):
+        key = n1.astype(np.intp)
+    n_max = key.max()
+    if key.min() >= 0 and n_max <= 100000 and (key == n1).all():
+        n_values = range(int(n_max) + 1)
+    else:
+        n_values, key = np.unique(n1, return_inverse=True)
+
+    # Laid out N1-major, so the flat index is built in place in
+    # the N1 column buffer
+    table = _vsi_table(n_values, correlation).T.ravel()
+    key *= 2 * len(EXPONENTS)
+    key += row
+
+    # Layers without a correlated value take the user Vsi, copied
+    # by index; a select on the NaN mask is several times slower,
+    # as the mask has no pattern for the CPU to predict.
+    layer_vsi = table.take(key)
+    user = np.flatnonzero(np.isnan(table).take(key))
+    layer_vsi[user] = vsi[user]
+
+    # A NaN N1 passes the scalar n1 < n1_min test and gives a NaN
+    # Vsi on a correlated soil; the table lookup would fall back
+    missing = np.flatnonzero(np.isnan(n1))
+    if len(missing):
+        correlated = ~np.isnan(exponent_table(correlation).ravel()[row[missing]])
+        layer_vsi[missing[correlated]] = np.nan
+
+    return layer_vsi
+
+
+def determine_site_class_batch(weighted_vs, edition=None):
+    """
+    Vectorized determine_site_class per Table 4,
+    or per another code edition. Like classify, raises
+    ValueError for NaN or infinite Vs, naming the first
+    such site.
+    """
+
+    weighted_vs = np.asarray(weighted_vs, dtype=np.float64)
+    finite = np.isfinite(weighted_vs)
+    if not finite.all():
+        site = int(np.argmin(finite))
+        raise ValueError(f"Weighted Vs must be a finite number. (site {site})")
+
+    edition = get_edition(edition)
+    idx = np.searchsorted(edition["thresholds"], weighted_vs, side="right")
+    return edition["classes"][idx]
+
+
+def _accumulate(thickness, layer_vsi, starts, counts, depths, width, cells=False):
+    """
+    Truncated harmonic sums for sites with at most `width` layers,
+    laid out as a dense (width, n_sites) grid with one site per
+    column, so each row step is a vector operation over all sites.
+    With cells=True the grid's flat layer indices are returned
+    for the breakdown.
+    """
+
+    n_sites = len(depths)
+    position = np.arange(width)[:, None]
+    grid = None
+    valid = None
+
+    if counts.min() == width and starts[-1] - starts[0] == (n_sites - 1) * width:
+        # Sites back to back with equal layer counts (the usual
+        # case once sites are bucketed) are a reshape away from
+        # the grid
+        block = slice(starts[0], starts[0] + n_sites * width)
+        t = np.ascontiguousarray(thickness[block].reshape(n_sites, width).T)
+        vsi = np.ascontiguousarray(layer_vsi[block].reshape(n_sites, width).T)
+        if cells:
+            grid = starts + position
+    else:
+        grid = starts + position
+        if counts.min() < width:
+            valid = position < counts
+            grid[~valid] = starts[0]
+
+        t = thickness.take(grid)
+        vsi = layer_vsi.take(grid)
+        if valid is not None:
+            t[~valid] = 0.0
+            vsi[~valid] = 1.0
+
+    # Walk the layer rows in order, so that the running depth
+    # follows the scalar loop exactly, including the last layer cut.
+    # Sites are picked out by index rather than with masked numpy
+    # operations, which are several times slower on masks without
+    # a pattern for the CPU to predict.
+    if cells:
+        ti = np.zeros_like(t)
+        ratio = np.zeros_like(t)
+        active = np.zeros(t.shape, dtype=bool)
+    else:
+        ti_row = np.empty(n_sites)
+        ratio_row = np.empty(n_sites)
+        act_rows = np.empty((2, n_sites), dtype=bool)
+
+    cumulative = np.zeros(n_sites)
+    denominator = np.zeros(n_sites)
+    layers_used = np.zeros(n_sites, dtype=np.int64)
+    bad = np.zeros(n_sites, dtype=bool)
+    cut = np.empty(n_sites, dtype=bool)
+    rest = np.empty(n_sites)
+
+    for j in range(width):
+        if cells:
+            act, ti_j, ratio_j = active[j], ti[j], ratio[j]
+            above = active[j - 1]
+        else:
+            act, ti_j, ratio_j = act_rows[j % 2], ti_row, ratio_row
+            above = act_rows[(j - 1) % 2]
+
+        if j == 0:
+            act[:] = True
+        else:
+            np.less(cumulative, depths, out=act)
+            act &= above
+        if valid is not None:
+            act &= valid[j]
+        if not act.any():
+            break
+
+        tj = t[j]
+        np.add(cumulative, tj, out=rest)
+        np.greater(rest, depths, out=cut)
+        np.copyto(ti_j, tj)
+        partial = not act.all()
+        if partial:
+            cut &= act
+        sites = np.flatnonzero(cut) if cut.any() else None
+        if sites is not None:
+            np.subtract(depths, cumulative, out=rest)
+            ti_j[sites] = rest[sites]
+
+        if partial:
+            ti_j *= act
+        cumulative += ti_j
+        if sites is not None:
+            # As in the scalar loop, a cut layer ends exactly at
+            # the depth of influence, not an ulp short of it
+            cumulative[sites] = depths[sites]
+
+        # Vsi <= 0 is reported once all sites are done
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.divide(ti_j, vsi[j], out=ratio_j)
+        if partial:
+            ratio_j[np.flatnonzero(~act)] = 0.0
+        denominator += ratio_j
+
+        layers_used += act
+        if (vsi[j] <= 0).any():
+            bad |= act & (vsi[j] <= 0)
+
+    out = {
+        "bad": bad,
+        "cumulative": cumulative,
+        "denominator": denominator,
+        "layers_used": layers_used,
+    }
+    if cells:
+        out.update(grid=grid, valid=valid, active=active, ti=ti, ratio=ratio)
+    return out
+
+
+def calculate_site_class_batch(thickness, soil_code, fines, n1, vsi,
+                               offsets, depths, breakdown=False, edition=None):
+    """
+    Batch engine over many sites stored as flat layer columns.
+    Site k owns layers offsets[k]:offsets[k+1] and depth depths[k].
+    Layers are accumulated in the same order as compute_weighted_vs,
+    so results match the scalar path exactly. An edition with a
+    fixed averaging depth uses it for every site.
+    Returns a dict of per-site arrays; with breakdown=True it also
+    holds flat per-layer computed_vsi, effective_thickness,
+    ti_over_vsi and a `used` mask.
+    """
+
+    thickness = np.asarray(thickness, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    depths = np.asarray(depths, dtype=np.float64)
+    edition = get_edition(edition)
+
+    n_sites = len(depths)
+    if len(offsets) != n_sites + 1:
+        raise ValueError("offsets must have one entry more than depths.")
+    if edition["depth"] is not None:
+        depths = np.full(n_sites, float(edition["depth"]))
+
+    layer_vsi = compute_layer_vsi_batch(
+        soil_code, fines, n1, vsi, edition["correlation"]
+    )
+
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+
+    cumulative_depth = np.zeros(n_sites)
+    denominator = np.zeros(n_sites)
+    layers_used = np.zeros(n_sites, dtype=np.int64)
+    bad = np.zeros(n_sites, dtype=bool)
+
+    if breakdown:
+        effective_thickness = np.zeros(len(thickness))
+        ti_over_vsi = np.zeros(len(thickness))
+        used = np.zeros(len(thickness), dtype=bool)
+
+    # Bucket sites by layer count (powers of two) so the dense grid
+    # wastes at most half its cells, even for mixed SPT/CPT portfolios.
+    if n_sites and counts.min() == counts.max():
+        buckets = [slice(None)] if counts[0] else []
+    else:
+        bucket = np.full(n_sites, -1, dtype=np.int64)
+        has_layers = counts > 0
+        bucket[has_layers] = np.ceil(np.log2(counts[has_layers]))
+        buckets = [
+            np.flatnonzero(bucket == b)
+            for b in np.flatnonzero(np.bincount(bucket[has_layers]))
+        ]
+        if len(buckets) == 1 and len(buckets[0]) == n_sites:
+            buckets = [slice(None)]
+
+    for sel in buckets:
+
+        out = _accumulate(
+            thickness, layer_vsi, starts[sel], counts[sel], depths[sel],
+            int(counts[sel].max()), cells=breakdown
+        )
+
+        bad[sel] = out["bad"]
+        cumulative_depth[sel] = out["cumulative"]
+        denominator[sel] = out["denominator"]
+        layers_used[sel] = out["layers_used"]
+        if breakdown:
+            keep = out["valid"] if out["valid"] is not None else Ellipsis
+            cells = out["grid"][keep]
+            effective_thickness[cells] = out["ti"][keep]
+            ti_over_vsi[cells] = out["ratio"][keep]
+            used[cells] = out["active"][keep]
+
+    # The scalar numerator accumulates the same effective thicknesses
+    # in the same order as the cumulative depth.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weighted_vs = cumulative_depth / denominator
+
+    # Report the first failing site in input order, with the
+    # error the scalar path raises for it. A NaN or infinite Vs
+    # (from a NaN or huge Vsi) has no class, as in classify.
+    short = cumulative_depth < depths
+    zero = denominator == 0
+    failed = bad | short | zero | ~np.isfinite(weighted_vs)
+    if failed.any():
+        site = int(np.argmax(failed))
+        if bad[site]:
+            message = "Vsi must be greater than zero."
+        elif short[site]:
+            message = "Total thickness is less than depth of influence."
+        elif zero[site]:
+            message = "Invalid denominator in Vs calculation."
+        else:
+            message = "Weighted Vs must be a finite number."
+        raise ValueError(f"{message} (site {site})")
+
+    result = {
+        "weighted_vs": weighted_vs,
+        "site_class": determine_site_class_batch(weighted_vs, edition),
+        "layers_used": layers_used,
+    }
+
+    if breakdown:
+        result["computed_vsi"] = layer_vsi
+        result["effective_thickness"] = effective_thickness
+        result["ti_over_vsi"] = ti_over_vsi
+        result["used"] = used
+
+    return result
+
+
+def _select_sites(columns, keep):
+    """
+    The flat layer columns of the sites where keep is True.
+    """
+
+    counts = np.diff(columns["offsets"])
+    layer_keep = np.repeat(keep, counts)
+
+    selected = {
+        name: np.asarray(columns[name])[layer_keep]
+        for name in ("thickness", "soil_code", "fines", "n1", "vsi")
+    }
+    selected["offsets"] = np.concatenate(([0], np.cumsum(counts[keep])))
+    selected["depths"] = np.asarray(columns["depths"], dtype=np.float64)[keep]
+    return selected
+
+
+def calculate_site_class_editions(columns, editions=None):
+    """
+    Evaluates one columnar dataset (see sites_to_columns) against
+    several code editions, all registered ones by default.
+    Editions sharing a correlation and averaging depth share one
+    weighted Vs pass and differ only in the searchsorted
+    classification. Sites too shallow for an edition's fixed
+    averaging depth get NaN and an empty class for it.
+    Returns {edition key: {"weighted_vs", "site_class"}}.
+    """
+
+    if editions is None:
+        editions = list(EDITIONS.values())
+    editions = [get_edition(edition) for edition in editions]
+
+    offsets = np.asarray(columns["offsets"], dtype=np.int64)
+    n_sites = len(offsets) - 1
+    site = np.repeat(np.arange(n_sites), np.diff(offsets))
+    total_thickness = np.bincount(
+        site, weights=np.asarray(columns["thickness"], dtype=np.float64),
+        minlength=n_sites
+    )
+
+    passes = {}
+    results = {}
+
+    for edition in editions:
+        group = (id(edition["correlation"]), edition["depth"])
+
+        if group not in passes:
+            if edition["depth"] is None:
+                out = calculate_site_class_batch(**columns, edition=edition)
+                weighted_vs = out["weighted_vs"]
+            else:
+                keep = total_thickness >= edition["depth"]
+                weighted_vs = np.full(n_sites, np.nan)
+                if keep.any():
+                    out = calculate_site_class_batch(
+                        **_select_sites(columns, keep), edition=edition
+                    )
+                    weighted_vs[keep] = out["weighted_vs"]
+            passes[group] = weighted_vs
+
+        weighted_vs = passes[group]
+        site_class = np.where(
+            np.isnan(weighted_vs), "",
+            determine_site_class_batch(np.nan_to_num(weighted_vs), edition)
+        )
+        results[edition["key"]] = {
+            "weighted_vs": weighted_vs,
+            "site_class": site_class,
+        }
+
+    return results
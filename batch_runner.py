@@ -0,0 +1,265 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from backend import calculate_site_class
+
+# Batches smaller than this are not worth starting a pool for
+SMALL_BATCH = 64
+
+# Each chunk should keep a worker busy for about this long
+TARGET_CHUNK_SECONDS = 0.25
+MAX_CHUNK_SIZE = 5000
+
+
+def process_site(site_data, with_report=False):
+    """
+    Classifies one site, and renders its report if asked.
+    Input errors are returned as {"error": message} so one bad
+    borehole does not abort the batch.
+    """
+
+    try:
+        result = calculate_site_class(site_data)
+    except ValueError as e:
+        return {"error": str(e)}
+    except (KeyError, TypeError):
+        return {"error": "Malformed site record."}
+
+    if with_report:
+        from report_generator import render_site_class_report
+        result["report"] = render_site_class_report(site_data, result)
+
+    return result
+
+
+def _process_chunk(chunk_id, sites, with_report):
+    """
+    Worker entry point: processes one chunk and reports timing.
+    """
+
+    start = time.perf_counter()
+    results = [process_site(site_data, with_report) for site_data in sites]
+    elapsed = time.perf_counter() - start
+
+    return chunk_id, results, os.getpid(), elapsed
+
+
+def _new_stats():
+    return {
+        "sites": 0,
+        "chunks": 0,
+        "elapsed": 0.0,
+        "sites_per_second": 0.0,
+        "mode": "in-process",
+        "workers": {},
+    }
+
+
+def _record_chunk(stats, worker, n_sites, elapsed):
+    w = stats["workers"].setdefault(
+        worker, {"sites": 0, "chunks": 0, "busy_seconds": 0.0}
+    )
+    w["sites"] += n_sites
+    w["chunks"] += 1
+    w["busy_seconds"] += elapsed
+    stats["sites"] += n_sites
+    stats["chunks"] += 1
+
+
+def iter_batch(sites, with_report=False, workers=None, chunk_size=None,
+               max_in_flight=None, stats=None):
+    """
+    Classifies an iterable of site_data dicts over a process pool
+    and yields results in input order.
+
+    Sites are pulled lazily and at most max_in_flight chunks are
+    queued at once, so memory stays bounded for long inputs. Without
+    a fixed chunk_size, chunk sizes adapt to the measured time per
+    site. Small batches run in-process. If a stats dict is given it
+    is filled with throughput and per-worker timing.
+    """
+
+    if stats is None:
+        stats = {}
+    stats.clear()
+    stats.update(_new_stats())
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    start = time.perf_counter()
+
+    sites = iter(sites)
+    head = list(itertools.islice(sites, SMALL_BATCH))
+
+    if workers == 1 or len(head) < SMALL_BATCH:
+        count = 0
+        busy = 0.0
+        for site_data in itertools.chain(head, sites):
+            t0 = time.perf_counter()
+            result = process_site(site_data, with_report)
+            busy += time.perf_counter() - t0
+            count += 1
+            yield result
+        _record_chunk(stats, os.getpid(), count, busy)
+        _finish_stats(stats, start)
+        return
+
+    stats["mode"] = "process-pool"
+    sites = itertools.chain(head, sites)
+
+    # Seconds per site, learned from completed chunks
+    site_cost = None
+    size = chunk_size or 16
+
+    pending = {}
+    done_chunks = {}
+    next_chunk = 0
+    next_to_yield = 0
+    exhausted = False
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+
+        while True:
+
+            # Chunks waiting in the reorder buffer count as in flight
+            while not exhausted and len(pending) + len(done_chunks) < max_in_flight:
+                if chunk_size is None and site_cost:
+                    size = int(TARGET_CHUNK_SECONDS / site_cost)
+                    size = max(1, min(size, MAX_CHUNK_SIZE))
+
+                chunk = list(itertools.islice(sites, size))
+                if not chunk:
+                    exhausted = True
+                    break
+
+                future = pool.submit(_process_chunk, next_chunk, chunk, with_report)
+                pending[future] = next_chunk
+                next_chunk += 1
+
+            if not pending:
+                break
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                del pending[future]
+                chunk_id, results, worker, elapsed = future.result()
+                _record_chunk(stats, worker, len(results), elapsed)
+
+                cost = elapsed / max(len(results), 1)
+                site_cost = cost if site_cost is None else 0.7 * site_cost + 0.3 * cost
+
+                done_chunks[chunk_id] = results
+
+            # Release finished chunks in input order
+            while next_to_yield in done_chunks:
+                yield from done_chunks.pop(next_to_yield)
+                next_to_yield += 1
+
+    _finish_stats(stats, start)
+
+
+def _finish_stats(stats, start):
+    stats["elapsed"] = time.perf_counter() - start
+    if stats["elapsed"] > 0:
+        stats["sites_per_second"] = stats["sites"] / stats["elapsed"]
+
+
+def run_batch(sites, with_report=False, workers=None, chunk_size=None,
+              max_in_flight=None):
+    """
+    Runs iter_batch to completion.
+    Returns the ordered result list and the stats dict.
+    """
+
+    stats = {}
+    results = list(iter_batch(
+        sites, with_report, workers, chunk_size, max_in_flight, stats
+    ))
+    return results, stats
+
+
+def format_stats(stats):
+    lines = [
+        f"{stats['sites']} sites in {stats['elapsed']:.3f} s "
+        f"({stats['sites_per_second']:.0f} sites/s, {stats['mode']}, "
+        f"{stats['chunks']} chunks)"
+    ]
+    for worker, w in sorted(stats["workers"].items()):
+        rate = w["sites"] / w["busy_seconds"] if w["busy_seconds"] else 0.0
+        lines.append(
+            f"  worker {worker}: {w['sites']} sites, {w['chunks']} chunks, "
+            f"{w['busy_seconds']:.3f} s busy ({rate:.0f} sites/s)"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Classify many sites over a process pool."
+    )
+    parser.add_argument("input", nargs="?",
+                        help="JSON file holding a list of site_data dicts")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="generate this many random sites instead")
+    parser.add_argument("--layers", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    parser.add_argument("--reports", action="store_true",
+                        help="also render the xlsx report for every site")
+    parser.add_argument("--store", metavar="DIR",
+                        help="persistent result store: skip sites computed "
+                             "before and save new ones")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from benchmarks import make_sites
+        sites = make_sites(args.synthetic, args.layers)
+    elif args.input:
+        with open(args.input) as f:
+            sites = json.load(f)
+    else:
+        parser.error("give an input file or --synthetic N")
+
+    if args.store:
+        from result_store import ResultStore, iter_warm_start
+
+        store = ResultStore(args.store)
+        computed = []
+
+        def compute(batch):
+            computed.append(len(batch))
+            return iter_batch(
+                batch, args.reports, args.workers, args.chunk_size,
+                args.max_in_flight
+            )
+
+        start = time.perf_counter()
+        results = [
+            result for _, result in
+            iter_warm_start(enumerate(sites), store, compute, args.reports)
+        ]
+        store.close()
+        print(
+            f"{len(results)} sites in {time.perf_counter() - start:.3f} s: "
+            f"{sum(computed)} computed, "
+            f"{len(results) - sum(computed)} taken from {args.store}"
+        )
+    else:
+        results, stats = run_batch(
+            sites, args.reports, args.workers, args.chunk_size, args.max_in_flight
+        )
+        print(format_stats(stats))
+
+    errors = sum("error" in r for r in results)
+    if errors:
+        print(f"{errors} sites failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+import argparse
+import contextlib
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import openpyxl
+from openpyxl import load_workbook
+
+import report_generator
+from backend import SOIL_TYPES, calculate_site_class, compute_weighted_vs
+from batch_engine import sites_to_columns, calculate_site_class_batch
+
+# Version of the results file layout
+RESULTS_FORMAT = 1
+DEFAULT_TOLERANCE = 0.10
+
+# Comparison statuses that fail the regression gate: a slowdown,
+# a case that no longer runs, and one dropped from the suite
+FAILING_STATUSES = ("slower", "error", "missing")
+
+
+def make_site(rng, n_layers=10, depth=None):
+    """
+    Builds a random site_data dict covering every
+    soil / fines / N1 < 10 branch of compute_layer_vsi.
+    The depth of influence never exceeds the total thickness,
+    so every generated site classifies without error.
+    """
+
+    layers = []
+    for i in range(n_layers):
+        soil = rng.choice(SOIL_TYPES)
+        layers.append({
+            "layer": i + 1,
+            "thickness": round(rng.uniform(0.5, 5.0), 2),
+            "soil_type": soil,
+            "fines_less_than_15": "" if soil in ["Clays", "Others"] else rng.choice(["Yes", "No"]),
+            "n1": 0 if soil == "Others" else rng.randint(0, 60),
+            "vsi": round(rng.uniform(100.0, 800.0), 1),
+        })
+
+    total = sum(layer["thickness"] for layer in layers)
+    if depth is None:
+        depth = round(rng.uniform(0.5, 1.0) * total, 1)
+
+    return {
+        "depth_of_influence": min(depth, total),
+        "num_layers": n_layers,
+        "layers": layers,
+    }
+
+
+def make_sites(n_sites, n_layers=10, seed=0):
+    rng = random.Random(seed)
+    return [make_site(rng, n_layers) for _ in range(n_sites)]
+
+
+# -------------------------
+# BENCHMARK SUITE
+# -------------------------
+
+def measure(fn, repeat=5, min_time=0.05):
+    """
+    Times fn. Fast cases are looped so each sample runs for at
+    least min_time seconds. Returns per-call best and median
+    seconds over repeat samples.
+    """
+
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+
+    loops = 1
+    if first < min_time:
+        loops = min(int(math.ceil(min_time / max(first, 1e-9))), 1000000)
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+
+    return {
+        "best": min(samples),
+        "median": statistics.median(samples),
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def _engine_scalar(n_layers):
+    site_data = make_sites(1, n_layers, seed=n_layers)[0]
+    return lambda: compute_weighted_vs(site_data)
+
+
+def _engine_sites(n_sites):
+    sites = make_sites(n_sites, 10, seed=n_sites)
+    return lambda: [calculate_site_class(s) for s in sites]
+
+
+def _engine_batch(n_sites, n_layers=10):
+    sites = make_sites(n_sites, n_layers, seed=n_sites)
+    columns = sites_to_columns(sites)
+
+    # The timings only mean something if both engines agree
+    batch = calculate_site_class_batch(**columns)
+    for k in range(0, n_sites, max(1, n_sites // 200)):
+        res = calculate_site_class(sites[k])
+        assert res["weighted_vs"] == batch["weighted_vs"][k]
+        assert res["site_class"] == batch["site_class"][k]
+
+    return lambda: calculate_site_class_batch(**columns)
+
+
+def _template_parse():
+    return lambda: load_workbook(report_generator.TEMPLATE_PATH)
+
+
+def _template_copy():
+    report_generator.load_template()
+    return report_generator.load_template
+
+
+def _report(n_layers, render):
+    site_data = make_sites(1, n_layers, seed=n_layers)[0]
+    result = calculate_site_class(site_data)
+    render(site_data, result)
+    return lambda: render(site_data, result)
+
+
+def _report_file(n_layers):
+    site_data = make_sites(1, n_layers, seed=n_layers)[0]
+    result = calculate_site_class(site_data)
+    path = os.path.join(tempfile.mkdtemp(), "report.xlsx")
+    return lambda: report_generator.generate_site_class_report(site_data, result, path)
+
+
+@contextlib.contextmanager
+def _store_at(path):
+    """
+    Points SITE_CLASS_STORE at path for the duration, then puts
+    back whatever it was before.
+    """
+
+    old = os.environ.get("SITE_CLASS_STORE")
+    os.environ["SITE_CLASS_STORE"] = path
+    try:
+        yield
+    finally:
+        if old is None:
+            del os.environ["SITE_CLASS_STORE"]
+        else:
+            os.environ["SITE_CLASS_STORE"] = old
+
+
+def _app_rerun(n_layers=3):
+    """
+    A rerun of app.py after a calculation, as on any widget
+    change. Results and reports go to a throwaway store, never
+    to the one SITE_CLASS_STORE names.
+    """
+
+    from streamlit.testing.v1 import AppTest
+
+    store = tempfile.TemporaryDirectory(prefix="bench_store_")
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+    with _store_at(store.name):
+        at = AppTest.from_file(app_path, default_timeout=60).run()
+        at.number_input[1].set_value(n_layers).run()
+        for i in range(n_layers):
+            at.number_input(key=f"th_{i}").set_value(2.0)
+            at.number_input(key=f"n_{i}").set_value(5 + 10 * i)
+        at.number_input[0].set_value(2.0 * n_layers).run()
+        at.button[0].click().run()
+    if at.exception:
+        raise RuntimeError(f"app.py failed: {at.exception[0].message}")
+
+    def rerun():
+        # Holds the store directory until the case is done with it
+        with _store_at(store.name):
+            return at.run()
+
+    return rerun
+
+
+def suite_cases():
+    """
+    (name, setup, slow) for every benchmark. setup builds the
+    inputs and returns the function to time; slow cases are left
+    out of --quick runs.
+    """
+
+    cases = []
+    for n_layers in (1, 10, 100, 1000, 5000):
+        cases.append((f"engine.scalar.layers_{n_layers}",
+                      lambda n=n_layers: _engine_scalar(n), n_layers >= 5000))
+    for n_sites in (1000, 10000):
+        cases.append((f"engine.scalar.sites_{n_sites}",
+                      lambda n=n_sites: _engine_sites(n), n_sites >= 10000))
+    for n_sites in (1, 1000, 10000, 100000):
+        cases.append((f"engine.batch.sites_{n_sites}",
+                      lambda n=n_sites: _engine_batch(n), n_sites >= 100000))
+    cases.append(("engine.batch.layers_5000", lambda: _engine_batch(100, 5000), True))
+
+    cases.append(("report.template_parse", _template_parse, False))
+    cases.append(("report.template_copy", _template_copy, False))
+    for n_layers in (1, 10, 20):
+        cases.append((f"report.openpyxl.layers_{n_layers}",
+                      lambda n=n_layers: _report(n, report_generator.render_site_class_report_openpyxl),
+                      False))
+        cases.append((f"report.compiled.layers_{n_layers}",
+                      lambda n=n_layers: _report(n, report_generator.render_site_class_report),
+                      False))
+    # Profiles longer than the template are grouped into layers
+    cases.append(("report.grouped.layers_5000",
+                  lambda: _report(5000, report_generator.render_site_class_report), True))
+    cases.append(("report.generate_file.layers_10", lambda: _report_file(10), False))
+
+    cases.append(("app.rerun", _app_rerun, True))
+    return cases
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "openpyxl": openpyxl.__version__,
+    }
+
+
+def _selected(name, slow, pattern=None, quick=False):
+    if pattern is not None and not re.search(pattern, name):
+        return False
+    return not (quick and slow)
+
+
+def run_suite(pattern=None, quick=False, repeat=5, min_time=0.05, log=None):
+    """
+    Runs the suite and returns the results dict. pattern is a
+    regular expression on case names. A case whose setup fails
+    (e.g. streamlit missing for app.rerun) is recorded with its
+    error instead of a timing.
+    """
+
+    results = {
+        "format": RESULTS_FORMAT,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "cases": {},
+    }
+
+    for name, setup, slow in suite_cases():
+        if not _selected(name, slow, pattern, quick):
+            continue
+
+        try:
+            fn = setup()
+        except Exception as e:
+            results["cases"][name] = {"error": f"{type(e).__name__}: {e}"}
+        else:
+            results["cases"][name] = measure(fn, repeat, min_time)
+
+        if log is not None:
+            log(name, results["cases"][name])
+
+    return results
+
+
+def compare_results(baseline, current, tolerance=DEFAULT_TOLERANCE, stat="best"):
+    """
+    Compares two results dicts case by case. Returns rows of
+    (name, baseline seconds, current seconds, ratio, status);
+    status is "slower" when the current time exceeds the baseline
+    by more than tolerance (a fraction), else "ok" or "faster",
+    and "new", "missing" or "error" for cases not timed in both.
+    """
+
+    rows = []
+    names = list(baseline["cases"]) + [n for n in current["cases"] if n not in baseline["cases"]]
+
+    for name in names:
+        old = baseline["cases"].get(name)
+        new = current["cases"].get(name)
+
+        if old is None:
+            rows.append((name, None, new.get(stat), None, "new"))
+            continue
+        if new is None:
+            rows.append((name, old.get(stat), None, None, "missing"))
+            continue
+        if "error" in old or "error" in new:
+            rows.append((name, old.get(stat), new.get(stat), None, "error"))
+            continue
+
+        ratio = new[stat] / old[stat]
+        if ratio > 1 + tolerance:
+            status = "slower"
+        elif ratio < 1 / (1 + tolerance):
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, old[stat], new[stat], ratio, status))
+
+    return rows
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.3f} s"
+
+
+def _print_case(name, timing):
+    if "error" in timing:
+        print(f"{name:<36} error: {timing['error']}")
+    else:
+        print(f"{name:<36} {_format_seconds(timing['best']):>12}  "
+              f"(median {_format_seconds(timing['median'])}, {timing['loops']} loops)")
+
+
+def _read_results(path):
+    with open(path, encoding="utf-8") as f:
+        results = json.load(f)
+    if results.get("format") != RESULTS_FORMAT:
+        raise SystemExit(f"{path}: not a benchmark results file (format {RESULTS_FORMAT})")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the engine, report and app hot paths, "
+                    "and compare runs for regressions."
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    run = commands.add_parser("run", help="run the suite")
+    run.add_argument("-o", "--output", help="write results as JSON")
+    run.add_argument("-k", "--filter", dest="pattern",
+                     help="only cases whose name matches this regular expression")
+    run.add_argument("--quick", action="store_true", help="skip the slow cases")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--min-time", type=float, default=0.05,
+                     help="minimum seconds per sample; fast cases are looped")
+    run.add_argument("--compare", metavar="BASELINE",
+                     help="compare against a results file and fail on regressions")
+    run.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+
+    compare = commands.add_parser("compare", help="compare two results files")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                         help="allowed slowdown as a fraction (default 0.10)")
+    compare.add_argument("--stat", choices=["best", "median"], default="best")
+
+    commands.add_parser("list", help="list the cases")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name, _, slow in suite_cases():
+            print(f"{name}{'  (slow)' if slow else ''}")
+        return 0
+
+    if args.command == "compare":
+        baseline = _read_results(args.baseline)
+        current = _read_results(args.current)
+        return _report_comparison(baseline, current, args.tolerance, args.stat)
+
+    if args.command is None:
+        args = run.parse_args([])
+
+    results = run_suite(args.pattern, args.quick, args.repeat, args.min_time, log=_print_case)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        # Cases the filter left out are not missing from this run
+        baseline = _read_results(args.compare)
+        slow_cases = {name for name, _, slow in suite_cases() if slow}
+        baseline["cases"] = {
+            name: timing for name, timing in baseline["cases"].items()
+            if _selected(name, name in slow_cases, args.pattern, args.quick)
+        }
+        return _report_comparison(baseline, results, args.tolerance)
+    return 0
+
+
+def _report_comparison(baseline, current, tolerance, stat="best"):
+    """
+    Prints the comparison and returns the exit status: 1 when any
+    case has a status in FAILING_STATUSES.
+    """
+
+    rows = compare_results(baseline, current, tolerance, stat)
+    for name, old, new, ratio, status in rows:
+        change = "" if ratio is None else f"{(ratio - 1) * 100:+7.1f}%"
+        print(f"{name:<36} {_format_seconds(old):>12} {_format_seconds(new):>12} "
+              f"{change:>9}  {status}")
+
+    failed = [row for row in rows if row[4] in FAILING_STATUSES]
+    if failed:
+        print(f"{len(failed)} case(s) failed the gate (slower than the "
+              f"{tolerance:.0%} tolerance, erroring or missing): "
+              f"{', '.join(f'{row[0]} ({row[4]})' for row in failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
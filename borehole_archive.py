@@ -0,0 +1,538 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backend import SOIL_TYPES, calculate_site_class
+from batch_engine import calculate_site_class_batch
+from site_model import (
+    FINES_VALUES, FINES_YES, Layer, Site, SiteArray, _n1_value,
+)
+
+# File layout: MAGIC, the header length as a little-endian uint64,
+# the JSON header, then one section per column. Every section starts
+# on an ALIGN boundary, so each can be viewed in place as an array.
+MAGIC = b"SCARCHV\x00"
+VERSION = 1
+ALIGN = 64
+
+# Column sections: name -> dtype. Layer columns hold one value per
+# layer, site columns one per site (offsets one more).
+LAYER_COLUMNS = {
+    "layer": "<i4",
+    "thickness": "<f8",
+    "soil": "i1",
+    "fines": "i1",
+    "n1": "<f8",
+    "vsi": "<f8",
+}
+SITE_COLUMNS = {
+    "offsets": "<i8",
+    "depths": "<f8",
+    "id_offsets": "<i8",
+}
+ID_COLUMN = {"id_bytes": "u1"}
+SECTIONS = {**LAYER_COLUMNS, **SITE_COLUMNS, **ID_COLUMN}
+
+# Sites packed per chunk while writing
+PACK_CHUNK = 65536
+
+
+def _aligned(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+# ---------------- Writing ----------------
+
+class ArchiveWriter:
+    """
+    Streams sites into an archive with bounded memory. Each column
+    is spooled to its own temporary file next to the target, and
+    close() joins them behind the header. The archive appears under
+    its final name only once complete.
+    """
+
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self.metadata = dict(metadata or {})
+        self.n_sites = 0
+        self.n_layers = 0
+        self.id_length = 0
+        self.text = []
+
+        target_dir = os.path.dirname(os.path.abspath(path))
+        self._dir = tempfile.mkdtemp(prefix=".archive-", dir=target_dir)
+        self._spools = {
+            name: open(os.path.join(self._dir, name), "wb") for name in SECTIONS
+        }
+        self._write("offsets", [0])
+        self._write("id_offsets", [0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write(self, name, values):
+        self._spools[name].write(np.asarray(values, dtype=SECTIONS[name]).tobytes())
+
+    def add_sites(self, site_ids, sites):
+        """
+        Appends a SiteArray with one id per site.
+        """
+
+        records = sites.records
+        for name in LAYER_COLUMNS:
+            self._write(name, records[name])
+
+        self._write("offsets", sites.offsets[1:] + self.n_layers)
+        self._write("depths", sites.depths)
+
+        encoded = [str(site_id).encode("utf-8") for site_id in site_ids]
+        lengths = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        self._write("id_offsets", lengths + self.id_length)
+        self._spools["id_bytes"].write(b"".join(encoded))
+
+        for i, (soil_type, fines) in sorted(sites.text.items()):
+            self.text.append([self.n_layers + i, soil_type, fines])
+
+        self.n_sites += len(sites)
+        self.n_layers += len(records)
+        self.id_length += int(lengths[-1]) if len(lengths) else 0
+
+    def _counts(self):
+        counts = {name: self.n_layers for name in LAYER_COLUMNS}
+        counts.update(offsets=self.n_sites + 1, depths=self.n_sites,
+                      id_offsets=self.n_sites + 1, id_bytes=self.id_length)
+        return counts
+
+    def close(self):
+        """
+        Writes the archive and returns its path.
+        """
+
+        for spool in self._spools.values():
+            spool.close()
+
+        sections = {}
+        position = 0
+        for name, count in self._counts().items():
+            sections[name] = [SECTIONS[name], position, count]
+            position = _aligned(position + count * np.dtype(SECTIONS[name]).itemsize)
+
+        header = json.dumps({
+            "version": VERSION,
+            "sites": self.n_sites,
+            "layers": self.n_layers,
+            "soil_types": list(SOIL_TYPES),
+            "fines_values": FINES_VALUES,
+            "sections": sections,
+            "text": self.text,
+            "metadata": self.metadata,
+        }).encode("utf-8")
+        data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+        partial = os.path.join(self._dir, "archive")
+        with open(partial, "wb") as out:
+            out.write(MAGIC)
+            out.write(struct.pack("<Q", len(header)))
+            out.write(header)
+            for name, (_, offset, _) in sections.items():
+                out.seek(data_start + offset)
+                with open(os.path.join(self._dir, name), "rb") as spool:
+                    shutil.copyfileobj(spool, out, 1 << 20)
+            out.truncate(data_start + position)
+
+        os.replace(partial, self.path)
+        shutil.rmtree(self._dir, ignore_errors=True)
+        return self.path
+
+    def abort(self):
+        for spool in self._spools.values():
+            spool.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def _pack(chunk, skipped):
+    """
+    SiteArray of a chunk of (site_id, site_data) records and the
+    ids kept. Records that cannot be packed are left out and
+    their ids added to skipped.
+    """
+
+    ids = [site_id for site_id, site_data in chunk if site_data is not None]
+    sites = [site_data for _, site_data in chunk if site_data is not None]
+    skipped.extend(site_id for site_id, site_data in chunk if site_data is None)
+
+    try:
+        return ids, SiteArray.from_sites(sites)
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    # Something in the chunk is malformed: find it site by site
+    kept_ids, kept = [], []
+    for site_id, site_data in zip(ids, sites):
+        try:
+            SiteArray.from_sites([site_data])
+        except (KeyError, TypeError, ValueError):
+            skipped.append(site_id)
+            continue
+        kept_ids.append(site_id)
+        kept.append(site_data)
+    return kept_ids, SiteArray.from_sites(kept)
+
+
+def write_archive(records, path, metadata=None, chunk_size=PACK_CHUNK):
+    """
+    Writes (site_id, site_data) records, as yielded by the CSV,
+    NDJSON and workbook readers, into an archive at path. Returns
+    the ids of the records left out as malformed. Only the logs
+    are archived; extra keys of site_data are not kept.
+    """
+
+    skipped = []
+    chunk = []
+
+    with ArchiveWriter(path, metadata) as writer:
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                writer.add_sites(*_pack(chunk, skipped))
+                chunk = []
+        if chunk:
+            writer.add_sites(*_pack(chunk, skipped))
+
+    return skipped
+
+
+def write_site_array(sites, path, site_ids=None, metadata=None):
+    """
+    Writes a SiteArray (or a list of site_data dicts) as one
+    archive; site ids default to the site index.
+    """
+
+    if not isinstance(sites, SiteArray):
+        sites = SiteArray.from_sites(sites)
+    if site_ids is None:
+        site_ids = range(len(sites))
+
+    with ArchiveWriter(path, metadata) as writer:
+        writer.add_sites(list(site_ids), sites)
+    return path
+
+
+# ---------------- Reading ----------------
+
+class BoreholeArchive:
+    """
+    An archive opened with numpy.memmap. Columns are read-only
+    views of the mapped file, so opening is instant and nothing
+    is parsed or copied until used; any number of processes can
+    map the same file and share its pages.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a borehole archive: {path}")
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+
+        if header["version"] > VERSION:
+            raise ValueError(f"Archive version {header['version']} is newer than this reader.")
+        # Soil and fines are stored as codes into these lists
+        if header["soil_types"] != list(SOIL_TYPES) or header["fines_values"] != FINES_VALUES:
+            raise ValueError("Archive was written with different soil or fines codes.")
+
+        self.header = header
+        self.metadata = header["metadata"]
+        self.text = {i: (soil, fines) for i, soil, fines in header["text"]}
+
+        data_start = _aligned(len(MAGIC) + 8 + header_length)
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+
+        for name, (dtype, offset, count) in header["sections"].items():
+            dtype = np.dtype(dtype)
+            start = data_start + offset
+            view = self._map[start:start + count * dtype.itemsize].view(dtype)
+            setattr(self, name, view)
+
+    def __len__(self):
+        return self.header["sites"]
+
+    @property
+    def n_layers(self):
+        return self.header["layers"]
+
+    def site_id(self, k):
+        start, stop = self.id_offsets[k], self.id_offsets[k + 1]
+        return self.id_bytes[start:stop].tobytes().decode("utf-8")
+
+    def site_ids(self, start=0, stop=None):
+        stop = len(self) if stop is None else stop
+        return [self.site_id(k) for k in range(start, stop)]
+
+    def site(self, k):
+        start, stop = int(self.offsets[k]), int(self.offsets[k + 1])
+
+        layers = [
+            Layer(layer_no, thickness, soil, fines, _n1_value(n1), vsi, self.text.get(i))
+            for i, layer_no, thickness, soil, fines, n1, vsi in zip(
+                range(start, stop),
+                self.layer[start:stop].tolist(),
+                self.thickness[start:stop].tolist(),
+                self.soil[start:stop].tolist(),
+                self.fines[start:stop].tolist(),
+                self.n1[start:stop].tolist(),
+                self.vsi[start:stop].tolist(),
+            )
+        ]
+        return Site(float(self.depths[k]), layers)
+
+    def iter_sites(self, start=0, stop=None):
+        """
+        Yields (site_id, site_data) like the other input readers.
+        """
+
+        stop = len(self) if stop is None else stop
+        for k in range(start, stop):
+            yield self.site_id(k), self.site(k).to_dict()
+
+    def columns(self, start=0, stop=None):
+        """
+        Flat columns of sites start:stop for
+        calculate_site_class_batch. Numeric columns are views
+        into the mapped file; only the fines flag and the
+        rebased offsets are computed.
+        """
+
+        stop = len(self) if stop is None else stop
+        first, last = int(self.offsets[start]), int(self.offsets[stop])
+
+        return {
+            "thickness": self.thickness[first:last],
+            "soil_code": self.soil[first:last],
+            "fines": self.fines[first:last] == FINES_YES,
+            "n1": self.n1[first:last],
+            "vsi": self.vsi[first:last],
+            "offsets": self.offsets[start:stop + 1] - first,
+            "depths": self.depths[start:stop],
+        }
+
+    def shards(self, n):
+        """
+        Up to n (start, stop) site ranges with about the same
+        number of layers each.
+        """
+
+        targets = np.linspace(0, self.n_layers, n + 1)
+        bounds = np.searchsorted(self.offsets, targets, side="left")
+        bounds[0], bounds[-1] = 0, len(self)
+        bounds = np.unique(np.minimum(bounds, len(self)))
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def calculate(self, start=0, stop=None, edition=None):
+        """
+        Weighted Vs, site class and layers used of sites
+        start:stop, plus {site index: message} for the sites
+        that could not be classified (NaN and "" in the arrays).
+        """
+
+        stop = len(self) if stop is None else stop
+
+        try:
+            out = calculate_site_class_batch(**self.columns(start, stop), edition=edition)
+            return {
+                "weighted_vs": out["weighted_vs"],
+                "site_class": out["site_class"].astype(str),
+                "layers_used": out["layers_used"],
+                "errors": {},
+            }
+        except ValueError:
+            pass
+
+        # Some site is invalid: classify one by one so the
+        # rest still get their result
+        n = stop - start
+        weighted_vs = np.full(n, np.nan)
+        site_class = np.full(n, "", dtype="<U8")
+        layers_used = np.zeros(n, dtype=np.int64)
+        errors = {}
+
+        for j, k in enumerate(range(start, stop)):
+            try:
+                result = calculate_site_class(self.site(k).to_dict(), edition)
+            except ValueError as e:
+                errors[k] = str(e)
+                continue
+            weighted_vs[j] = result["weighted_vs"]
+            site_class[j] = result["site_class"]
+            layers_used[j] = result["layers_used"]
+
+        return {
+            "weighted_vs": weighted_vs,
+            "site_class": site_class,
+            "layers_used": layers_used,
+            "errors": errors,
+        }
+
+
+def _classify_shard(path, start, stop, edition):
+    # Worker body: maps the archive itself, so only the path
+    # and the range cross the process boundary
+    return BoreholeArchive(path).calculate(start, stop, edition)
+
+
+def classify_archive(path, workers=None, edition=None):
+    """
+    Classifies every site of an archive, shard by shard over a
+    process pool. Returns the same dict as
+    BoreholeArchive.calculate for the whole archive.
+    """
+
+    archive = BoreholeArchive(path)
+    workers = workers or os.cpu_count() or 1
+    shards = archive.shards(workers * 4) if len(archive) else []
+
+    if workers == 1 or len(shards) <= 1:
+        parts = [archive.calculate(start, stop, edition) for start, stop in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(
+                _classify_shard,
+                [path] * len(shards),
+                [start for start, _ in shards],
+                [stop for _, stop in shards],
+                [edition] * len(shards),
+            ))
+
+    if not parts:
+        return {
+            "weighted_vs": np.empty(0), "site_class": np.empty(0, dtype="<U8"),
+            "layers_used": np.empty(0, dtype=np.int64), "errors": {},
+        }
+
+    errors = {}
+    for part in parts:
+        errors.update(part["errors"])
+
+    return {
+        "weighted_vs": np.concatenate([part["weighted_vs"] for part in parts]),
+        "site_class": np.concatenate([part["site_class"] for part in parts]),
+        "layers_used": np.concatenate([part["layers_used"] for part in parts]),
+        "errors": errors,
+    }
+
+
+# ---------------- Command line ----------------
+
+def read_log_records(path):
+    """
+    (site_id, site_data) records of an NDJSON, CSV or xlsx file,
+    picked by extension.
+    """
+
+    ext = os.path.splitext(path.lower())[1]
+    if ext in (".xlsx", ".xlsm"):
+        from excel_import import iter_workbook_sites
+        yield from iter_workbook_sites(path)
+        return
+
+    from site_class_cli import read_long_csv, read_ndjson
+
+    with open(path, newline="") as stream:
+        yield from (read_long_csv(stream) if ext == ".csv" else read_ndjson(stream))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Pack borehole logs into a memory-mapped archive and classify it."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pack = commands.add_parser("pack", help="convert NDJSON, CSV or xlsx logs")
+    pack.add_argument("inputs", nargs="+")
+    pack.add_argument("-o", "--output", required=True)
+
+    info = commands.add_parser("info", help="show the archive header")
+    info.add_argument("archive")
+
+    classify = commands.add_parser("classify", help="classify every site")
+    classify.add_argument("archive")
+    classify.add_argument("--workers", type=int, default=None)
+    classify.add_argument("--edition", default=None)
+    classify.add_argument("--output-format", choices=["ndjson", "csv"], default="ndjson")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        def records():
+            for path in args.inputs:
+                yield from read_log_records(path)
+
+        start = time.perf_counter()
+        skipped = write_archive(
+            records(), args.output, {"sources": [os.path.basename(p) for p in args.inputs]}
+        )
+        archive = BoreholeArchive(args.output)
+        print(
+            f"{len(archive)} sites, {archive.n_layers} layers packed into "
+            f"{args.output} in {time.perf_counter() - start:.2f} s",
+            file=sys.stderr,
+        )
+        if skipped:
+            print(f"{len(skipped)} malformed records left out: "
+                  + ", ".join(map(str, skipped[:20])), file=sys.stderr)
+
+    elif args.command == "info":
+        archive = BoreholeArchive(args.archive)
+        header = dict(archive.header)
+        header["text"] = len(header["text"])
+        print(json.dumps(header, indent=2))
+
+    else:
+        archive = BoreholeArchive(args.archive)
+        result = classify_archive(args.archive, args.workers, args.edition)
+
+        out = sys.stdout
+        if args.output_format == "csv":
+            from site_class_cli import RESULT_COLUMNS
+            writer = csv.DictWriter(out, RESULT_COLUMNS)
+            writer.writeheader()
+
+        try:
+            for k in range(len(archive)):
+                site_id = archive.site_id(k)
+                if k in result["errors"]:
+                    row = {"site_id": site_id, "error": result["errors"][k]}
+                else:
+                    row = {
+                        "site_id": site_id,
+                        "weighted_vs": float(result["weighted_vs"][k]),
+                        "site_class": str(result["site_class"][k]),
+                        "layers_used": int(result["layers_used"][k]),
+                    }
+                if args.output_format == "csv":
+                    writer.writerow(row)
+                else:
+                    out.write(json.dumps(row) + "\n")
+        except BrokenPipeError:
+            # Downstream closed early (e.g. piped into head)
+            sys.stdout = open(os.devnull, "w")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import numpy as np
+
+from batch_engine import calculate_site_class_batch, exponent_table
+from code_editions import get_edition
+from site_model import SiteArray
+
+# Bisection steps for the uniform N1 change; enough to pin it
+# to well below 1e-9 blows on any realistic bracket
+BISECTION_STEPS = 64
+
+
+def class_margins(weighted_vs, edition=None):
+    """
+    Distance from each weighted Vs to the class thresholds around
+    it (Table 4 unless another edition is given). margin_up is how
+    far Vs must rise to reach the next class (inf for the fastest),
+    margin_down how far it may fall before it drops a class (inf
+    for the slowest). margin is the smaller of the two, and
+    relative_margin that as a fraction of Vs. NaN or infinite
+    Vs raise ValueError, as they have no class.
+    """
+
+    edition = get_edition(edition)
+    thresholds = edition["thresholds"]
+
+    weighted_vs = np.asarray(weighted_vs, dtype=np.float64)
+    if not np.all(np.isfinite(weighted_vs)):
+        raise ValueError("Weighted Vs must be a finite number.")
+    idx = np.searchsorted(thresholds, weighted_vs, side="right")
+
+    bounds = np.concatenate(([-np.inf], thresholds, [np.inf]))
+    lower = bounds[idx]
+    upper = bounds[idx + 1]
+
+    margin_up = upper - weighted_vs
+    margin_down = weighted_vs - lower
+    margin = np.minimum(margin_up, margin_down)
+
+    return {
+        "site_class": edition["classes"][idx],
+        "lower_threshold": lower,
+        "upper_threshold": upper,
+        "margin_up": margin_up,
+        "margin_down": margin_down,
+        "margin": margin,
+        "relative_margin": margin / weighted_vs,
+    }
+
+
+def _correlated_sums(site, ti, n1, exponent, coefficient, delta, n_sites):
+    """
+    Σ tᵢ/Vₛᵢ over correlated layers with N1 shifted by delta[site].
+    """
+
+    vsi = coefficient * (n1 + delta[site]) ** exponent
+    return np.bincount(site, weights=ti / vsi, minlength=n_sites)
+
+
+def _uniform_n1_change(target, fixed, site, ti, n1, exponent, coefficient, lo, hi):
+    """
+    Bisection, per site, for the N1 shift that brings Σ tᵢ/Vₛᵢ to
+    target. The sum falls as N1 rises, so lo and hi must bracket
+    the root with sum(lo) >= target >= sum(hi). Sites where
+    lo or hi is NaN are skipped.
+    """
+
+    n_sites = len(target)
+    ok = ~(np.isnan(lo) | np.isnan(hi))
+    lo = np.where(ok, lo, 0.0)
+    hi = np.where(ok, hi, 0.0)
+
+    for _ in range(BISECTION_STEPS):
+        mid = (lo + hi) / 2
+        total = fixed + _correlated_sums(site, ti, n1, exponent, coefficient, mid, n_sites)
+        above = total > target
+        lo = np.where(above, mid, lo)
+        hi = np.where(above, hi, mid)
+
+    return np.where(ok, hi, np.nan), np.where(ok, lo, np.nan)
+
+
+def analyze_sites(sites, edition=None):
+    """
+    Closed-form sensitivity and class-flip screening for many sites.
+
+    With D the depth of influence and S = Σ tᵢ/Vₛᵢ over the used
+    layers, Vs = D / S, so per layer
+
+        dVs/dVsᵢ = Vs² tᵢ / (D Vₛᵢ²)
+        dVs/dtᵢ  = -(Vs² / D) (1/Vₛᵢ - 1/Vₛₖ)
+
+    where k is the last layer above D: a thicker layer i pushes
+    layer k down, so D stays fixed. Both are zero below D, and
+    dVs/dtₖ is zero.
+
+    The inverse solutions give the smallest (N1)60 change that
+    moves the site up or down one class, either in a single layer
+    (per layer) or added to every correlated layer at once
+    (uniform). Changes that would need N1 below the correlation's
+    minimum (10 in IS 1893), where it stops applying, or that cannot
+    reach the threshold at all, are NaN. Classes, correlation and
+    averaging depth are those of the code edition.
+
+    sites is a SiteArray or a list of site_data dicts. Returns
+    per-site arrays and flat per-layer arrays aligned with
+    SiteArray.records; `offsets` maps layers to sites.
+    """
+
+    if not isinstance(sites, SiteArray):
+        sites = SiteArray.from_sites(sites)
+
+    edition = get_edition(edition)
+    correlation = edition["correlation"]
+    coefficient = correlation["coefficient"]
+    n1_min = correlation["n1_min"]
+
+    columns = sites.columns()
+    out = calculate_site_class_batch(**columns, breakdown=True, edition=edition)
+
+    offsets = columns["offsets"]
+    depth = columns["depths"]
+    n_sites = len(depth)
+    counts = np.diff(offsets)
+    site = np.repeat(np.arange(n_sites), counts)
+
+    ti = out["effective_thickness"]
+    vsi = out["computed_vsi"]
+    used = out["used"]
+    weighted_vs = out["weighted_vs"]
+
+    total_t = np.bincount(site, weights=ti, minlength=n_sites)
+    total_tv = np.bincount(site, weights=out["ti_over_vsi"], minlength=n_sites)
+
+    # ---- Derivatives ----
+
+    scale = weighted_vs ** 2 / total_t
+    dvs_dvsi = np.zeros(len(ti))
+    np.divide(scale[site] * ti, vsi ** 2, out=dvs_dvsi, where=used)
+
+    last = offsets[:-1] + out["layers_used"] - 1
+    dvs_dti = np.zeros(len(ti))
+    above_last = used.copy()
+    above_last[last] = False
+    np.divide(
+        -scale[site] * (vsi[last][site] - vsi), vsi * vsi[last][site],
+        out=dvs_dti, where=above_last
+    )
+
+    margins = class_margins(weighted_vs, edition)
+
+    # ---- Inverse: N1 change that flips the class ----
+
+    n1 = columns["n1"].astype(np.float64)
+    exponents = exponent_table(correlation)
+    code = np.clip(columns["soil_code"].astype(np.intp), 0, len(exponents) - 1)
+    exponent = exponents.ravel()[code * 2 + columns["fines"]]
+    correlated = used & ~np.isnan(exponent) & (n1 >= n1_min) & (ti > 0)
+
+    # Σ tᵢ/Vₛᵢ each threshold needs; a class boundary belongs to
+    # the upper class, so reaching target_up flips the class up.
+    # Class A has nothing above and class E nothing below.
+    upper = margins["upper_threshold"]
+    lower = margins["lower_threshold"]
+    target_up = np.full(n_sites, np.nan)
+    target_down = np.full(n_sites, np.nan)
+    np.divide(total_t, upper, out=target_up, where=np.isfinite(upper))
+    np.divide(total_t, lower, out=target_down, where=np.isfinite(lower))
+
+    def per_layer(target):
+        # Vsᵢ that alone closes the gap to the target
+        rest = (target - total_tv)[site] + ti / vsi
+        new_vsi = np.full(len(ti), np.nan)
+        np.divide(ti, rest, out=new_vsi, where=correlated & (rest > 0))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            new_n1 = (new_vsi / coefficient) ** (1 / exponent)
+            change = np.where(new_n1 >= n1_min, new_n1 - n1, np.nan)
+        return change
+
+    n1_change_up = per_layer(target_up)
+    n1_change_down = per_layer(target_down)
+
+    # Uniform change over the correlated layers of each site
+    c_site = site[correlated]
+    c_ti = ti[correlated]
+    c_n1 = n1[correlated]
+    c_exp = exponent[correlated]
+
+    c_tv = np.bincount(c_site, weights=c_ti / vsi[correlated], minlength=n_sites)
+    fixed = total_tv - c_tv
+    has_corr = np.bincount(c_site, minlength=n_sites) > 0
+
+    # Upward: bracket by doubling until the sum drops to the target
+    can_up = has_corr & (fixed < target_up)
+    hi = np.where(can_up, 1.0, np.nan)
+    for _ in range(40):
+        total = fixed + _correlated_sums(
+            c_site, c_ti, c_n1, c_exp, coefficient, np.nan_to_num(hi), n_sites
+        )
+        short = can_up & (total > target_up)
+        if not short.any():
+            break
+        hi = np.where(short, hi * 2, hi)
+    else:
+        hi = np.where(short, np.nan, hi)
+
+    uniform_up, _ = _uniform_n1_change(
+        target_up, fixed, c_site, c_ti, c_n1, c_exp, coefficient,
+        np.where(can_up, 0.0, np.nan), hi
+    )
+
+    # Downward: N1 may only fall until the lowest correlated
+    # layer reaches the correlation's minimum
+    min_n1 = np.full(n_sites, np.inf)
+    np.minimum.at(min_n1, c_site, c_n1)
+    lo = np.where(has_corr, n1_min - min_n1, np.nan)
+    total_lo = fixed + _correlated_sums(
+        c_site, c_ti, c_n1, c_exp, coefficient, np.nan_to_num(lo), n_sites
+    )
+    can_down = has_corr & (total_lo >= target_down)
+
+    _, uniform_down = _uniform_n1_change(
+        target_down, fixed, c_site, c_ti, c_n1, c_exp, coefficient,
+        np.where(can_down, lo, np.nan), np.where(can_down, 0.0, np.nan)
+    )
+
+    return {
+        "offsets": offsets,
+        "weighted_vs": weighted_vs,
+        **margins,
+        "uniform_n1_change_up": uniform_up,
+        "uniform_n1_change_down": uniform_down,
+        "dvs_dvsi": dvs_dvsi,
+        "dvs_dti": dvs_dti,
+        "n1_change_up": n1_change_up,
+        "n1_change_down": n1_change_down,
+    }
@@ -0,0 +1,175 @@
+import numpy as np
+
+# Vs correlation Vsi = coefficient * [(N1)60]^x, with the exponent
+# per soil type for fines < 15% "No" / "Yes". Soils not listed,
+# and N1 below n1_min, always use the user Vsi.
+IS_1893_2025_CORRELATION = {
+    "name": "IS 1893 : 2025",
+    "coefficient": 80,
+    "n1_min": 10,
+    "exponents": {
+        "Saturated Sands": (0.3, 0.4),
+        "Dry Sands": (0.3, 0.5),
+        "Clays": (0.3, 0.3),
+    },
+}
+
+# Registered code editions by key. Classes are listed from the
+# slowest to the fastest band, with one threshold between each
+# pair; a Vs equal to a threshold falls in the faster class.
+# depth is None when the site's own depth of influence applies,
+# or a fixed averaging depth in m (Vs30-style definitions).
+EDITIONS = {}
+
+DEFAULT_EDITION_KEY = "is1893_2025"
+
+
+def register_edition(key, name, classes, thresholds, correlation,
+                     depth=None, table=None, clause=None):
+    """
+    Adds a code edition to EDITIONS and returns it.
+    """
+
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+
+    if len(classes) != len(thresholds) + 1:
+        raise ValueError("An edition needs one class more than thresholds.")
+    if np.any(np.diff(thresholds) <= 0):
+        raise ValueError("Class thresholds must increase.")
+    if depth is not None and depth <= 0:
+        raise ValueError("Averaging depth must be greater than zero.")
+
+    edition = {
+        "key": key,
+        "name": name,
+        "classes": np.array(classes),
+        "thresholds": thresholds,
+        "correlation": correlation,
+        "depth": depth,
+        "table": table or f"{name} Site Classes",
+        "clause": clause,
+    }
+    EDITIONS[key] = edition
+    return edition
+
+
+def get_edition(edition=None):
+    """
+    Resolves an edition given as None (the default), a key,
+    or an edition dict.
+    """
+
+    if edition is None:
+        return EDITIONS[DEFAULT_EDITION_KEY]
+    if isinstance(edition, dict):
+        return edition
+    try:
+        return EDITIONS[edition]
+    except KeyError:
+        raise ValueError(f"Unknown code edition: {edition}") from None
+
+
+def class_index(weighted_vs, edition=None):
+    """
+    Index into the edition's classes for each weighted Vs.
+    """
+
+    return np.searchsorted(get_edition(edition)["thresholds"], weighted_vs, side="right")
+
+
+def classify(weighted_vs, edition=None):
+    """
+    Site class for a weighted Vs, or an array of classes.
+    NaN and infinite Vs have no class and raise ValueError.
+    """
+
+    if not np.all(np.isfinite(weighted_vs)):
+        raise ValueError("Weighted Vs must be a finite number.")
+
+    edition = get_edition(edition)
+    labels = edition["classes"][class_index(weighted_vs, edition)]
+    return str(labels) if np.ndim(labels) == 0 else labels
+
+
+def site_class_bands(edition=None):
+    """
+    (site class, lower Vs, upper Vs) per class, fastest first;
+    None leaves a band open-ended.
+    """
+
+    edition = get_edition(edition)
+    bounds = [None] + [float(t) for t in edition["thresholds"]] + [None]
+
+    bands = [
+        (str(label), bounds[i], bounds[i + 1])
+        for i, label in enumerate(edition["classes"])
+    ]
+    return bands[::-1]
+
+
+def _number(value):
+    return f"{value:g}"
+
+
+def band_labels(edition=None, vs="Vₛ", less="<"):
+    """
+    (site class, range text) per class, fastest first, such as
+    "760 ≤ Vₛ < 1500". vs and less let HTML callers pass markup.
+    """
+
+    labels = []
+    for site_class, low, high in site_class_bands(edition):
+        if low is None:
+            text = f"{vs} {less} {_number(high)}"
+        elif high is None:
+            text = f"{vs} ≥ {_number(low)}"
+        else:
+            text = f"{_number(low)} ≤ {vs} {less} {_number(high)}"
+        labels.append((site_class, text))
+    return labels
+
+
+register_edition(
+    "is1893_2025",
+    "IS 1893 : 2025",
+    ["E", "D", "C", "B", "A"],
+    [180, 360, 760, 1500],
+    IS_1893_2025_CORRELATION,
+    table="Table 4 Site Classes for Estimating Normalised PSA",
+    clause="Clause 6.2.3.1(a)",
+)
+
+register_edition(
+    "is1893_2025_vs30",
+    "IS 1893 : 2025 (Vs30)",
+    ["E", "D", "C", "B", "A"],
+    [180, 360, 760, 1500],
+    IS_1893_2025_CORRELATION,
+    depth=30.0,
+    table="Table 4 Site Classes, Vs averaged over the top 30 m",
+    clause="Clause 6.2.3.1(a)",
+)
+
+# The codes below define no N1 correlation of their own; the
+# IS 1893 one converts the same borehole inputs.
+register_edition(
+    "asce7_16",
+    "ASCE 7-16",
+    ["E", "D", "C", "B", "A"],
+    [183, 366, 762, 1524],
+    IS_1893_2025_CORRELATION,
+    depth=30.0,
+    table="Table 20.3-1 Site Classification",
+    clause="Chapter 20",
+)
+
+register_edition(
+    "en1998_1_2004",
+    "EN 1998-1 : 2004",
+    ["D", "C", "B", "A"],
+    [180, 360, 800],
+    IS_1893_2025_CORRELATION,
+    depth=30.0,
+    table="Table 3.1 Ground Types",
+    clause="Clause 3.1.2",
+)
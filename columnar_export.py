@@ -0,0 +1,399 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+
+from backend import SOIL_TYPES
+from batch_engine import calculate_site_class_batch
+from site_model import FINES_VALUES, SiteArray
+
+# Site-level and per-layer tables, as (column, Arrow type name).
+# Partition columns are kept out of the files and encoded in the
+# directory names instead (Hive style: site_class=D/).
+SITE_SCHEMA = [
+    ("site_id", "string"),
+    ("weighted_vs", "float64"),
+    ("site_class", "string"),
+    ("layers_used", "int32"),
+    ("error", "string"),
+]
+LAYER_SCHEMA = [
+    ("site_id", "string"),
+    ("site_class", "string"),
+    ("layer", "int32"),
+    ("soil_type", "string"),
+    ("fines", "string"),
+    ("n1", "float64"),
+    ("effective_thickness", "float64"),
+    ("computed_vsi", "float64"),
+    ("ti_over_vsi", "float64"),
+]
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+DEFAULT_PARTITION = "site_class"
+DEFAULT_COMPRESSION = "zstd"
+
+# Hive's name for the partition of null values (sites with errors)
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# Sites per record batch. Every batch becomes one Parquet row group
+# (or Arrow record batch) per partition and is then released.
+BATCH_SITES = 65536
+
+
+def _pyarrow():
+    # pyarrow is only needed for this export
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "Parquet/Arrow export needs pyarrow (pip install pyarrow)."
+        ) from None
+    return pyarrow
+
+
+class ColumnarWriter:
+    """
+    Writes the sites and layers tables under out_dir as
+    out_dir/sites/ and out_dir/layers/, each a dataset of
+    compressed Parquet or Arrow IPC files partitioned by
+    partition_by (None for one file per table). Batches are
+    appended as they come, one open file per partition; every
+    run writes files of its own, so several runs can add to
+    the same dataset.
+    """
+
+    def __init__(self, out_dir, format="parquet", partition_by=DEFAULT_PARTITION,
+                 compression=DEFAULT_COMPRESSION):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format: {format}")
+        if partition_by not in (None, "site_class"):
+            raise ValueError(f"Cannot partition by {partition_by}.")
+
+        pa = _pyarrow()
+        self.pa = pa
+        self.out_dir = out_dir
+        self.format = format
+        self.partition_by = partition_by
+        self.compression = compression
+        self.run = uuid.uuid4().hex[:12]
+
+        self.schemas = {
+            "sites": pa.schema([(name, getattr(pa, kind)()) for name, kind in SITE_SCHEMA]),
+            "layers": pa.schema([(name, getattr(pa, kind)()) for name, kind in LAYER_SCHEMA]),
+        }
+        self._writers = {}
+        self.rows = {"sites": 0, "layers": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _file_schema(self, table):
+        schema = self.schemas[table]
+        if self.partition_by is not None:
+            schema = schema.remove(schema.get_field_index(self.partition_by))
+        return schema
+
+    def _writer(self, table, value):
+        key = (table, value)
+        writer = self._writers.get(key)
+        if writer is not None:
+            return writer
+
+        folder = os.path.join(self.out_dir, table)
+        if self.partition_by is not None:
+            name = NULL_PARTITION if value is None else value
+            folder = os.path.join(folder, f"{self.partition_by}={name}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"part-{self.run}{FORMATS[self.format]}")
+
+        pa = self.pa
+        schema = self._file_schema(table)
+        if self.format == "parquet":
+            writer = pa.parquet.ParquetWriter(path, schema, compression=self.compression)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            writer = pa.ipc.new_file(path, schema, options=options)
+
+        self._writers[key] = writer
+        return writer
+
+    def write(self, table, columns):
+        """
+        Appends one batch of a table, given as a dict of equal
+        length arrays or lists per column.
+        """
+
+        pa = self.pa
+        schema = self.schemas[table]
+        batch = pa.record_batch(
+            [pa.array(columns[field.name], type=field.type) for field in schema],
+            schema=schema,
+        )
+        if batch.num_rows == 0:
+            return
+        self.rows[table] += batch.num_rows
+
+        if self.partition_by is None:
+            self._writer(table, None).write_batch(batch)
+            return
+
+        key = batch.column(self.partition_by)
+        rest = batch.drop_columns([self.partition_by])
+        for value in key.unique().to_pylist():
+            mask = key.is_null() if value is None else pa.compute.equal(key, value)
+            part = rest.filter(mask)
+            if part.num_rows:
+                self._writer(table, value).write_batch(part)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+
+# ---------------- From result records ----------------
+
+def _empty(schema):
+    return {name: [] for name, _ in schema}
+
+
+def _append_result(sites, layers, site_id, result):
+    site_id = str(site_id)
+    error = result.get("error")
+    site_class = None if error is not None else str(result["site_class"])
+
+    sites["site_id"].append(site_id)
+    sites["weighted_vs"].append(None if error is not None else result["weighted_vs"])
+    sites["site_class"].append(site_class)
+    sites["layers_used"].append(None if error is not None else result["layers_used"])
+    sites["error"].append(error)
+
+    for layer in result.get("breakdown") or ():
+        layers["site_id"].append(site_id)
+        layers["site_class"].append(site_class)
+        for name in ("layer", "soil_type", "fines", "n1", "effective_thickness",
+                     "computed_vsi", "ti_over_vsi"):
+            layers[name].append(layer[name])
+
+
+def export_records(records, out_dir, format="parquet", partition_by=DEFAULT_PARTITION,
+                   compression=DEFAULT_COMPRESSION, batch_sites=BATCH_SITES):
+    """
+    Exports (site_id, result) records, such as those yielded by
+    site_class_cli.classify_stream, buffering at most batch_sites
+    sites before each batch is written. Layers come from
+    result["breakdown"] when present. Returns the rows written
+    per table.
+    """
+
+    with ColumnarWriter(out_dir, format, partition_by, compression) as writer:
+        sites, layers = _empty(SITE_SCHEMA), _empty(LAYER_SCHEMA)
+        buffered = 0
+
+        for site_id, result in records:
+            _append_result(sites, layers, site_id, result)
+
+            buffered += 1
+            if buffered >= batch_sites:
+                writer.write("sites", sites)
+                writer.write("layers", layers)
+                sites, layers = _empty(SITE_SCHEMA), _empty(LAYER_SCHEMA)
+                buffered = 0
+
+        writer.write("sites", sites)
+        writer.write("layers", layers)
+
+    return dict(writer.rows)
+
+
+# ---------------- From the batch engine ----------------
+
+def _layer_text(sites, first, last):
+    """
+    Soil type and fines strings of records first:last, decoded
+    from their codes with the non-standard strings put back.
+    """
+
+    if isinstance(sites, SiteArray):
+        soil, fines = sites.records["soil"][first:last], sites.records["fines"][first:last]
+    else:
+        soil, fines = sites.soil[first:last], sites.fines[first:last]
+
+    # Codes past the known values only occur on layers with text
+    soil_names = np.array(list(SOIL_TYPES) + [""], dtype=object)
+    fines_names = np.array(FINES_VALUES + [""], dtype=object)
+    soil_type = soil_names[soil]
+    fines_text = fines_names[fines]
+
+    for i, (soil_text, fines_value) in sites.text.items():
+        if first <= i < last:
+            soil_type[i - first] = soil_text
+            fines_text[i - first] = fines_value
+
+    return soil_type, fines_text
+
+
+def _layer_numbers(sites, first, last):
+    if isinstance(sites, SiteArray):
+        return sites.records["layer"][first:last], sites.records["n1"][first:last]
+    return sites.layer[first:last], sites.n1[first:last]
+
+
+def _site_ids(sites, site_ids, start, stop):
+    if site_ids is not None:
+        return [str(site_id) for site_id in site_ids[start:stop]]
+    if isinstance(sites, SiteArray):
+        return [str(k) for k in range(start, stop)]
+    return sites.site_ids(start, stop)
+
+
+def _batch_tables(sites, site_ids, start, stop, edition):
+    """
+    Sites and layers columns of sites start:stop from one
+    calculate_site_class_batch call, or None if some site in
+    the range is invalid.
+    """
+
+    columns = sites.columns(start, stop)
+    try:
+        out = calculate_site_class_batch(**columns, breakdown=True, edition=edition)
+    except ValueError:
+        return None
+
+    ids = np.array(_site_ids(sites, site_ids, start, stop), dtype=object)
+    site_class = out["site_class"].astype(object)
+
+    offsets = columns["offsets"]
+    first = int(sites.offsets[start])
+    last = first + int(offsets[-1])
+
+    # Only the layers that entered the average, as in the
+    # scalar breakdown
+    used = out["used"]
+    owner = np.repeat(np.arange(stop - start), np.diff(offsets))[used]
+    layer_no, n1 = _layer_numbers(sites, first, last)
+    soil_type, fines = _layer_text(sites, first, last)
+
+    site_table = {
+        "site_id": ids,
+        "weighted_vs": out["weighted_vs"],
+        "site_class": site_class,
+        "layers_used": out["layers_used"],
+        "error": [None] * (stop - start),
+    }
+    layer_table = {
+        "site_id": ids[owner],
+        "site_class": site_class[owner],
+        "layer": layer_no[used],
+        "soil_type": soil_type[used],
+        "fines": fines[used],
+        "n1": n1[used],
+        "effective_thickness": out["effective_thickness"][used],
+        "computed_vsi": out["computed_vsi"][used],
+        "ti_over_vsi": out["ti_over_vsi"][used],
+    }
+    return site_table, layer_table
+
+
+def _scalar_records(sites, site_ids, start, stop, edition):
+    from backend import calculate_site_class
+
+    ids = _site_ids(sites, site_ids, start, stop)
+    for k, site_id in zip(range(start, stop), ids):
+        try:
+            yield site_id, calculate_site_class(sites.site(k).to_dict(), edition)
+        except ValueError as e:
+            yield site_id, {"error": str(e)}
+
+
+def export_sites(sites, out_dir, site_ids=None, format="parquet",
+                 partition_by=DEFAULT_PARTITION, compression=DEFAULT_COMPRESSION,
+                 batch_sites=BATCH_SITES, edition=None):
+    """
+    Classifies a SiteArray or BoreholeArchive with the batch engine,
+    batch_sites sites at a time, and writes each batch as soon as
+    it is computed. A batch holding an invalid site is classified
+    site by site instead, so its errors are exported per site.
+    Returns the rows written per table.
+    """
+
+    with ColumnarWriter(out_dir, format, partition_by, compression) as writer:
+        for start in range(0, len(sites), batch_sites):
+            stop = min(start + batch_sites, len(sites))
+
+            tables = _batch_tables(sites, site_ids, start, stop, edition)
+            if tables is None:
+                # Reuse the record path for this batch only
+                sites_part, layers_part = _empty(SITE_SCHEMA), _empty(LAYER_SCHEMA)
+                for site_id, result in _scalar_records(sites, site_ids, start, stop, edition):
+                    _append_result(sites_part, layers_part, site_id, result)
+                tables = sites_part, layers_part
+
+            writer.write("sites", tables[0])
+            writer.write("layers", tables[1])
+
+    return dict(writer.rows)
+
+
+# ---------------- Command line ----------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Classify sites and export results and per-layer "
+                    "breakdowns as Parquet or Arrow IPC datasets."
+    )
+    parser.add_argument("input",
+                        help="borehole archive, or NDJSON, CSV or xlsx logs")
+    parser.add_argument("-o", "--output", required=True, metavar="DIR")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--compression", default=DEFAULT_COMPRESSION,
+                        help="codec, e.g. zstd, lz4, snappy (Parquet) or none")
+    parser.add_argument("--no-partition", action="store_true",
+                        help="one file per table instead of one per site class")
+    parser.add_argument("--batch-sites", type=int, default=BATCH_SITES)
+    parser.add_argument("--edition", default=None)
+    args = parser.parse_args(argv)
+
+    compression = None if args.compression == "none" else args.compression
+    partition_by = None if args.no_partition else DEFAULT_PARTITION
+    start = time.perf_counter()
+
+    from borehole_archive import MAGIC, BoreholeArchive, read_log_records
+
+    with open(args.input, "rb") as f:
+        is_archive = f.read(len(MAGIC)) == MAGIC
+
+    if is_archive:
+        rows = export_sites(
+            BoreholeArchive(args.input), args.output, None, args.format,
+            partition_by, compression, args.batch_sites, args.edition,
+        )
+    else:
+        from site_class_cli import classify_stream
+
+        if args.edition is not None:
+            parser.error("--edition needs a borehole archive as input")
+        rows = export_records(
+            classify_stream(read_log_records(args.input)), args.output, args.format,
+            partition_by, compression, args.batch_sites,
+        )
+
+    print(
+        f"{rows['sites']} sites and {rows['layers']} layers written to "
+        f"{args.output} in {time.perf_counter() - start:.2f} s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import numpy as np
+
+from backend import compute_layer_vsi, determine_site_class
+from batch_engine import determine_site_class_batch
+
+
+class DepthProfile:
+    """
+    Precomputed prefix sums of a site's layers.
+    Weighted Vs for any depth of influence is found with a
+    binary search plus one partial layer, instead of rescanning
+    every layer as compute_weighted_vs does.
+    """
+
+    def __init__(self, layers):
+
+        self.thickness = np.array([layer["thickness"] for layer in layers], dtype=np.float64)
+        self.vsi = np.array([compute_layer_vsi(layer) for layer in layers], dtype=np.float64)
+
+        n = len(layers)
+
+        # cum_t[k] / cum_tv[k] hold the sums over the first k layers,
+        # accumulated left to right like the scalar loop.
+        self.cum_t = np.zeros(n + 1)
+        self.cum_tv = np.zeros(n + 1)
+        np.cumsum(self.thickness, out=self.cum_t[1:])
+
+        # Vsi <= 0 only matters once a depth reaches that layer
+        bad = np.flatnonzero(self.vsi <= 0)
+        self.first_bad = bad[0] if len(bad) else n
+
+        if self.first_bad:
+            np.cumsum(
+                self.thickness[:self.first_bad] / self.vsi[:self.first_bad],
+                out=self.cum_tv[1:self.first_bad + 1]
+            )
+
+    @classmethod
+    def from_site_data(cls, site_data):
+        return cls(site_data["layers"])
+
+    @property
+    def total_thickness(self):
+        return float(self.cum_t[-1])
+
+    def weighted_vs(self, depth):
+        """
+        Weighted Vs for a depth of influence, or an array of them.
+        Raises the same ValueErrors as compute_weighted_vs.
+        """
+
+        d = np.asarray(depth, dtype=np.float64)
+        scalar = d.ndim == 0
+        d = np.atleast_1d(d)
+
+        n = len(self.thickness)
+
+        # Index of the layer containing each depth
+        k = np.searchsorted(self.cum_t[1:], d, side="left")
+
+        # The scalar loop meets every layer before it runs out of
+        # thickness, so a bad Vsi is reported first
+        if np.any(k >= n):
+            if self.first_bad < n:
+                raise ValueError("Vsi must be greater than zero.")
+            raise ValueError("Total thickness is less than depth of influence.")
+
+        cum = self.cum_t[k]
+        denominator = self.cum_tv[k]
+        pending = np.arange(len(d))
+
+        # A single pass, unless zero or negative thicknesses leave
+        # the prefix sums out of order.
+        while len(pending):
+
+            kp = k[pending]
+            if np.any(kp >= self.first_bad):
+                raise ValueError("Vsi must be greater than zero.")
+            if np.any(kp >= n):
+                raise ValueError("Total thickness is less than depth of influence.")
+
+            c = cum[pending]
+            dp = d[pending]
+            t = self.thickness[kp]
+            cut = c + t > dp
+            ti = np.where(cut, dp - c, t)
+
+            # A cut layer ends exactly at the depth, as in the scalar loop
+            cum[pending] = np.where(cut, dp, c + ti)
+            denominator[pending] += ti / self.vsi[kp]
+            k[pending] = kp + 1
+
+            pending = pending[cum[pending] < dp]
+
+        if np.any(denominator == 0):
+            raise ValueError("Invalid denominator in Vs calculation.")
+
+        weighted_vs = cum / denominator
+
+        return float(weighted_vs[0]) if scalar else weighted_vs
+
+    def site_class(self, depth):
+        """
+        Site class per Table 4 for a depth of influence, or an array of them.
+        """
+
+        weighted_vs = self.weighted_vs(depth)
+
+        if np.ndim(weighted_vs) == 0:
+            return determine_site_class(weighted_vs)
+
+        return determine_site_class_batch(weighted_vs)
+
+    def sweep(self, start, stop, step):
+        """
+        Weighted Vs and site class over depths start..stop (inclusive).
+        Depths beyond the total thickness are dropped.
+        """
+
+        depths = np.arange(start, stop + step / 2, step)
+        depths = depths[(depths > 0) & (depths <= self.cum_t[-1])]
+
+        weighted_vs = self.weighted_vs(depths)
+
+        return depths, weighted_vs, determine_site_class_batch(weighted_vs)
@@ -0,0 +1,193 @@
+import itertools
+import os
+
+from openpyxl import load_workbook
+
+from site_records import normalize_header, site_from_rows, to_number
+
+# Header rows are looked for within this many rows of the top
+HEADER_SEARCH_ROWS = 10
+
+REPORT_TITLE = "Site Class Determination Report"
+
+# Sheet holding the full interval list of a high-resolution report
+INTERVALS_SHEET = "Intervals"
+
+
+def _is_report(first_row):
+    return any(
+        isinstance(value, str) and value.startswith(REPORT_TITLE)
+        for value in first_row
+    )
+
+
+def _read_report(rows):
+    """
+    Recovers site_data from a Site_Class_Report.xlsx sheet.
+    Layer thicknesses are the effective ones written to the report,
+    and the user Vsi is only known for layers where the report
+    shows no correlation formula. Returns None for reports whose
+    rows group the intervals of a high-resolution profile.
+    """
+
+    depth = None
+    layers = []
+
+    for r, row in enumerate(rows, 1):
+        row = row + (None,) * (28 - len(row))
+
+        if r == 7:
+            depth = float(row[7])            # H7
+
+        if r < 11:
+            continue
+
+        label = row[1]                       # B
+        if not (isinstance(label, str) and label.startswith("Layer")):
+            break
+
+        # High-resolution reports show grouped layers; the
+        # intervals themselves are on their own sheet.
+        if label.startswith("Layers "):
+            return None
+
+        formula = row[19]                    # T
+        layers.append({
+            "layer": len(layers) + 1,
+            "thickness": float(row[4]),      # E
+            "soil_type": row[8],             # I
+            "fines_less_than_15": row[13] if row[13] in ("Yes", "No") else "",
+            "n1": to_number(row[16]),        # Q
+            "vsi": float(row[24]) if formula == "NA" else 0.0,   # Y
+        })
+
+    return _reach_depth({
+        "depth_of_influence": depth,
+        "num_layers": len(layers),
+        "layers": layers,
+    })
+
+
+def _reach_depth(site_data):
+    """
+    Rounded effective thicknesses can fall an ulp short of the
+    depth; the last layer always reached it in the original run.
+    """
+
+    layers = site_data["layers"]
+    if layers:
+        above = sum(layer["thickness"] for layer in layers[:-1])
+        layers[-1]["thickness"] = max(
+            layers[-1]["thickness"], site_data["depth_of_influence"] - above
+        )
+    return site_data
+
+
+def _read_table(sheet_name, rows):
+    """
+    Yields (site_id, site_data) from a layer table. With a site id
+    column the rows are grouped into sites (rows of one site must be
+    consecutive); without one the whole sheet is one site, whose
+    depth of influence may also sit on a line above the header.
+    """
+
+    header = None
+    depth = None
+
+    for row in itertools.islice(rows, HEADER_SEARCH_ROWS):
+        fields = [normalize_header(value) for value in row]
+        if "thickness" in fields and "soil_type" in fields:
+            header = fields
+            break
+
+        # A "Depth of Influence | 12.5" line above a single-site table
+        if "depth_of_influence" in fields:
+            i = fields.index("depth_of_influence")
+            values = [v for v in row[i + 1:] if v is not None]
+            if values:
+                depth = float(values[0])
+
+    if header is None:
+        return
+
+    def records():
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            yield {
+                field: value for field, value in zip(header, row) if field
+            }
+
+    if "site_id" in header:
+        groups = itertools.groupby(records(), key=lambda rec: str(rec["site_id"]))
+    else:
+        groups = [(sheet_name, records())]
+
+    for site_id, group in groups:
+        try:
+            yield site_id, site_from_rows(group, depth)
+        except (KeyError, TypeError, ValueError):
+            for _ in group:
+                pass
+            yield site_id, None
+
+
+def iter_workbook_sites(path):
+    """
+    Streams (site_id, site_data) from a borehole workbook, one site
+    at a time, using openpyxl's read-only mode.
+
+    Each sheet is either a long-format layer table (one row per
+    layer, grouped by a site id column), a single-site layer table
+    named after the borehole, or a Site_Class_Report.xlsx sheet.
+    A report of a high-resolution profile is read from its
+    Intervals sheet instead of the grouped layer rows.
+    Sites that cannot be parsed yield site_data = None.
+    """
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    intervals = None
+    if INTERVALS_SHEET in wb.sheetnames:
+        intervals = wb[INTERVALS_SHEET]
+    n_sheets = len(wb.worksheets) - (intervals is not None)
+
+    try:
+        for ws in wb.worksheets:
+            if ws is intervals:
+                continue
+
+            rows = ws.iter_rows(values_only=True)
+            first = next(rows, None)
+            if first is None:
+                continue
+
+            if _is_report(first):
+                site_id = stem if n_sheets == 1 else f"{stem}/{ws.title}"
+                try:
+                    site_data = _read_report(itertools.chain([first], rows))
+                    if site_data is None and intervals is not None:
+                        sites = _read_table(site_id, intervals.iter_rows(values_only=True))
+                        site_data = next(sites, (site_id, None))[1]
+                        if site_data is not None:
+                            site_data = _reach_depth(site_data)
+                except (TypeError, ValueError):
+                    site_data = None
+                yield site_id, site_data
+                continue
+
+            yield from _read_table(ws.title, itertools.chain([first], rows))
+    finally:
+        wb.close()
+
+
+def classify_workbook(path, workers=1):
+    """
+    Yields (site_id, result) for every site in the workbook,
+    classified through the batch runner in input order.
+    """
+
+    from site_class_cli import classify_stream
+
+    return classify_stream(iter_workbook_sites(path), workers)
@@ -0,0 +1,182 @@
+import csv
+import io
+import os
+import re
+
+import numpy as np
+
+from site_records import normalize_fines, normalize_soil, to_number
+
+# Accepted column headers of a profile file. Depths are to the
+# bottom of each interval unless a top column is also given.
+PROFILE_ALIASES = {
+    "top": ["top", "top_m", "depth_from", "from"],
+    "bottom": ["bottom", "bottom_m", "depth", "depth_m", "depth_to", "to", "z"],
+    "thickness": ["thickness", "thickness_m", "ti", "dz"],
+    "vs": ["vs", "vs_m/s", "vsi", "shear_wave_velocity"],
+    "soil_type": ["soil_type", "soil"],
+    "fines": ["fines", "fines_less_than_15", "fines_lt_15"],
+    "n1": ["n1", "n160", "(n1)60", "spt_n1"],
+}
+
+_PROFILE_LOOKUP = {
+    alias: field for field, aliases in PROFILE_ALIASES.items() for alias in aliases
+}
+
+# Gaps or overlaps between intervals smaller than this are
+# treated as rounding in the exported depths.
+DEPTH_TOLERANCE = 1e-6
+
+
+def _profile_field(name):
+    if name is None:
+        return None
+    key = str(name).strip().lower().replace(" ", "_").replace("-", "_")
+    if key not in _PROFILE_LOOKUP:
+        # Drop a unit suffix such as "Depth (m)" or "Vs [m/s]"
+        key = re.sub(r"_*[(\[][^)\]]*[)\]]$", "", key)
+    return _PROFILE_LOOKUP.get(key)
+
+
+def profile_from_rows(rows):
+    """
+    Builds site_data layers from tabular profile rows, the first
+    holding the headers. Needs a Vs column plus either interval
+    depths or thicknesses; soil type defaults to "Others", so the
+    measured Vs is used as given.
+    """
+
+    rows = iter(rows)
+    header = [_profile_field(name) for name in next(rows, [])]
+
+    if "vs" not in header:
+        raise ValueError("Profile needs a Vs column.")
+    if "bottom" not in header and "thickness" not in header:
+        raise ValueError("Profile needs a depth or thickness column.")
+
+    columns = {field: [] for field in header if field}
+    for row in rows:
+        if all(value in (None, "") for value in row):
+            continue
+        for field, value in zip(header, row):
+            if field:
+                columns[field].append(value)
+
+    n = len(columns["vs"])
+    if n == 0:
+        raise ValueError("Profile has no intervals.")
+
+    vs = np.array([float(to_number(v)) for v in columns["vs"]])
+
+    if "thickness" in columns:
+        thickness = np.array([float(to_number(v)) for v in columns["thickness"]])
+    else:
+        bottom = np.array([float(to_number(v)) for v in columns["bottom"]])
+        if "top" in columns:
+            top = np.array([float(to_number(v)) for v in columns["top"]])
+        else:
+            top = np.concatenate(([0.0], bottom[:-1]))
+
+        if np.any(np.abs(top[1:] - bottom[:-1]) > DEPTH_TOLERANCE):
+            raise ValueError("Profile intervals must be contiguous.")
+        thickness = bottom - top
+
+    if np.any(thickness <= 0):
+        raise ValueError("Profile depths must increase down the profile.")
+
+    soil = columns.get("soil_type", [None] * n)
+    fines = columns.get("fines", [None] * n)
+    n1 = columns.get("n1", [None] * n)
+
+    return [
+        {
+            "layer": i + 1,
+            "thickness": float(thickness[i]),
+            "soil_type": normalize_soil(soil[i] or "Others"),
+            "fines_less_than_15": normalize_fines(fines[i]),
+            "n1": to_number(n1[i]),
+            "vsi": float(vs[i]),
+        }
+        for i in range(n)
+    ]
+
+
+def read_profile(data, filename):
+    """
+    Reads profile layers from uploaded file bytes: CSV or
+    whitespace/tab separated text, or the first sheet of an xlsx.
+    """
+
+    ext = os.path.splitext(filename.lower())[1]
+
+    if ext in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+        wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        try:
+            return profile_from_rows(wb.worksheets[0].iter_rows(values_only=True))
+        finally:
+            wb.close()
+
+    text = data.decode("utf-8-sig")
+    lines = [line for line in text.splitlines() if line.strip()]
+
+    if not lines:
+        raise ValueError("Profile file is empty.")
+
+    for delimiter in (",", ";"):
+        if delimiter in lines[0]:
+            return profile_from_rows(csv.reader(lines, delimiter=delimiter))
+
+    return profile_from_rows(line.split() for line in lines)
+
+
+def aggregate_breakdown(breakdown, max_layers):
+    """
+    Merges consecutive breakdown intervals into at most max_layers
+    engineering layers. Boundaries go where the soil type changes
+    and then at the largest Vs contrasts. Each merged layer keeps
+    Σtᵢ and Σ(tᵢ/Vₛᵢ) of its intervals, so its Vsi is their harmonic
+    average and the weighted Vs of the site is unchanged.
+    """
+
+    n = len(breakdown)
+    if n <= max_layers:
+        return breakdown
+
+    vsi = np.array([layer["computed_vsi"] for layer in breakdown])
+    soil = [layer["soil_type"] for layer in breakdown]
+
+    contrast = np.abs(np.log(vsi[1:] / vsi[:-1]))
+    contrast[[a != b for a, b in zip(soil[:-1], soil[1:])]] = np.inf
+
+    cuts = np.argpartition(contrast, -(max_layers - 1))[-(max_layers - 1):]
+    bounds = np.concatenate(([0], np.sort(cuts) + 1, [n]))
+
+    layers = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        group = breakdown[start:stop]
+
+        ti = 0.0
+        ti_over_vsi = 0.0
+        by_soil = {}
+        for layer in group:
+            ti += layer["effective_thickness"]
+            ti_over_vsi += layer["ti_over_vsi"]
+            by_soil[layer["soil_type"]] = (
+                by_soil.get(layer["soil_type"], 0.0) + layer["effective_thickness"]
+            )
+
+        fines = {layer["fines"] for layer in group}
+
+        layers.append({
+            "layer": len(layers) + 1,
+            "intervals": (group[0]["layer"], group[-1]["layer"]),
+            "effective_thickness": ti,
+            "soil_type": max(by_soil, key=by_soil.get),
+            "fines": fines.pop() if len(fines) == 1 else "",
+            "n1": None,
+            "computed_vsi": ti / ti_over_vsi,
+            "ti_over_vsi": ti_over_vsi,
+        })
+
+    return layers
@@ -0,0 +1,138 @@
+import re
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+SUMMARY_TITLE = "Summary"
+
+SUMMARY_HEADER = [
+    "Site ID", "Weighted Vs (m/s)", "Site Class", "Layers Used", "Error",
+]
+
+BREAKDOWN_HEADER = [
+    "Layer", "Effective Thickness (m)", "Soil Type", "Fines < 15%",
+    "(N1)60", "Computed Vsi (m/s)", "ti / Vsi",
+]
+
+# Excel limits on worksheet names
+MAX_SHEET_TITLE = 31
+_INVALID_TITLE_CHARS = re.compile(r"[\\/*?:\[\]]")
+
+HEADER_FONT = Font(bold=True)
+
+
+def _header_row(ws, titles):
+    row = []
+    for title in titles:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = HEADER_FONT
+        row.append(cell)
+    return row
+
+
+def _sheet_title(site_id, used):
+    """
+    Turns a site id into a unique, valid worksheet name.
+    Excel compares sheet names case-insensitively.
+    """
+
+    base = _INVALID_TITLE_CHARS.sub("_", str(site_id)).strip("'") or "Site"
+    title = base[:MAX_SHEET_TITLE]
+
+    n = 1
+    while title.lower() in used:
+        n += 1
+        suffix = f"~{n}"
+        title = base[:MAX_SHEET_TITLE - len(suffix)] + suffix
+
+    used.add(title.lower())
+    return title
+
+
+def _write_breakdown_sheet(wb, title, site_id, result):
+    ws = wb.create_sheet(title)
+    ws.column_dimensions["B"].width = 22
+    ws.column_dimensions["C"].width = 18
+    ws.column_dimensions["F"].width = 18
+    ws.freeze_panes = "A5"
+
+    ws.append(["Site ID", site_id])
+    ws.append(["Weighted Vs (m/s)", result["weighted_vs"]])
+    ws.append(["Site Class", result["site_class"]])
+    ws.append(_header_row(ws, BREAKDOWN_HEADER))
+
+    total_thickness = 0.0
+    total_ti_over_vsi = 0.0
+
+    for layer in result["breakdown"]:
+        ws.append([
+            layer["layer"],
+            layer["effective_thickness"],
+            layer["soil_type"],
+            layer["fines"],
+            layer["n1"],
+            layer["computed_vsi"],
+            layer["ti_over_vsi"],
+        ])
+        total_thickness += layer["effective_thickness"]
+        total_ti_over_vsi += layer["ti_over_vsi"]
+
+    ws.append(["Total", total_thickness, None, None, None, None, total_ti_over_vsi])
+
+    # Flush the sheet to its temp file now rather than at save time,
+    # so a large portfolio does not hold one open file per site.
+    ws.close()
+
+
+def export_portfolio(records, output, breakdown_sheets=False):
+    """
+    Writes a multi-site workbook from (site_id, result) records,
+    such as those yielded by site_class_cli.classify_stream.
+
+    The Summary sheet has one row per site. With breakdown_sheets,
+    each classified site also gets its own sheet built from
+    result["breakdown"]. The workbook is written in openpyxl's
+    write-only mode, so rows are streamed to disk and memory does
+    not grow with the number of sites. output is a path or a
+    binary file object. Returns the number of sites written.
+    """
+
+    wb = Workbook(write_only=True)
+
+    summary = wb.create_sheet(SUMMARY_TITLE)
+    summary.column_dimensions["A"].width = 24
+    summary.column_dimensions["B"].width = 18
+    summary.column_dimensions["E"].width = 40
+    summary.freeze_panes = "A2"
+
+    header = SUMMARY_HEADER + (["Breakdown Sheet"] if breakdown_sheets else [])
+    summary.append(_header_row(summary, header))
+
+    used_titles = {SUMMARY_TITLE.lower()}
+    count = 0
+
+    for site_id, result in records:
+        count += 1
+
+        if "error" in result:
+            summary.append([site_id, None, None, None, result["error"]])
+            continue
+
+        row = [
+            site_id,
+            result["weighted_vs"],
+            result["site_class"],
+            result["layers_used"],
+            None,
+        ]
+
+        if breakdown_sheets:
+            title = _sheet_title(site_id, used_titles)
+            _write_breakdown_sheet(wb, title, site_id, result)
+            row.append(title)
+
+        summary.append(row)
+
+    wb.save(output)
+    return count
@@ -0,0 +1,134 @@
+import altair as alt
+import numpy as np
+
+from site_class_reference import SITE_CLASS_BANDS
+
+# Depth buckets the chart is downsampled to, about one per
+# pixel row at the default height.
+CHART_HEIGHT = 420
+CHART_BUCKETS = CHART_HEIGHT
+
+
+def step_series(thickness, vsi):
+    """
+    Corner points of the Vsi-against-depth step plot: each layer
+    contributes its top and bottom at its own Vsi.
+    """
+
+    thickness = np.asarray(thickness, dtype=np.float64)
+    bottom = np.cumsum(thickness)
+    top = bottom - thickness
+
+    depth = np.column_stack((top, bottom)).ravel()
+    vs = np.repeat(np.asarray(vsi, dtype=np.float64), 2)
+
+    return depth, vs
+
+
+def downsample_minmax(depth, vs, n_buckets=CHART_BUCKETS):
+    """
+    Indices of the points to keep so that at most four remain
+    per depth bucket: the first, last, slowest and fastest.
+    Every spike survives, so the downsampled step plot draws
+    the same envelope as the full one. depth must be sorted.
+    """
+
+    n = len(depth)
+    if n <= 4 * n_buckets:
+        return np.arange(n)
+
+    span = depth[-1] - depth[0]
+    if span <= 0:
+        return np.array([0, n - 1])
+
+    bucket = ((depth - depth[0]) / span * n_buckets).astype(np.intp)
+    np.minimum(bucket, n_buckets - 1, out=bucket)
+
+    # Buckets are contiguous because depth is sorted
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    ends = np.append(starts[1:], n) - 1
+
+    # Within each bucket, sorted by Vs: its first entry is the
+    # minimum and its last the maximum
+    order = np.lexsort((vs, bucket))
+
+    keep = np.concatenate((starts, ends, order[starts], order[ends]))
+    return np.unique(keep)
+
+
+def vs_profile_chart(depth, vs, depth_of_influence, weighted_vs=None,
+                     height=CHART_HEIGHT):
+    """
+    Altair step plot of Vsi against depth (depth downwards), over
+    the Table 4 class bands, with the depth of influence marked.
+    """
+
+    vs_max = max(float(np.max(vs)) if len(vs) else 0.0, weighted_vs or 0.0) * 1.1
+    depth_max = max(float(depth[-1]) if len(depth) else 0.0, depth_of_influence)
+
+    x_scale = alt.Scale(domain=[0, vs_max], nice=False)
+    y_scale = alt.Scale(domain=[0, depth_max], reverse=True, nice=False)
+
+    bands = alt.Data(values=[
+        {
+            "site_class": site_class,
+            "low": low or 0,
+            "high": min(high or vs_max, vs_max),
+        }
+        for site_class, low, high in SITE_CLASS_BANDS
+        if (low or 0) < vs_max
+    ])
+
+    band_layer = alt.Chart(bands).mark_rect(opacity=0.12).encode(
+        x=alt.X("low:Q", scale=x_scale, title="Vsi (m/s)"),
+        x2="high:Q",
+        y=alt.value(0),
+        y2=alt.value(height),
+        color=alt.Color("site_class:N", title="Site Class", sort="ascending"),
+    )
+
+    band_labels = alt.Chart(bands).mark_text(
+        baseline="top", dy=4, fontWeight="bold", opacity=0.6
+    ).transform_calculate(
+        mid="(datum.low + datum.high) / 2"
+    ).encode(
+        x=alt.X("mid:Q", scale=x_scale),
+        y=alt.value(0),
+        text="site_class:N",
+    )
+
+    series = alt.Data(values=[
+        {"depth": float(d), "vs": float(v), "order": i}
+        for i, (d, v) in enumerate(zip(depth, vs))
+    ])
+
+    profile_layer = alt.Chart(series).mark_line(color="#1f4e79", clip=True).encode(
+        x=alt.X("vs:Q", scale=x_scale, title="Vsi (m/s)"),
+        y=alt.Y("depth:Q", scale=y_scale, title="Depth (m)"),
+        order="order:Q",
+        tooltip=[
+            alt.Tooltip("depth:Q", format=".2f", title="Depth (m)"),
+            alt.Tooltip("vs:Q", format=".1f", title="Vsi (m/s)"),
+        ],
+    )
+
+    cutoff = alt.Chart(alt.Data(values=[{"depth": depth_of_influence}])).mark_rule(
+        color="firebrick", strokeDash=[6, 4]
+    ).encode(
+        y=alt.Y("depth:Q", scale=y_scale),
+        tooltip=[alt.Tooltip("depth:Q", title="Depth of Influence (m)")],
+    )
+
+    layers = [band_layer, band_labels, profile_layer, cutoff]
+
+    if weighted_vs is not None:
+        layers.append(
+            alt.Chart(alt.Data(values=[{"vs": weighted_vs}])).mark_rule(
+                color="black", strokeDash=[2, 2]
+            ).encode(
+                x=alt.X("vs:Q", scale=x_scale),
+                tooltip=[alt.Tooltip("vs:Q", format=".3f", title="Weighted Vs (m/s)")],
+            )
+        )
+
+    return alt.layer(*layers).properties(height=height)
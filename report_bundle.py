@@ -0,0 +1,222 @@
+import csv
+import io
+import itertools
+import os
+import re
+import tempfile
+import time
+import weakref
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from backend import calculate_site_class
+from report_generator import load_template, render_site_class_report
+
+SUMMARY_NAME = "summary.csv"
+SUMMARY_COLUMNS = ["site_id", "weighted_vs", "site_class", "layers_used", "error", "report"]
+
+_INVALID_NAME_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+MAX_NAME = 120
+
+# Zips the app renders for download. Each is removed when its
+# owner lets go of it (the session ends); the directory is also
+# held to MAX_BUNDLES files, and files older than BUNDLE_MAX_AGE
+# seconds, such as those of a process that died, are swept.
+BUNDLE_DIR = os.path.join(tempfile.gettempdir(), "site_class_reports")
+MAX_BUNDLES = 32
+BUNDLE_MAX_AGE = 24 * 3600
+
+
+def _render_site(site_id, site_data, edition):
+    """
+    Worker body: classifies one site and renders its report.
+    Returns (site_id, result without breakdown, xlsx bytes or None).
+    """
+
+    try:
+        result = calculate_site_class(site_data, edition)
+    except ValueError as e:
+        return site_id, {"error": str(e)}, None
+    except (KeyError, TypeError, AttributeError):
+        return site_id, {"error": "Malformed site record."}, None
+
+    report = render_site_class_report(site_data, result, edition)
+    del result["breakdown"]
+    return site_id, result, report
+
+
+def _warm_template():
+    # Parse the template once per worker; every report then
+    # starts from a cheap copy of it
+    load_template()
+
+
+def _member_name(site_id, used):
+    """
+    A unique, portable file name in the zip for a site's report.
+    """
+
+    base = _INVALID_NAME_CHARS.sub("_", str(site_id)).strip(" .") or "site"
+    base = base[:MAX_NAME]
+    name = f"{base}.xlsx"
+
+    n = 1
+    while name.lower() in used:
+        n += 1
+        name = f"{base}~{n}.xlsx"
+
+    used.add(name.lower())
+    return name
+
+
+def _iter_rendered(records, workers, edition, max_in_flight):
+    """
+    Yields (site_id, result, report) as reports finish. Records
+    are pulled lazily and at most max_in_flight sites are queued,
+    so memory does not grow with the number of sites.
+    """
+
+    if workers == 1:
+        for site_id, site_data in records:
+            if site_data is None:
+                yield site_id, {"error": "Malformed site record."}, None
+            else:
+                yield _render_site(site_id, site_data, edition)
+        return
+
+    # Forked workers inherit the parsed template from here
+    _warm_template()
+    records = iter(records)
+    pending = set()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_template) as pool:
+        while True:
+            for site_id, site_data in itertools.islice(records, max_in_flight - len(pending)):
+                if site_data is None:
+                    yield site_id, {"error": "Malformed site record."}, None
+                    continue
+                pending.add(pool.submit(_render_site, site_id, site_data, edition))
+
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+
+
+def write_report_zip(records, output, workers=None, edition=None,
+                     max_in_flight=None, progress=None):
+    """
+    Renders the report of every (site_id, site_data) record in a
+    process pool and writes each one into a zip at output (a path
+    or a binary file object) as soon as it is done. Reports are
+    added in completion order, with a summary.csv of all sites
+    last. progress, if given, is called with the number of sites
+    done after each one. Returns counts of sites, reports and
+    errors.
+    """
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+
+    counts = {"sites": 0, "reports": 0, "errors": 0}
+    used = {SUMMARY_NAME}
+
+    # xlsx files are already deflated, so they are stored as is
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as bundle, \
+            tempfile.TemporaryFile("w+", newline="", encoding="utf-8") as summary_file:
+
+        summary = csv.DictWriter(summary_file, SUMMARY_COLUMNS)
+        summary.writeheader()
+
+        for site_id, result, report in _iter_rendered(records, workers, edition, max_in_flight):
+            counts["sites"] += 1
+            row = {"site_id": site_id, **result}
+
+            if report is None:
+                counts["errors"] += 1
+            else:
+                name = _member_name(site_id, used)
+                bundle.writestr(name, report)
+                row["report"] = name
+                counts["reports"] += 1
+
+            summary.writerow(row)
+            if progress is not None:
+                progress(counts["sites"])
+
+        summary_file.seek(0)
+        info = zipfile.ZipInfo(SUMMARY_NAME, time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with bundle.open(info, "w", force_zip64=True) as member, \
+                io.TextIOWrapper(member, encoding="utf-8", newline="") as text:
+            for chunk in iter(lambda: summary_file.read(1 << 16), ""):
+                text.write(chunk)
+
+    return counts
+
+
+# ---------------- Bundles on disk ----------------
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def sweep_bundles(directory=None, max_files=MAX_BUNDLES, max_age=BUNDLE_MAX_AGE):
+    """
+    Deletes bundle zips in directory (BUNDLE_DIR by default) older
+    than max_age seconds, then the oldest ones beyond max_files.
+    Returns the number deleted.
+    """
+
+    directory = directory or BUNDLE_DIR
+
+    try:
+        entries = [e for e in os.scandir(directory) if e.name.endswith(".zip")]
+    except FileNotFoundError:
+        return 0
+
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    cutoff = time.time() - max_age
+
+    removed = 0
+    for i, entry in enumerate(entries):
+        if i >= max_files or entry.stat().st_mtime < cutoff:
+            _remove(entry.path)
+            removed += 1
+    return removed
+
+
+class BundleFile:
+    """
+    A zip in BUNDLE_DIR owned by this object. The file is deleted
+    by discard(), or when the object is garbage collected (in the
+    app, when the session holding it ends), or at exit. The
+    directory is swept before each new file, so it stays bounded
+    whatever happens to the owners.
+    """
+
+    def __init__(self, directory=None, max_files=MAX_BUNDLES):
+        directory = directory or BUNDLE_DIR
+        os.makedirs(directory, exist_ok=True)
+        # Room for this one
+        sweep_bundles(directory, max_files - 1)
+
+        fd, self.path = tempfile.mkstemp(prefix="site_class_reports_", suffix=".zip",
+                                         dir=directory)
+        os.close(fd)
+        self._finalizer = weakref.finalize(self, _remove, self.path)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def discard(self):
+        self._finalizer()
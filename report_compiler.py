@@ -0,0 +1,313 @@
+import datetime
+import io
+import re
+import struct
+import time
+import zipfile
+import zlib
+from functools import lru_cache
+
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from code_editions import EDITIONS, get_edition
+from report_generator import (
+    TEMPLATE_LAYER_ROWS, TEMPLATE_PATH, band_labels, build_formula_text,
+    build_site_class_workbook,
+)
+
+# Layer table columns written per row: label, thickness, soil
+# type, fines, N1, formula, Vsi, ti/Vsi
+LAYER_COLUMNS = (2, 5, 9, 14, 17, 20, 25, 28)
+LAYER_START = 11
+
+# Placeholder text put in every variable cell while compiling;
+# private-use characters never need escaping and never occur
+# in real values.
+SLOT = "\ue000{}\ue001"
+SLOT_RE = re.compile(
+    ' t="inlineStr"><is><t>\ue000(\\d+)\ue001</t></is></c>'
+)
+
+MODIFIED_RE = re.compile(
+    rb"(<dcterms:modified[^>]*>)[^<]*(</dcterms:modified>)"
+)
+
+SHEET_PART = "xl/worksheets/sheet1.xml"
+CORE_PART = "docProps/core.xml"
+
+
+def _xml_text(value):
+    # ElementTree's escaping of element text
+    if "&" in value:
+        value = value.replace("&", "&amp;")
+    if "<" in value:
+        value = value.replace("<", "&lt;")
+    if ">" in value:
+        value = value.replace(">", "&gt;")
+    return value
+
+
+def _cell_tail(value):
+    """
+    The end of a cell element after its r and s attributes, as
+    openpyxl writes it, or None for a value the compiled path
+    does not handle (formulas, other types, illegal characters).
+    """
+
+    if type(value) is str:
+        if value == "":
+            return ' t="inlineStr" />'
+        if value.startswith("=") or ILLEGAL_CHARACTERS_RE.search(value):
+            return None
+        stripped = value.strip()
+        space = ' xml:space="preserve"' if stripped and stripped != value else ""
+        return f' t="inlineStr"><is><t{space}>{_xml_text(value)}</t></is></c>'
+
+    if type(value) in (int, float):
+        if value != value or value in (float("inf"), float("-inf")):
+            return None
+        return ' t="n"><v>%.16g</v></c>' % value
+
+    return None
+
+
+def _deflate(data):
+    # Raw deflate exactly as zipfile writes ZIP_DEFLATED entries
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+class _ZipEntry:
+    """
+    One package part with its data compressed ahead of time.
+    """
+
+    __slots__ = ("name", "external_attr", "crc", "data", "size")
+
+    def __init__(self, name, external_attr, data):
+        self.name = name.encode("ascii")
+        self.external_attr = external_attr
+        self.crc = zlib.crc32(data)
+        self.size = len(data)
+        self.data = _deflate(data)
+
+
+
+def _zip_bytes(entries, date_time):
+    """
+    A zip holding the entries, laid out byte for byte as zipfile
+    writes ZIP_DEFLATED entries to a seekable file. The data of
+    the constant parts is then compressed only once.
+    """
+
+    dosdate = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+    dostime = date_time[3] << 11 | date_time[4] << 5 | (date_time[5] // 2)
+    info = zipfile.ZipInfo()
+
+    out = []
+    central = []
+    offset = 0
+    for entry in entries:
+        header = struct.pack(
+            zipfile.structFileHeader, zipfile.stringFileHeader,
+            info.extract_version, info.reserved, 0, zipfile.ZIP_DEFLATED,
+            dostime, dosdate, entry.crc, len(entry.data), entry.size,
+            len(entry.name), 0,
+        )
+        central.append(struct.pack(
+            zipfile.structCentralDir, zipfile.stringCentralDir,
+            info.create_version, info.create_system, info.extract_version,
+            info.reserved, 0, zipfile.ZIP_DEFLATED, dostime, dosdate,
+            entry.crc, len(entry.data), entry.size, len(entry.name), 0, 0,
+            0, info.internal_attr, entry.external_attr, offset,
+        ) + entry.name)
+        out += (header, entry.name, entry.data)
+        offset += len(header) + len(entry.name) + len(entry.data)
+
+    central = b"".join(central)
+    end = struct.pack(
+        zipfile.structEndArchive, zipfile.stringEndArchive,
+        0, 0, len(entries), len(entries), len(central), offset, 0,
+    )
+    return b"".join(out) + central + end
+
+
+class CompiledReport:
+    """
+    The openpyxl output of the report for one layout (edition,
+    number of layer rows, highlighted class row), with its
+    worksheet XML cut at every variable cell. Rendering joins
+    the cut pieces with the new cell values and compresses only
+    the worksheet and the core properties; every other part is
+    compressed once, here.
+
+    A render takes about 1 ms, most of it deflating the worksheet
+    (which must match zipfile's output), so about 1,000 reports
+    per second per core. Compiling a layout takes one openpyxl
+    save, about 40 ms; see precompile_layouts.
+    """
+
+    def __init__(self, parts, sheet_pieces):
+        self.sheet_pieces = sheet_pieces
+        self.parts = parts
+        self.entries = [
+            None if name in (SHEET_PART, CORE_PART)
+            else _ZipEntry(name, external_attr, data)
+            for name, external_attr, data in parts
+        ]
+
+    def render(self, values):
+        tails = [_cell_tail(value) for value in values]
+        if None in tails:
+            return None
+
+        pieces = self.sheet_pieces
+        out = [pieces[0]]
+        for k in range(1, len(pieces), 2):
+            out.append(tails[pieces[k]])
+            out.append(pieces[k + 1])
+        sheet = "".join(out).encode("utf-8")
+
+        # openpyxl stamps the save time into the core properties
+        # and the zip entries
+        now = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+        stamp = now.strftime("%Y-%m-%dT%H:%M:%SZ").encode()
+
+        entries = list(self.entries)
+        for i, (name, external_attr, data) in enumerate(self.parts):
+            if name == SHEET_PART:
+                entries[i] = _ZipEntry(name, external_attr, sheet)
+            elif name == CORE_PART:
+                data = MODIFIED_RE.sub(rb"\g<1>" + stamp + rb"\g<2>", data)
+                entries[i] = _ZipEntry(name, external_attr, data)
+
+        return _zip_bytes(entries, time.localtime()[:6])
+
+
+def _slot_cells(n_layers):
+    """
+    (row, column) of every variable cell, in slot order.
+    """
+
+    cells = [(3, 14), (4, 7), (7, 8)]
+    for i in range(n_layers):
+        cells.extend((LAYER_START + i, column) for column in LAYER_COLUMNS)
+    sum_row = LAYER_START + n_layers
+    cells.extend([(sum_row, 5), (sum_row, 28)])
+    return cells
+
+
+@lru_cache(maxsize=None)
+def compile_report(edition_key, n_layers, site_class):
+    """
+    Renders the layout once through openpyxl, with placeholders
+    in the variable cells, and cuts the result up for reuse.
+    """
+
+    layer = {
+        "layer": 1, "effective_thickness": 1.0, "soil_type": "Clays",
+        "fines": "", "n1": 0, "computed_vsi": 100.0, "ti_over_vsi": 0.01,
+    }
+    breakdown = [dict(layer, layer=i + 1) for i in range(n_layers)]
+    site_data = {"depth_of_influence": float(n_layers), "layers": []}
+    result = {
+        "weighted_vs": 100.0, "site_class": site_class,
+        "layers_used": n_layers, "breakdown": breakdown,
+    }
+
+    wb = build_site_class_workbook(site_data, result, edition_key, TEMPLATE_PATH)
+    ws = wb["Site Class Report"]
+    cells = _slot_cells(n_layers)
+    for k, (row, column) in enumerate(cells):
+        ws.cell(row=row, column=column).value = SLOT.format(k)
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    wb.close()
+
+    with zipfile.ZipFile(buffer) as archive:
+        # Worksheets are copied in from a temporary file, so their
+        # entries carry that file's mode; keep each entry's own
+        parts = [
+            (info.filename, info.external_attr, archive.read(info))
+            for info in archive.infolist()
+        ]
+
+    sheet = next(data for name, _, data in parts if name == SHEET_PART).decode("utf-8")
+    pieces = SLOT_RE.split(sheet)
+    for k in range(1, len(pieces), 2):
+        pieces[k] = int(pieces[k])
+    if len(pieces) != 2 * len(cells) + 1:
+        raise ValueError("Report template layout changed; cannot compile it.")
+
+    return CompiledReport(parts, pieces)
+
+
+def precompile_layouts(editions=None, max_layers=TEMPLATE_LAYER_ROWS):
+    """
+    Compiles every layout of the given editions (the default one
+    unless given) ahead of time: each layer count up to max_layers
+    with each class highlighted, a few seconds for the default edition.
+    Run once per process at startup, so the first reports of each
+    layout are not held up by it. Returns the number of layouts.
+    """
+
+    editions = [get_edition()] if editions is None else [get_edition(e) for e in editions]
+
+    n = 0
+    for edition in editions:
+        for site_class, _ in band_labels(edition):
+            for n_layers in range(1, max_layers + 1):
+                compile_report(edition["key"], n_layers, site_class)
+                n += 1
+    return n
+
+
+def render_compiled(site_data, result, edition=None):
+    """
+    The report bytes from the compiled layout, or None when the
+    report needs the full openpyxl path (profiles grouped into
+    layers, editions that are not registered, or values the
+    compiled path does not write).
+    """
+
+    intervals = result["breakdown"]
+    n_layers = len(intervals)
+    if n_layers == 0 or n_layers > TEMPLATE_LAYER_ROWS:
+        return None
+
+    # Layouts are cached by edition key, so only the registered
+    # edition under that key may use them
+    edition = get_edition(edition)
+    if EDITIONS.get(edition.get("key")) is not edition:
+        return None
+    classes = [site_class for site_class, _ in band_labels(edition)]
+    site_class = result["site_class"]
+    highlight = site_class if site_class in classes else None
+
+    compiled = compile_report(edition["key"], n_layers, highlight)
+
+    correlation = edition["correlation"]
+    values = [
+        round(result["weighted_vs"], 3), site_class, site_data["depth_of_influence"],
+    ]
+
+    for i, layer in enumerate(intervals):
+        soil_type = layer["soil_type"]
+        values += [
+            f"Layer {i+1}",
+            round(layer["effective_thickness"], 3),
+            soil_type,
+            "NA" if soil_type in ["Clays", "Others"] else layer["fines"],
+            layer["n1"],
+            build_formula_text(layer, correlation),
+            round(layer["computed_vsi"], 3),
+            round(layer["ti_over_vsi"], 6),
+        ]
+
+    values += [
+        round(sum(layer["effective_thickness"] for layer in intervals), 3),
+        round(sum(layer["ti_over_vsi"] for layer in intervals), 6),
+    ]
+
+    return compiled.render(values)
@@ -1,42 +1,107 @@
+import io
+import os
+import pickle
+from functools import lru_cache
+
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill, Border, Font, Alignment
-from backend import compute_layer_vsi
+from code_editions import DEFAULT_EDITION_KEY, band_labels, get_edition
+from high_resolution import aggregate_breakdown
 
-TEMPLATE_PATH = "Sample.xlsx"
+# The template ships next to this module, wherever it is run from
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Sample.xlsx")
 OUTPUT_PATH = "Site_Class_Report.xlsx"
 
+# Layer rows the template table is laid out for. Longer profiles
+# are aggregated into this many rows, with every interval listed
+# on a separate sheet.
+TEMPLATE_LAYER_ROWS = 20
+INTERVALS_SHEET = "Intervals"
+
+# Shared style objects, built once instead of per cell
+NO_BORDER = Border()
+NO_FILL = PatternFill(fill_type=None)
+HIGHLIGHT_FILL = PatternFill(
+    start_color="DAEEF3",
+    end_color="DAEEF3",
+    fill_type="solid"
+)
+NOTE_ALIGNMENT = Alignment(
+    horizontal="center",
+    vertical="center",
+    wrap_text=True
+)
+NOTE_FONT = Font(italic=True)
+
+# Site class table rows of the template, fastest class first
+CLASS_TABLE_ROW = 11
+CLASS_TABLE_ROWS = 5
+
+SUPERSCRIPTS = str.maketrans("0123456789.", "⁰¹²³⁴⁵⁶⁷⁸⁹·")
+
+
+@lru_cache(maxsize=None)
+def _template_snapshot(path):
+    """
+    Parses the template once per process.
+    The parsed workbook is kept pickled so every
+    report can take an independent copy cheaply.
+    """
+
+    wb = load_workbook(path)
+    return pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_template(path=TEMPLATE_PATH):
+    """
+    Returns a fresh, editable copy of the report template.
+    """
+
+    return pickle.loads(_template_snapshot(path))
+
+
+def build_formula_text(breakdown_layer, correlation=None):
 
-def build_formula_text(breakdown_layer):
+    if correlation is None:
+        correlation = get_edition()["correlation"]
 
     soil = breakdown_layer["soil_type"]
     n1 = breakdown_layer["n1"]
     fines = breakdown_layer["fines"]
 
-    if soil == "Others" or n1 < 10:
+    exponents = correlation["exponents"].get(soil)
+    if exponents is None or n1 < correlation["n1_min"]:
         return "NA"
 
-    if soil == "Dry Sands":
-        exponent = "⁰·⁵" if fines == "Yes" else "⁰·³"
-    elif soil == "Saturated Sands":
-        exponent = "⁰·⁴" if fines == "Yes" else "⁰·³"
-    elif soil == "Clays":
-        exponent = "⁰·³"
-    else:
-        return "NA"
+    exponent = f"{exponents[fines == 'Yes']:g}".translate(SUPERSCRIPTS)
+
+    return f"{correlation['coefficient']:g}[(N₁)₆₀ᵢ]{exponent}"
 
-    return f"80[(N₁)₆₀ᵢ]{exponent}"
 
+def build_site_class_workbook(site_data, result, edition=None,
+                              template_path=TEMPLATE_PATH):
+    """
+    Fills a fresh copy of the template for one site.
+    Touches no files or shared state, so it is safe to call
+    from several threads at once.
+    """
 
-def generate_site_class_report(site_data, result):
+    edition = get_edition(edition)
+    labels = band_labels(edition)
+    if len(labels) > CLASS_TABLE_ROWS:
+        raise ValueError(
+            f"The report template has room for {CLASS_TABLE_ROWS} site classes."
+        )
 
-    wb = load_workbook(TEMPLATE_PATH)
+    wb = load_template(template_path)
     ws = wb["Site Class Report"]
 
-    layers = result["breakdown"]
+    intervals = result["breakdown"]
+    layers = aggregate_breakdown(intervals, TEMPLATE_LAYER_ROWS)
+    aggregated = layers is not intervals
     n_layer = len(layers)
 
     start_idx = 11
-    max_rows = 20   # fixed capacity
 
     # ----------------------------
     # Top Summary
@@ -47,15 +112,6 @@ def generate_site_class_report(site_data, result):
     ws["G4"] = result["site_class"]
     ws["H7"] = site_data["depth_of_influence"]
 
-    # ----------------------------
-    # Clear Previous Layer Area
-    # ----------------------------
-
-    for i in range(max_rows):
-        row = start_idx + i
-        for col in [2, 5, 9, 14, 17, 20, 25, 28]:
-            ws.cell(row=row, column=col).value = None
-
     ws["E9"] = "Thickmess (tᵢ)"
     ws["Q9"] = "(N₁)₆₀ᵢ"
     ws["T9"] = "Shear Wave Velocity Vₛᵢ"
@@ -72,15 +128,24 @@ def generate_site_class_report(site_data, result):
         vsi = layer["computed_vsi"]
         ti_over_vsi = layer["ti_over_vsi"]
 
-        ws.cell(row=row, column=2).value = f"Layer {i+1}"
+        if aggregated:
+            first, last = layer["intervals"]
+            label = f"Layers {first}–{last}"
+            n1 = "-"
+            formula_text = "Σtᵢ / Σ(tᵢ/Vₛᵢ)"
+        else:
+            label = f"Layer {i+1}"
+            n1 = layer["n1"]
+            formula_text = build_formula_text(layer, edition["correlation"])
+
+        ws.cell(row=row, column=2).value = label
         ws.cell(row=row, column=5).value = round(ti, 3)
         ws.cell(row=row, column=9).value = layer["soil_type"]
         if layer["soil_type"] in ["Clays", "Others"]:
             ws.cell(row=row, column=14).value = "NA"
         else:
             ws.cell(row=row, column=14).value = layer["fines"]
-        ws.cell(row=row, column=17).value = layer["n1"]
-        formula_text = build_formula_text(layer)
+        ws.cell(row=row, column=17).value = n1
         ws.cell(row=row, column=20).value = formula_text
         ws.cell(row=row, column=25).value = round(vsi, 3)
         ws.cell(row=row, column=28).value = round(ti_over_vsi, 6)
@@ -91,8 +156,8 @@ def generate_site_class_report(site_data, result):
 
     sum_row = start_idx + n_layer
 
-    total_ti = sum(layer["effective_thickness"] for layer in layers)
-    total_ti_over_vsi = sum(layer["ti_over_vsi"] for layer in layers)
+    total_ti = sum(layer["effective_thickness"] for layer in intervals)
+    total_ti_over_vsi = sum(layer["ti_over_vsi"] for layer in intervals)
 
     ws.cell(row=sum_row, column=2).value = "Σtᵢ"
     ws.cell(row=sum_row, column=5).value = round(total_ti, 3)
@@ -104,29 +169,26 @@ def generate_site_class_report(site_data, result):
     # Clear Below Σ Area
     # ----------------------------
 
-    for i in range(sum_row + 1, 40): 
-        for col in [2, 5, 9, 14, 17, 20, 25, 28]:
-            ws.cell(row=i, column=col).value = None
-        for j in range(16):
-            ws.cell(row=sum_row, column=9+j).border = Border()  
+    # The template leaves the layer area empty, so only
+    # the table borders below the Σ row need removing.
+    for j in range(16):
+        ws.cell(row=sum_row, column=9+j).border = NO_BORDER
+    for i in range(sum_row + 1, 40):
         for col in range(2,33):
-            ws.cell(row=i, column=col).border = Border()
+            ws.cell(row=i, column=col).border = NO_BORDER
 
     # ----------------------------
     # Clear Previous Highlight
     # ----------------------------
 
     class_rows = {
-        "A": 11,
-        "B": 12,
-        "C": 13,
-        "D": 14,
-        "E": 15
+        site_class: CLASS_TABLE_ROW + i
+        for i, (site_class, _) in enumerate(labels)
     }
 
-    for r in class_rows.values():
-        ws.cell(row=r, column=33).fill = PatternFill(fill_type=None)
-        ws.cell(row=r, column=36).fill = PatternFill(fill_type=None)
+    for r in range(CLASS_TABLE_ROW, CLASS_TABLE_ROW + CLASS_TABLE_ROWS):
+        ws.cell(row=r, column=33).fill = NO_FILL
+        ws.cell(row=r, column=36).fill = NO_FILL
 
     # ----------------------------
     # Apply Highlight
@@ -136,23 +198,22 @@ def generate_site_class_report(site_data, result):
     highlight_row = class_rows.get(site_class)
 
     if highlight_row:
-        fill = PatternFill(
-            start_color="DAEEF3",
-            end_color="DAEEF3",
-            fill_type="solid"
-        )
-        ws.cell(row=highlight_row, column=33).fill = fill
-        ws.cell(row=highlight_row, column=36).fill = fill
+        ws.cell(row=highlight_row, column=33).fill = HIGHLIGHT_FILL
+        ws.cell(row=highlight_row, column=36).fill = HIGHLIGHT_FILL
     
     ws["AG17"] = "Vₛ = Σtᵢ / Σ(tᵢ / Vₛᵢ) = "
     ws["AL17"] = "=N3"
     ws["AM18"] = "=G4"
 
-    ws["AJ11"] =  "Vₛ ≥ 1500"
-    ws["AJ12"] =  "760 ≤ Vₛ < 1500"
-    ws["AJ13"] =  "360 ≤ Vₛ < 760"
-    ws["AJ14"] =  "180 ≤ Vₛ < 360"
-    ws["AJ15"] =  "Vₛ ≤ 180"
+    # Class table from the edition; the template's Table 4
+    # heading stays for the default edition
+    if edition["key"] != DEFAULT_EDITION_KEY:
+        ws["AG9"] = edition["table"]
+
+    for i in range(CLASS_TABLE_ROWS):
+        site_class, text = labels[i] if i < len(labels) else (None, None)
+        ws.cell(row=CLASS_TABLE_ROW + i, column=33).value = site_class
+        ws.cell(row=CLASS_TABLE_ROW + i, column=36).value = text
 
 
    # ----------------------------
@@ -160,9 +221,14 @@ def generate_site_class_report(site_data, result):
     # ----------------------------
 
     note_row = sum_row + 3
-    print(note_row)
 
     note_text = "Note - For last layer, the thickness as required based on the Depth of Influence is considered."
+    if aggregated:
+        note_text += (
+            f" The {len(intervals)} profile intervals are grouped into layers"
+            f" by harmonic averaging; each interval is listed on the"
+            f" {INTERVALS_SHEET} sheet."
+        )
 
     
     # Merge across full table width (adjust if your table goes wider)
@@ -180,23 +246,89 @@ def generate_site_class_report(site_data, result):
     ws.cell(row=note_row, column=2).value = note_text
 
     # Enable wrapping + top alignment
-    ws.cell(row=note_row, column=2).alignment = Alignment(
-        horizontal="center",
-        vertical="center",
-        wrap_text=True
-    )
+    ws.cell(row=note_row, column=2).alignment = NOTE_ALIGNMENT
 
     # Optional styling
-    ws.cell(row=note_row, column=2).font = Font(italic=True)
+    ws.cell(row=note_row, column=2).font = NOTE_FONT
 
     # Increase row height so text is fully visible
     # ws.row_dimensions[note_row].height = 30
 
+    if aggregated:
+        ws.row_dimensions[note_row].height = 30
+        write_intervals_sheet(wb, site_data, intervals)
 
-    # ----------------------------
-    # Save
-    # ----------------------------
 
-    wb.save(OUTPUT_PATH)
+    return wb
+
+
+def write_intervals_sheet(wb, site_data, intervals):
+    """
+    Lists every breakdown interval of a high-resolution profile,
+    unrounded, in a layer table that excel_import reads back.
+    """
+
+    ws = wb.create_sheet(INTERVALS_SHEET)
+
+    ws.append(["Depth of Influence", site_data["depth_of_influence"]])
+    ws.append([])
+    ws.append(["Layer", "Thickness", "Soil Type", "Fines", "N1", "Vsi", "ti/Vsi"])
+
+    for layer in intervals:
+        ws.append([
+            layer["layer"],
+            layer["effective_thickness"],
+            layer["soil_type"],
+            layer["fines"],
+            layer["n1"],
+            layer["computed_vsi"],
+            layer["ti_over_vsi"],
+        ])
+
+    for col in ("C", "F"):
+        ws.column_dimensions[col].width = 16
+    ws.freeze_panes = "A4"
+
+
+def render_site_class_report(site_data, result, edition=None):
+    """
+    Builds the report in memory and returns the xlsx bytes. Most
+    reports are filled into a compiled copy of the template's XML;
+    the rest go through openpyxl.
+    """
+
+    # Imported here, report_compiler builds on this module
+    from report_compiler import render_compiled
+
+    data = render_compiled(site_data, result, edition)
+    if data is None:
+        data = render_site_class_report_openpyxl(site_data, result, edition)
+    return data
+
+
+def render_site_class_report_openpyxl(site_data, result, edition=None):
+    """
+    The report rendered through the openpyxl object model.
+    """
+
+    wb = build_site_class_workbook(site_data, result, edition)
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
     wb.close()
-    return OUTPUT_PATH
+
+    return buffer.getvalue()
+
+
+def generate_site_class_report(site_data, result, output_path=OUTPUT_PATH,
+                               edition=None):
+    """
+    Writes the report to output_path and returns the path.
+    """
+
+    data = render_site_class_report(site_data, result, edition)
+
+    with open(output_path, "wb") as f:
+        f.write(data)
+
+    return output_path
@@ -0,0 +1,179 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+from result_cache import canonical_site_key, shared_cache
+
+REPORT_WORKERS = 2
+
+# Jobs remembered for status lookups; the oldest finished
+# ones are forgotten first.
+MAX_JOBS = 256
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+UNKNOWN = "unknown"
+
+
+def _render(site_data, result, key):
+    """
+    Worker body: the cached report bytes, or a fresh render
+    stored in the shared cache.
+    """
+
+    cached = shared_cache.get(key)
+    if cached is not None and cached[1] is not None:
+        return cached[1]
+
+    from report_generator import render_site_class_report
+
+    report = render_site_class_report(site_data, result)
+    shared_cache.put(key, result, report, site_data)
+    return report
+
+
+class ReportJobs:
+    """
+    Background report rendering on a small thread pool. Jobs are
+    identified by an id the caller keeps (in session state for the
+    app); a job already queued or done for the same inputs is
+    reused instead of rendering twice.
+    """
+
+    def __init__(self, workers=REPORT_WORKERS, max_jobs=MAX_JOBS):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self._pool = None
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="report"
+            )
+        return self._pool
+
+    def submit(self, site_data, result, key=None):
+        """
+        Queues the report for one calculated site and returns
+        the job id. Returns at once.
+        """
+
+        key = key or canonical_site_key(site_data)
+
+        with self._lock:
+            job_id = self._by_key.get(key)
+            if self.status(job_id) not in (UNKNOWN, FAILED):
+                self._jobs.move_to_end(job_id)
+                return job_id
+
+            cached = shared_cache.get(key)
+            if cached is not None and cached[1] is not None:
+                future = Future()
+                future.set_result(cached[1])
+            else:
+                future = self._executor().submit(_render, site_data, result, key)
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "key": key,
+                "site_data": site_data,
+                "result": result,
+                "future": future,
+            }
+            self._by_key[key] = job_id
+            self._evict()
+
+        return job_id
+
+    def _evict(self):
+        # Called with the lock held
+        while len(self._jobs) > self.max_jobs:
+            for job_id, job in self._jobs.items():
+                if job["future"].done():
+                    break
+            else:
+                return
+            del self._jobs[job_id]
+            if self._by_key.get(job["key"]) == job_id:
+                del self._by_key[job["key"]]
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return UNKNOWN
+        future = job["future"]
+        if future.running():
+            return RUNNING
+        if not future.done():
+            return PENDING
+        if future.cancelled() or future.exception() is not None:
+            return FAILED
+        return DONE
+
+    def discard(self, job_id):
+        """
+        Forgets a job, so the same inputs are rendered afresh on
+        the next submit. Returns the exception a failed job raised,
+        else None.
+        """
+
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return None
+            if self._by_key.get(job["key"]) == job_id:
+                del self._by_key[job["key"]]
+
+        future = job["future"]
+        if future.done() and not future.cancelled():
+            return future.exception()
+        return None
+
+    def result(self, job_id, timeout=None):
+        """
+        The report bytes, rendered on the calling thread if the
+        job has not started yet, otherwise waited for.
+        """
+
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown report job: {job_id}")
+
+        future = job["future"]
+        if future.cancel():
+            # Still queued: render here rather than wait for a worker
+            report = _render(job["site_data"], job["result"], job["key"])
+            done = Future()
+            done.set_result(report)
+            job["future"] = done
+            return report
+
+        try:
+            return future.result(timeout)
+        except CancelledError:
+            return _render(job["site_data"], job["result"], job["key"])
+
+    def report_bytes(self, site_data, result, key=None, job_id=None):
+        """
+        Report bytes on demand: from the job if there is one,
+        else from the cache or a render on the calling thread.
+        """
+
+        if job_id is not None and job_id in self._jobs:
+            return self.result(job_id)
+        return _render(site_data, result, key or canonical_site_key(site_data))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+# Process-wide job queue shared by every session
+report_jobs = ReportJobs()
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from backend import calculate_site_class
+
+# Decimal places kept when hashing floats, so inputs that only
+# differ by float noise share one cache entry.
+FLOAT_DIGITS = 9
+
+
+def _canonical_number(value):
+    value = round(float(value), FLOAT_DIGITS)
+    return int(value) if value.is_integer() else value
+
+
+def canonical_site_data(site_data):
+    """
+    Normalized copy of the inputs that affect the result:
+    depth of influence and the ordered layers, with rounded floats.
+    """
+
+    return {
+        "depth_of_influence": _canonical_number(site_data["depth_of_influence"]),
+        "layers": [
+            {
+                "layer": layer["layer"],
+                "thickness": _canonical_number(layer["thickness"]),
+                "soil_type": layer["soil_type"],
+                "fines_less_than_15": layer["fines_less_than_15"],
+                "n1": _canonical_number(layer["n1"]),
+                "vsi": _canonical_number(layer["vsi"]),
+            }
+            for layer in site_data["layers"]
+        ],
+    }
+
+
+def canonical_site_key(site_data):
+    """
+    SHA-256 hex digest of the canonical site inputs.
+    """
+
+    text = json.dumps(
+        canonical_site_data(site_data), sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe, size-bounded LRU of calculate_site_class results
+    and rendered report bytes, keyed by canonical_site_key.
+    Cached results are shared, so callers must not modify them.
+    With a persistent store (see result_store), misses are looked
+    up there and new entries are saved to it.
+    """
+
+    def __init__(self, maxsize=1024, store=None):
+        self.maxsize = maxsize
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns (result, report_bytes) or None. report_bytes is
+        None when only the result has been computed so far.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["result"], entry["report"]
+
+        stored = self.store.get(key) if self.store is not None else None
+
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        self._put_memory(key, *stored)
+        return stored
+
+    def put(self, key, result, report=None, site_data=None):
+        """
+        Caches a result, and its report if given. Entries are also
+        saved to the persistent store, if there is one.
+        """
+
+        self._put_memory(key, result, report)
+        if self.store is not None:
+            self.store.put(key, result, report, site_data)
+
+    def _put_memory(self, key, result, report=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {"result": result, "report": None}
+            entry["result"] = result
+            if report is not None:
+                entry["report"] = report
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, site_data, with_report=False, key=None):
+        """
+        Cached calculate_site_class, plus the report bytes if asked.
+        Returns (result, report_bytes or None).
+        """
+
+        key = key or canonical_site_key(site_data)
+        cached = self.get(key)
+
+        if cached is None:
+            result = calculate_site_class(site_data)
+            report = None
+        else:
+            result, report = cached
+            if report is not None or not with_report:
+                return result, report
+
+        if with_report:
+            from report_generator import render_site_class_report
+            report = render_site_class_report(site_data, result)
+
+        self.put(key, result, report, site_data)
+        return result, report
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Process-wide cache shared by every session and caller
+shared_cache = ResultCache()
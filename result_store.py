@@ -0,0 +1,500 @@
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from code_editions import DEFAULT_EDITION_KEY
+from result_cache import canonical_site_data, canonical_site_key
+
+# Used when SITE_CLASS_STORE is not set when a store is opened
+DEFAULT_STORE_PATH = "site_class_store"
+DB_NAME = "store.sqlite3"
+BLOB_DIR = "blobs"
+
+# gc leaves report files younger than this (seconds) alone:
+# put_many writes a file before committing the row that refers
+# to it, possibly in another process than the one collecting.
+BLOB_GRACE = 3600
+
+# Sites looked up and computed together on a warm start
+WARM_START_WINDOW = 4096
+
+# SQLite's default limit on bound parameters is 999
+_MAX_PARAMS = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    input_hash   TEXT NOT NULL,
+    edition      TEXT NOT NULL,
+    inputs       TEXT,
+    result       TEXT NOT NULL,
+    weighted_vs  REAL,
+    site_class   TEXT,
+    report_path  TEXT,
+    data_size    INTEGER NOT NULL,
+    report_size  INTEGER NOT NULL,
+    created      REAL NOT NULL,
+    accessed     REAL NOT NULL,
+    PRIMARY KEY (input_hash, edition)
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+
+CREATE TABLE IF NOT EXISTS sites (
+    project     TEXT NOT NULL,
+    site_id     TEXT NOT NULL,
+    edition     TEXT NOT NULL,
+    input_hash  TEXT NOT NULL,
+    updated     REAL NOT NULL,
+    PRIMARY KEY (project, site_id, edition)
+);
+CREATE INDEX IF NOT EXISTS sites_hash ON sites (input_hash);
+"""
+
+
+def _json(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def default_store_path():
+    """
+    SITE_CLASS_STORE as it is now, else DEFAULT_STORE_PATH.
+    """
+
+    return os.environ.get("SITE_CLASS_STORE") or DEFAULT_STORE_PATH
+
+
+class ResultStore:
+    """
+    Persistent store of calculate_site_class results and report
+    bytes under the canonical input hash (canonical_site_key),
+    one entry per code edition. Rows live in SQLite; reports are
+    blob files next to it. Sites can be filed under a project and
+    site id, which point at the hash. Safe to share between threads.
+    path defaults to default_store_path() at the time of opening.
+    """
+
+    def __init__(self, path=None):
+        path = path or default_store_path()
+        self.path = path
+        self.blob_dir = os.path.join(path, BLOB_DIR)
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(path, DB_NAME), check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ---- Blobs ----
+
+    def _blob_path(self, key, edition):
+        # Relative to the store, so the directory can be moved
+        return os.path.join(BLOB_DIR, key[:2], f"{key}.{edition}.xlsx")
+
+    def _write_blob(self, relative, data):
+        path = os.path.join(self.path, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read_blob(self, relative):
+        try:
+            with open(os.path.join(self.path, relative), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _remove_blob(self, relative):
+        try:
+            os.remove(os.path.join(self.path, relative))
+        except FileNotFoundError:
+            pass
+
+    def _blob_is_recent(self, relative, cutoff):
+        try:
+            return os.path.getmtime(os.path.join(self.path, relative)) >= cutoff
+        except FileNotFoundError:
+            return False
+
+    # ---- Lookups ----
+
+    def get(self, key, edition=DEFAULT_EDITION_KEY):
+        """
+        Returns (result, report_bytes or None), or None.
+        """
+
+        found = self.get_many([key], edition)
+        return found.get(key)
+
+    def get_many(self, keys, edition=DEFAULT_EDITION_KEY, with_report=True):
+        """
+        {key: (result, report_bytes or None)} for the stored keys.
+        Marks them as accessed for garbage collection.
+        """
+
+        keys = list(dict.fromkeys(keys))
+        rows = []
+        now = time.time()
+
+        with self._lock:
+            for start in range(0, len(keys), _MAX_PARAMS):
+                chunk = keys[start:start + _MAX_PARAMS]
+                marks = ",".join("?" * len(chunk))
+                rows += self._db.execute(
+                    f"SELECT input_hash, result, report_path FROM results "
+                    f"WHERE edition = ? AND input_hash IN ({marks})",
+                    [edition, *chunk]
+                ).fetchall()
+                self._db.execute(
+                    f"UPDATE results SET accessed = ? "
+                    f"WHERE edition = ? AND input_hash IN ({marks})",
+                    [now, edition, *chunk]
+                )
+
+        found = {}
+        for key, result, report_path in rows:
+            report = None
+            if with_report and report_path:
+                report = self._read_blob(report_path)
+            found[key] = (json.loads(result), report)
+        return found
+
+    def lookup(self, project, site_id, edition=DEFAULT_EDITION_KEY):
+        """
+        (input_hash, result, report_bytes or None) filed under
+        project and site id, or None.
+        """
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT input_hash FROM sites "
+                "WHERE project = ? AND site_id = ? AND edition = ?",
+                (project, str(site_id), edition)
+            ).fetchone()
+        if row is None:
+            return None
+        found = self.get(row[0], edition)
+        return None if found is None else (row[0], *found)
+
+    def project_sites(self, project, edition=DEFAULT_EDITION_KEY):
+        """
+        Summary rows of every site filed under project.
+        """
+
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT s.site_id, s.input_hash, r.weighted_vs, r.site_class, "
+                "r.report_path IS NOT NULL, s.updated "
+                "FROM sites s JOIN results r "
+                "ON r.input_hash = s.input_hash AND r.edition = s.edition "
+                "WHERE s.project = ? AND s.edition = ? ORDER BY s.site_id",
+                (project, edition)
+            ).fetchall()
+
+        return [
+            {
+                "site_id": site_id,
+                "input_hash": key,
+                "weighted_vs": weighted_vs,
+                "site_class": site_class,
+                "has_report": bool(has_report),
+                "updated": updated,
+            }
+            for site_id, key, weighted_vs, site_class, has_report, updated in rows
+        ]
+
+    # ---- Writes ----
+
+    def put(self, key, result, report=None, site_data=None,
+            edition=DEFAULT_EDITION_KEY, project=None, site_id=None):
+        self.put_many([(key, result, report, site_data, site_id)], edition, project)
+
+    def put_many(self, entries, edition=DEFAULT_EDITION_KEY, project=None):
+        """
+        Saves (key, result, report, site_data, site_id) entries in
+        one transaction. report and site_data may be None to keep
+        what is stored; site_id files the key under project.
+        """
+
+        now = time.time()
+        rows = []
+        links = []
+
+        for key, result, report, site_data, site_id in entries:
+            result = {k: v for k, v in result.items() if k != "report"}
+            result_text = _json(result)
+            inputs = _json(canonical_site_data(site_data)) if site_data is not None else None
+
+            report_path = None
+            if report is not None:
+                report_path = self._blob_path(key, edition)
+                self._write_blob(report_path, report)
+
+            rows.append((
+                key, edition, inputs, result_text,
+                result.get("weighted_vs"), result.get("site_class"),
+                report_path, len(result_text) + len(inputs or ""),
+                len(report) if report is not None else 0, now, now,
+            ))
+            if project is not None and site_id is not None:
+                links.append((project, str(site_id), edition, key, now))
+
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (input_hash, edition) DO UPDATE SET "
+                    "inputs = COALESCE(excluded.inputs, inputs), "
+                    "result = excluded.result, "
+                    "weighted_vs = excluded.weighted_vs, "
+                    "site_class = excluded.site_class, "
+                    "data_size = length(excluded.result) "
+                    "+ COALESCE(length(COALESCE(excluded.inputs, inputs)), 0), "
+                    "report_size = CASE WHEN excluded.report_path IS NULL "
+                    "THEN report_size ELSE excluded.report_size END, "
+                    "report_path = COALESCE(excluded.report_path, report_path), "
+                    "accessed = excluded.accessed",
+                    rows
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO sites VALUES (?, ?, ?, ?, ?)", links
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def file_sites(self, project, site_keys, edition=DEFAULT_EDITION_KEY):
+        """
+        Files (site_id, key) pairs under project without
+        touching the stored results.
+        """
+
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO sites VALUES (?, ?, ?, ?, ?)",
+                [(project, str(site_id), edition, key, now) for site_id, key in site_keys]
+            )
+
+    # ---- Garbage collection ----
+
+    def gc(self, max_bytes=None, max_age_days=None, now=None, grace=BLOB_GRACE):
+        """
+        Removes entries not accessed for max_age_days, then the
+        least recently accessed ones until the store holds at most
+        max_bytes, along with their report files and site links.
+        Report files no row refers to are removed as well. Files
+        written in the last grace seconds are kept either way, as a
+        put_many may not have committed their rows yet; a later gc
+        removes them if nothing refers to them by then.
+        """
+
+        now = time.time() if now is None else now
+        cutoff = now - grace
+        doomed = []
+
+        with self._lock:
+            if max_age_days is not None:
+                doomed += self._db.execute(
+                    "SELECT input_hash, edition, report_path, data_size + report_size "
+                    "FROM results WHERE accessed < ?", (now - max_age_days * 86400,)
+                ).fetchall()
+
+            if max_bytes is not None:
+                stale = {(key, edition) for key, edition, _, _ in doomed}
+                total = self._db.execute(
+                    "SELECT COALESCE(SUM(data_size + report_size), 0) FROM results"
+                ).fetchone()[0]
+                total -= sum(size for *_, size in doomed)
+
+                if total > max_bytes:
+                    for row in self._db.execute(
+                        "SELECT input_hash, edition, report_path, data_size + report_size "
+                        "FROM results ORDER BY accessed"
+                    ):
+                        if total <= max_bytes:
+                            break
+                        if (row[0], row[1]) in stale:
+                            continue
+                        doomed.append(row)
+                        total -= row[3]
+
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "DELETE FROM results WHERE input_hash = ? AND edition = ?",
+                [(key, edition) for key, edition, _, _ in doomed]
+            )
+            self._db.executemany(
+                "DELETE FROM sites WHERE input_hash = ? AND edition = ?",
+                [(key, edition) for key, edition, _, _ in doomed]
+            )
+            self._db.execute("COMMIT")
+
+            referenced = {
+                path for path, in self._db.execute(
+                    "SELECT report_path FROM results WHERE report_path IS NOT NULL"
+                )
+            }
+
+        for _, _, report_path, _ in doomed:
+            if report_path and report_path not in referenced \
+                    and not self._blob_is_recent(report_path, cutoff):
+                self._remove_blob(report_path)
+
+        orphans = 0
+        for folder, _, files in os.walk(self.blob_dir, topdown=False):
+            for name in files:
+                relative = os.path.relpath(os.path.join(folder, name), self.path)
+                if relative not in referenced and not self._blob_is_recent(relative, cutoff):
+                    self._remove_blob(relative)
+                    orphans += 1
+            if folder != self.blob_dir and not os.listdir(folder):
+                os.rmdir(folder)
+
+        with self._lock:
+            self._db.execute("VACUUM" if doomed else "PRAGMA optimize")
+
+        return {
+            "removed": len(doomed),
+            "freed_bytes": sum(size for *_, size in doomed),
+            "orphan_files": orphans,
+        }
+
+    def stats(self):
+        with self._lock:
+            entries, size, reports = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(data_size + report_size), 0), "
+                "COUNT(report_path) FROM results"
+            ).fetchone()
+            projects, sites = self._db.execute(
+                "SELECT COUNT(DISTINCT project), COUNT(*) FROM sites"
+            ).fetchone()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "reports": reports,
+            "bytes": size,
+            "projects": projects,
+            "sites": sites,
+        }
+
+
+def iter_warm_start(records, store, compute, with_report=False, project=None,
+                    edition=DEFAULT_EDITION_KEY, window=WARM_START_WINDOW):
+    """
+    Yields (site_id, result) for (site_id, site_data) records, in
+    order. Sites already in the store (with a report, if asked)
+    are answered from it; the others go through compute, which
+    takes a list of site_data dicts and returns their results in
+    order, and are saved. Failed sites are not saved. Records are
+    handled a window at a time, so memory stays bounded.
+    """
+
+    records = iter(records)
+
+    while True:
+        batch = list(itertools.islice(records, window))
+        if not batch:
+            return
+
+        keys = [
+            canonical_site_key(site_data) if isinstance(site_data, dict) else None
+            for _, site_data in batch
+        ]
+        try:
+            known = [key for key in keys if key is not None]
+            found = store.get_many(known, edition, with_report)
+        except (KeyError, TypeError, ValueError):
+            found = {}
+        if with_report:
+            found = {k: v for k, v in found.items() if v[1] is not None}
+
+        misses = [i for i, key in enumerate(keys) if key not in found]
+        computed = dict(zip(misses, compute([batch[i][1] for i in misses])))
+
+        new_entries = []
+        for i, (site_id, site_data) in enumerate(batch):
+            key = keys[i]
+            if i in computed:
+                result = computed[i]
+                if key is not None and "error" not in result:
+                    new_entries.append(
+                        (key, result, result.get("report"), site_data, site_id)
+                    )
+            else:
+                result, report = found[key]
+                if with_report:
+                    result = {**result, "report": report}
+
+            batch[i] = (site_id, result)
+
+        if new_entries:
+            store.put_many(new_entries, edition, project)
+        if project is not None:
+            store.file_sites(project, [
+                (site_id, keys[i]) for i, (site_id, _) in enumerate(batch)
+                if keys[i] in found
+            ], edition)
+
+        yield from batch
+
+
+def _parse_size(text):
+    units = {"k": 2**10, "m": 2**20, "g": 2**30}
+    text = text.strip().lower().rstrip("b")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Inspect or garbage-collect the persistent result store."
+    )
+    parser.add_argument("--store", help="store directory (default: $SITE_CLASS_STORE, "
+                                        f"else {DEFAULT_STORE_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("stats", help="print entry counts and size")
+
+    sites = commands.add_parser("sites", help="list the sites of a project")
+    sites.add_argument("project")
+
+    gc = commands.add_parser("gc", help="remove old entries")
+    gc.add_argument("--max-size", type=_parse_size,
+                    help="keep at most this much, e.g. 500M")
+    gc.add_argument("--max-age", type=float, metavar="DAYS",
+                    help="drop entries not used for this many days")
+    gc.add_argument("--grace", type=float, default=BLOB_GRACE, metavar="SECONDS",
+                    help="keep report files written this recently "
+                         f"(default {BLOB_GRACE})")
+
+    args = parser.parse_args(argv)
+    store = ResultStore(args.store)
+
+    if args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+    elif args.command == "sites":
+        for row in store.project_sites(args.project):
+            print(json.dumps(row))
+    else:
+        print(json.dumps(store.gc(args.max_size, args.max_age, grace=args.grace), indent=2))
+
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
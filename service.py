@@ -0,0 +1,501 @@
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from backend import calculate_site_class
+from batch_engine import calculate_site_class_batch
+from code_editions import DEFAULT_EDITION_KEY, EDITIONS, get_edition
+from result_cache import canonical_site_key, shared_cache
+
+# Requests handled at once; more wait up to QUEUE_TIMEOUT seconds
+# for a slot and are then turned away with 503.
+MAX_CONCURRENCY = 64
+QUEUE_TIMEOUT = 5.0
+
+# Report rendering pool. Reports queue for the workers, at most
+# REPORT_QUEUE_PER_WORKER per worker; the rest wait for a slot.
+REPORT_WORKERS = min(4, os.cpu_count() or 1)
+REPORT_QUEUE_PER_WORKER = 2
+
+MAX_BODY_BYTES = 32 * 2**20
+# Bodies larger than this are parsed in a worker thread, so a
+# batch of many MB does not stall every other request
+INLINE_JSON_BYTES = 64 * 2**10
+MAX_BATCH_SITES = 100_000
+STREAM_CHUNK_BYTES = 64 * 2**10
+
+# Upper bounds of the latency histogram buckets in seconds;
+# a last bucket catches everything slower.
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram. Only touched from the event
+    loop, so it needs no lock.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile;
+        the largest observation for the overflow bucket.
+        """
+
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                **{f"le_{bound:g}": count for bound, count in zip(self.buckets, self.counts)},
+                "inf": self.counts[-1],
+            },
+        }
+
+
+# ----------------------------
+# Handlers
+# ----------------------------
+
+def _edition(query):
+    key = query.get("edition", [DEFAULT_EDITION_KEY])[-1]
+    try:
+        return get_edition(key)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+
+
+def _flag(query, name):
+    return query.get(name, ["0"])[-1].lower() in ("1", "true", "yes")
+
+
+def _classify(site_data, edition):
+    """
+    calculate_site_class with input errors as HTTPError 400.
+    The default edition goes through the shared cache.
+    """
+
+    if not isinstance(site_data, dict):
+        raise HTTPError(400, "Expected a site_data object.")
+    try:
+        if edition["key"] == DEFAULT_EDITION_KEY:
+            result, _ = shared_cache.get_or_compute(site_data)
+            return result
+        return calculate_site_class(site_data, edition)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    except (KeyError, TypeError):
+        raise HTTPError(400, "Malformed site record.")
+
+
+def _classify_batch(sites, edition):
+    """
+    Classifies a list of site_data dicts with the batch engine.
+    If any site fails, each site is classified on its own so the
+    errors are reported per site and the rest still succeed.
+    """
+
+    from site_model import SiteArray
+
+    try:
+        columns = SiteArray.from_sites(sites).columns()
+        out = calculate_site_class_batch(**columns, edition=edition)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        out = None
+
+    results = []
+    for k, site_data in enumerate(sites):
+        if out is not None:
+            result = {
+                "weighted_vs": float(out["weighted_vs"][k]),
+                "site_class": str(out["site_class"][k]),
+                "layers_used": int(out["layers_used"][k]),
+            }
+        else:
+            try:
+                full = _classify(site_data, edition)
+                result = {key: full[key] for key in ("weighted_vs", "site_class", "layers_used")}
+            except HTTPError as e:
+                result = {"error": e.message}
+
+        if isinstance(site_data, dict) and "site_id" in site_data:
+            result = {"site_id": site_data["site_id"], **result}
+        results.append(result)
+
+    return results
+
+
+def _jsonable(result, breakdown):
+    result = dict(result)
+    if not breakdown:
+        result.pop("breakdown", None)
+    return result
+
+
+class SiteClassService:
+    """
+    ASGI application serving the site class engine:
+
+        GET  /health
+        GET  /editions
+        GET  /metrics           latency histograms and pool state
+        POST /classify          one site_data object
+        POST /classify/batch    a list of site_data objects
+        POST /report            one site_data object, xlsx streamed back
+
+    `edition` selects a code edition by key and `breakdown=1`
+    adds the per-layer breakdown to /classify. Classification
+    runs in worker threads and reports in a bounded thread or
+    process pool, so neither blocks the event loop. With
+    precompile_reports the report layouts of the default edition
+    are compiled at startup, in the background for a thread pool
+    and in each worker for a process pool.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, queue_timeout=QUEUE_TIMEOUT,
+                 report_workers=REPORT_WORKERS, report_pool="thread",
+                 max_body_bytes=MAX_BODY_BYTES, max_batch_sites=MAX_BATCH_SITES,
+                 precompile_reports=True):
+
+        if report_pool not in ("thread", "process"):
+            raise ValueError("report_pool must be 'thread' or 'process'.")
+
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.report_workers = report_workers
+        self.report_pool = report_pool
+        self.max_body_bytes = max_body_bytes
+        self.max_batch_sites = max_batch_sites
+        self.precompile_reports = precompile_reports
+
+        self.histograms = {}
+        self.status_counts = {}
+        self.in_flight = 0
+        self.rejected = 0
+        self.reports_in_flight = 0
+        self.started = time.time()
+
+        # Created on the serving loop at startup
+        self._slots = None
+        self._report_slots = None
+        self._pool = None
+
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("GET", "/editions"): self.editions,
+            ("GET", "/metrics"): self.metrics,
+            ("POST", "/classify"): self.classify,
+            ("POST", "/classify/batch"): self.classify_batch,
+            ("POST", "/report"): self.report,
+        }
+
+    # ---- Lifecycle ----
+
+    def startup(self):
+        if self._pool is not None:
+            return
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._report_slots = asyncio.Semaphore(
+            self.report_workers * REPORT_QUEUE_PER_WORKER
+        )
+        from report_compiler import precompile_layouts
+
+        if self.report_pool == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=self.report_workers)
+            if self.precompile_reports:
+                # Layouts are shared by the threads; compiled off
+                # the pool so reports need not wait behind it
+                threading.Thread(target=precompile_layouts, daemon=True).start()
+        else:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.report_workers,
+                initializer=precompile_layouts if self.precompile_reports else None,
+            )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    # ---- ASGI entry point ----
+
+    async def __call__(self, scope, receive, send):
+
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        self.startup()
+        start = time.perf_counter()
+        method = scope["method"]
+        path = scope["path"].rstrip("/") or "/"
+        handler = self.routes.get((method, path))
+        route = f"{method} {path}" if handler else "unmatched"
+
+        status = 500
+        try:
+            if handler is None:
+                if any(p == path for _, p in self.routes):
+                    raise HTTPError(405, "Method not allowed.")
+                raise HTTPError(404, "Not found.")
+
+            if not await self._acquire_slot():
+                self.rejected += 1
+                status = 503
+                await self._send_json(
+                    send, 503, {"error": "Too many requests in flight."},
+                    headers=[(b"retry-after", b"1")]
+                )
+                return
+
+            self.in_flight += 1
+            try:
+                query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+                body = await self._read_body(receive) if method == "POST" else b""
+                status = await handler(query, body, send)
+            finally:
+                self.in_flight -= 1
+                self._slots.release()
+
+        except HTTPError as e:
+            status = e.status
+            await self._send_json(send, e.status, {"error": e.message})
+
+        finally:
+            self.histograms.setdefault(route, LatencyHistogram()).observe(
+                time.perf_counter() - start
+            )
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _acquire_slot(self):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(400, "Client disconnected.")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise HTTPError(413, f"Request body exceeds {self.max_body_bytes} bytes.")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def _json_body(self, body):
+        try:
+            if len(body) <= INLINE_JSON_BYTES:
+                return json.loads(body)
+            return await asyncio.to_thread(json.loads, body)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise HTTPError(400, "Request body is not valid JSON.")
+
+    async def _send_json(self, send, status, payload, headers=()):
+        data = json.dumps(payload).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(data)).encode()),
+                *headers,
+            ],
+        })
+        await send({"type": "http.response.body", "body": data})
+        return status
+
+    # ---- Routes ----
+
+    async def health(self, query, body, send):
+        return await self._send_json(send, 200, {"status": "ok"})
+
+    async def editions(self, query, body, send):
+        return await self._send_json(send, 200, [
+            {
+                "key": edition["key"],
+                "name": edition["name"],
+                "classes": edition["classes"].tolist(),
+                "thresholds": edition["thresholds"].tolist(),
+                "depth": edition["depth"],
+            }
+            for edition in EDITIONS.values()
+        ])
+
+    async def metrics(self, query, body, send):
+        return await self._send_json(send, 200, {
+            "uptime": time.time() - self.started,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "rejected": self.rejected,
+            "reports_in_flight": self.reports_in_flight,
+            "report_pool": {"kind": self.report_pool, "workers": self.report_workers},
+            "status": {str(k): v for k, v in sorted(self.status_counts.items())},
+            "cache": shared_cache.stats(),
+            "latency": {route: h.snapshot() for route, h in sorted(self.histograms.items())},
+        })
+
+    async def classify(self, query, body, send):
+        edition = _edition(query)
+        site_data = await self._json_body(body)
+        result = await asyncio.to_thread(_classify, site_data, edition)
+        return await self._send_json(send, 200, _jsonable(result, _flag(query, "breakdown")))
+
+    async def classify_batch(self, query, body, send):
+        edition = _edition(query)
+        sites = await self._json_body(body)
+        if isinstance(sites, dict):
+            sites = sites.get("sites")
+        if not isinstance(sites, list):
+            raise HTTPError(400, "Expected a list of site_data objects.")
+        if len(sites) > self.max_batch_sites:
+            raise HTTPError(413, f"Batches are limited to {self.max_batch_sites} sites.")
+
+        results = await asyncio.to_thread(_classify_batch, sites, edition)
+        return await self._send_json(send, 200, results)
+
+    async def report(self, query, body, send):
+        from report_generator import render_site_class_report
+
+        edition = _edition(query)
+        site_data = await self._json_body(body)
+        result = await asyncio.to_thread(_classify, site_data, edition)
+
+        default = edition["key"] == DEFAULT_EDITION_KEY
+        key = canonical_site_key(site_data) if default else None
+        cached = shared_cache.get(key) if default else None
+        data = cached[1] if cached else None
+
+        if data is None:
+            async with self._report_slots:
+                self.reports_in_flight += 1
+                try:
+                    # The edition goes by key, so process workers
+                    # can pickle it
+                    data = await asyncio.get_running_loop().run_in_executor(
+                        self._pool, render_site_class_report,
+                        site_data, result, edition["key"]
+                    )
+                finally:
+                    self.reports_in_flight -= 1
+            if default:
+                shared_cache.put(key, result, data)
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", XLSX_MIME.encode()),
+                (b"content-length", str(len(data)).encode()),
+                (b"content-disposition", b'attachment; filename="Site_Class_Report.xlsx"'),
+            ],
+        })
+        view = memoryview(data)
+        for start in range(0, len(data), STREAM_CHUNK_BYTES):
+            await send({
+                "type": "http.response.body",
+                "body": bytes(view[start:start + STREAM_CHUNK_BYTES]),
+                "more_body": start + STREAM_CHUNK_BYTES < len(data),
+            })
+        if not data:
+            await send({"type": "http.response.body", "body": b""})
+        return 200
+
+
+# Default instance, e.g. `uvicorn service:app`
+app = SiteClassService()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the site class engine over HTTP."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--queue-timeout", type=float, default=QUEUE_TIMEOUT)
+    parser.add_argument("--report-workers", type=int, default=REPORT_WORKERS)
+    parser.add_argument("--report-pool", choices=["thread", "process"], default="thread")
+    parser.add_argument("--no-precompile", action="store_true",
+                        help="compile report layouts on first use, not at startup")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    service = SiteClassService(
+        max_concurrency=args.max_concurrency,
+        queue_timeout=args.queue_timeout,
+        report_workers=args.report_workers,
+        report_pool=args.report_pool,
+        precompile_reports=not args.no_precompile,
+    )
+    uvicorn.run(service, host=args.host, port=args.port, lifespan="on")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from collections import deque
+
+from batch_runner import iter_batch, process_site
+from site_records import normalize_header, site_from_rows
+
+CSV_COLUMNS = [
+    "site_id", "depth_of_influence", "layer", "thickness",
+    "soil_type", "fines_less_than_15", "n1", "vsi",
+]
+
+RESULT_COLUMNS = ["site_id", "weighted_vs", "site_class", "layers_used", "error"]
+
+
+def read_ndjson(stream):
+    """
+    Yields (site_id, site_data) per non-empty line.
+    Lines that are not valid JSON yield site_data = None,
+    which is reported as a malformed record.
+    """
+
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            site_data = json.loads(line)
+        except json.JSONDecodeError:
+            site_data = None
+        if not isinstance(site_data, dict):
+            yield str(line_no), None
+            continue
+        yield str(site_data.get("site_id", line_no)), site_data
+
+
+def read_long_csv(stream):
+    """
+    (site_id, site_data) records from a long-format CSV with one
+    row per layer. Rows of one site must be consecutive. Headers
+    are matched like the workbook importer's, so "Thickness (m)"
+    or "Borehole" work too. The header is checked up front;
+    without a site_id column there is no way to group rows, so
+    that raises ValueError.
+    """
+
+    reader = csv.DictReader(stream)
+    reader.fieldnames = [
+        normalize_header(name) or name for name in reader.fieldnames or []
+    ]
+    if "site_id" not in reader.fieldnames:
+        raise ValueError("CSV input has no site_id column.")
+
+    return _iter_csv_sites(reader)
+
+
+def _iter_csv_sites(reader):
+    for site_id, rows in itertools.groupby(reader, key=lambda row: row["site_id"]):
+        try:
+            yield site_id, site_from_rows(rows)
+        except (KeyError, TypeError, ValueError):
+            # Drain the group so the next site starts cleanly
+            for _ in rows:
+                pass
+            yield site_id, None
+
+
+def _summary(site_id, result, with_breakdown):
+    if "error" in result:
+        return {"site_id": site_id, "error": result["error"]}
+
+    summary = {
+        "site_id": site_id,
+        "weighted_vs": result["weighted_vs"],
+        "site_class": result["site_class"],
+        "layers_used": result["layers_used"],
+    }
+    if with_breakdown:
+        summary["breakdown"] = result["breakdown"]
+    return summary
+
+
+def _compute(sites, workers, with_report):
+    if workers > 1:
+        return iter_batch(sites, with_report, workers)
+    return (process_site(site_data, with_report) for site_data in sites)
+
+
+def classify_stream(records, workers=1, report_dir=None, store=None, project=None):
+    """
+    Yields (site_id, result) for (site_id, site_data) records,
+    keeping input order. Reports are written to report_dir if given.
+    With a ResultStore, sites computed before are taken from it and
+    new results are saved, filed under project if given.
+    """
+
+    with_report = report_dir is not None
+    if with_report:
+        # Site ids become file names: keep them inside report_dir
+        # and give ids that clean up to the same name their own file
+        from report_bundle import _member_name
+        used = set()
+
+    if store is not None:
+        from result_store import iter_warm_start
+        results = iter_warm_start(
+            records, store, lambda sites: _compute(sites, workers, with_report),
+            with_report, project
+        )
+    else:
+        ids = deque()
+
+        def sites():
+            for site_id, site_data in records:
+                ids.append(site_id)
+                yield site_data
+
+        results = (
+            (ids.popleft(), result)
+            for result in _compute(sites(), workers, with_report)
+        )
+
+    for site_id, result in results:
+
+        if with_report and "report" in result:
+            path = os.path.join(report_dir, _member_name(site_id, used))
+            with open(path, "wb") as f:
+                f.write(result.pop("report"))
+
+        yield site_id, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Classify sites from NDJSON, long-format CSV or xlsx borehole logs.",
+        epilog="CSV input columns: " + ", ".join(CSV_COLUMNS)
+    )
+    parser.add_argument("input", nargs="?", default="-",
+                        help="input file, or - for stdin (default)")
+    parser.add_argument("--format", choices=["ndjson", "csv", "xlsx"],
+                        help="input format (default: from file extension, else ndjson)")
+    parser.add_argument("--output-format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--breakdown", action="store_true",
+                        help="include per-layer breakdown (ndjson output, "
+                             "or one sheet per site with --portfolio)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--reports", metavar="DIR",
+                        help="write an xlsx report per site into DIR")
+    parser.add_argument("--reports-zip", metavar="ZIP",
+                        help="render every site's xlsx report in parallel "
+                             "into one zip instead of stdout")
+    parser.add_argument("--portfolio", metavar="XLSX",
+                        help="write all results into one summary workbook "
+                             "instead of stdout")
+    parser.add_argument("--store", metavar="DIR",
+                        help="persistent result store: reuse sites computed "
+                             "before and save new ones")
+    parser.add_argument("--project",
+                        help="file the sites under this project in the store")
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        ext = os.path.splitext(args.input.lower())[1]
+        fmt = {".csv": "csv", ".xlsx": "xlsx", ".xlsm": "xlsx"}.get(ext, "ndjson")
+
+    if fmt == "xlsx":
+        if args.input == "-":
+            parser.error("xlsx input must be a file, not stdin")
+        from excel_import import iter_workbook_sites
+        stream = sys.stdin
+        records = iter_workbook_sites(args.input)
+    else:
+        stream = sys.stdin if args.input == "-" else open(args.input, newline="")
+        try:
+            records = read_long_csv(stream) if fmt == "csv" else read_ndjson(stream)
+        except ValueError as e:
+            parser.error(f"{args.input}: {e}")
+
+    if args.reports_zip:
+        if args.reports or args.portfolio or args.store:
+            parser.error("--reports-zip cannot be combined with --reports, "
+                         "--portfolio or --store")
+        from report_bundle import write_report_zip
+        try:
+            counts = write_report_zip(records, args.reports_zip, args.workers)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        print(
+            f"{counts['reports']} reports written to {args.reports_zip}, "
+            f"{counts['errors']} sites failed", file=sys.stderr
+        )
+        return
+
+    if args.reports:
+        os.makedirs(args.reports, exist_ok=True)
+
+    store = None
+    if args.store:
+        from result_store import ResultStore
+        store = ResultStore(args.store)
+    elif args.project:
+        parser.error("--project needs --store")
+
+    try:
+        results = classify_stream(
+            records, args.workers, args.reports, store, args.project
+        )
+
+        out = sys.stdout
+        if args.portfolio:
+            from portfolio_export import export_portfolio
+            count = export_portfolio(results, args.portfolio, args.breakdown)
+            print(f"{count} sites written to {args.portfolio}", file=sys.stderr)
+        elif args.output_format == "csv":
+            writer = csv.DictWriter(out, RESULT_COLUMNS)
+            writer.writeheader()
+            for site_id, result in results:
+                writer.writerow(_summary(site_id, result, False))
+        else:
+            for site_id, result in results:
+                out.write(json.dumps(_summary(site_id, result, args.breakdown)))
+                out.write("\n")
+    except BrokenPipeError:
+        # Downstream closed early (e.g. piped into head)
+        sys.stdout = open(os.devnull, "w")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
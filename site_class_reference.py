@@ -1,9 +1,36 @@
+from functools import lru_cache
+
 import streamlit as st
 
-def render_site_class_table():
+from code_editions import band_labels, get_edition, site_class_bands
 
-    st.markdown(
-        """
+# Class bands of the default edition (Table 4) as
+# (site class, lower Vs, upper Vs) in m/s; None leaves
+# a band open-ended.
+SITE_CLASS_BANDS = site_class_bands()
+
+ROMAN_NUMERALS = ["i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x"]
+
+
+def site_class_rows_html(edition=None):
+    """
+    <tr> rows of the class table, fastest class first.
+    """
+
+    labels = band_labels(edition, vs="V<sub>s</sub>", less="&lt;")
+
+    return "".join(
+        f"""
+                <tr>
+                    <td>{ROMAN_NUMERALS[i]})</td>
+                    <td>{site_class}</td>
+                    <td>{text}</td>
+                </tr>"""
+        for i, (site_class, text) in enumerate(labels)
+    )
+
+
+TABLE_CSS = """
         <style>
         .custom-table {
             width: 70%;
@@ -32,17 +59,25 @@ def render_site_class_table():
             margin-bottom: 10px;
         }
         </style>
-        """,
-        unsafe_allow_html=True
-    )
+"""
 
-    st.markdown(
-        """
+
+@lru_cache(maxsize=None)
+def site_class_table_html(edition_key=None):
+    """
+    Title and class table markup for an edition, built once
+    per edition rather than on every rerun.
+    """
+
+    edition = get_edition(edition_key)
+    clause = f"[{edition['clause']}]" if edition["clause"] else ""
+
+    return f"""
         <div class="title">
-            Table 4 Site Classes for Estimating Normalised PSA
+            {edition["table"]}
         </div>
         <div class="subtitle">
-            [Clause 6.2.3.1(a)]
+            {clause}
         </div>
 
         <table class="custom-table">
@@ -53,34 +88,15 @@ def render_site_class_table():
                     <th>Weighted Average Shear Wave Velocity V<sub>s</sub> (m/s)</th>
                 </tr>
             </thead>
-            <tbody>
-                <tr>
-                    <td>i)</td>
-                    <td>A</td>
-                    <td>1500 ≤ V<sub>s</sub></td>
-                </tr>
-                <tr>
-                    <td>ii)</td>
-                    <td>B</td>
-                    <td>760 ≤ V<sub>s</sub> &lt; 1500</td>
-                </tr>
-                <tr>
-                    <td>iii)</td>
-                    <td>C</td>
-                    <td>360 ≤ V<sub>s</sub> &lt; 760</td>
-                </tr>
-                <tr>
-                    <td>iv)</td>
-                    <td>D</td>
-                    <td>180 ≤ V<sub>s</sub> &lt; 360</td>
-                </tr>
-                <tr>
-                    <td>v)</td>
-                    <td>E</td>
-                    <td>V<sub>s</sub> ≤ 180</td>
-                </tr>
+            <tbody>{site_class_rows_html(edition)}
             </tbody>
         </table>
-        """,
-        unsafe_allow_html=True
-    )
+        """
+
+
+def render_site_class_table(edition=None):
+
+    key = get_edition(edition)["key"]
+
+    st.markdown(TABLE_CSS, unsafe_allow_html=True)
+    st.markdown(site_class_table_html(key), unsafe_allow_html=True)
@@ -0,0 +1,316 @@
+import numpy as np
+
+from backend import SOIL_TYPES, accumulate_weighted_vs, determine_site_class
+from batch_engine import calculate_site_class_batch
+from code_editions import get_edition
+
+# Integer codes for soil types, in SOIL_TYPES order. Soil names
+# outside that list are coded SOIL_UNKNOWN and keep their text
+# on the side, so they still round-trip.
+SOIL_CODES = {soil: code for code, soil in enumerate(SOIL_TYPES)}
+SOIL_UNKNOWN = len(SOIL_TYPES)
+
+# Fines < 15% flag. The No / Yes codes double as the
+# column index into batch_engine.exponent_table.
+FINES_VALUES = ["No", "Yes", ""]
+FINES_CODES = {value: code for code, value in enumerate(FINES_VALUES)}
+FINES_NO, FINES_YES, FINES_BLANK = range(len(FINES_VALUES))
+FINES_OTHER = len(FINES_VALUES)
+
+# One record per layer: 30 bytes, against roughly 350 for
+# a layer dict with its keys and boxed values.
+LAYER_DTYPE = np.dtype([
+    ("layer", np.int32),
+    ("thickness", np.float64),
+    ("soil", np.int8),
+    ("fines", np.int8),
+    ("n1", np.float64),
+    ("vsi", np.float64),
+])
+
+
+def encode_soil(soil):
+    return SOIL_CODES.get(soil, SOIL_UNKNOWN)
+
+
+def encode_fines(fines):
+    return FINES_CODES.get(fines, FINES_OTHER)
+
+
+def _n1_value(n1):
+    # N1 is an SPT blow count; whole numbers come back as int
+    n1 = float(n1)
+    return int(n1) if n1.is_integer() else n1
+
+
+def coded_layer_vsi(soil, fines, n1, user_vsi, correlation=None):
+    """
+    compute_layer_vsi on integer codes, with the edition's N1
+    correlation (IS 1893 : 2025 unless another is given).
+    """
+
+    if correlation is None:
+        correlation = get_edition()["correlation"]
+
+    if n1 < correlation["n1_min"] or soil >= SOIL_UNKNOWN:
+        return user_vsi
+
+    exponents = correlation["exponents"].get(SOIL_TYPES[soil])
+    if exponents is None:
+        return user_vsi
+
+    return correlation["coefficient"] * (n1 ** exponents[fines == FINES_YES])
+
+
+class Layer:
+    """
+    One soil layer with integer-coded soil type and fines flag.
+    `text` holds the original (soil_type, fines) strings only
+    when either is outside the known values.
+    """
+
+    __slots__ = ("layer", "thickness", "soil", "fines", "n1", "vsi", "text")
+
+    def __init__(self, layer, thickness, soil, fines, n1, vsi, text=None):
+        self.layer = layer
+        self.thickness = thickness
+        self.soil = soil
+        self.fines = fines
+        self.n1 = n1
+        self.vsi = vsi
+        self.text = text
+
+    def __repr__(self):
+        return (
+            f"Layer({self.layer}, {self.thickness!r}, {self.soil_type!r}, "
+            f"{self.fines_less_than_15!r}, n1={self.n1!r}, vsi={self.vsi!r})"
+        )
+
+    @classmethod
+    def from_dict(cls, layer):
+        soil_type = layer["soil_type"]
+        fines = layer["fines_less_than_15"]
+        soil = encode_soil(soil_type)
+        fines_code = encode_fines(fines)
+        text = None
+        if soil == SOIL_UNKNOWN or fines_code == FINES_OTHER:
+            text = (soil_type, fines)
+
+        return cls(
+            int(layer["layer"]),
+            float(layer["thickness"]),
+            soil,
+            fines_code,
+            _n1_value(layer["n1"]),
+            float(layer["vsi"]),
+            text,
+        )
+
+    @property
+    def soil_type(self):
+        if self.text is not None:
+            return self.text[0]
+        return SOIL_TYPES[self.soil]
+
+    @property
+    def fines_less_than_15(self):
+        if self.text is not None:
+            return self.text[1]
+        return FINES_VALUES[self.fines]
+
+    def computed_vsi(self, correlation=None):
+        return coded_layer_vsi(self.soil, self.fines, self.n1, self.vsi, correlation)
+
+    def to_dict(self):
+        return {
+            "layer": self.layer,
+            "thickness": self.thickness,
+            "soil_type": self.soil_type,
+            "fines_less_than_15": self.fines_less_than_15,
+            "n1": self.n1,
+            "vsi": self.vsi,
+        }
+
+
+class Site:
+    """
+    A site's depth of influence and ordered Layer objects.
+    Converts losslessly to and from the site_data dict.
+    """
+
+    __slots__ = ("depth_of_influence", "layers")
+
+    def __init__(self, depth_of_influence, layers):
+        self.depth_of_influence = depth_of_influence
+        self.layers = layers
+
+    def __repr__(self):
+        return f"Site({self.depth_of_influence!r}, {len(self.layers)} layers)"
+
+    def __len__(self):
+        return len(self.layers)
+
+    @classmethod
+    def from_dict(cls, site_data):
+        return cls(
+            float(site_data["depth_of_influence"]),
+            [Layer.from_dict(layer) for layer in site_data["layers"]],
+        )
+
+    def to_dict(self):
+        return {
+            "depth_of_influence": self.depth_of_influence,
+            "num_layers": len(self.layers),
+            "layers": [layer.to_dict() for layer in self.layers],
+        }
+
+    def calculate(self, edition=None):
+        """
+        calculate_site_class on the coded layers, with the same
+        result dict and errors.
+        """
+
+        edition = get_edition(edition)
+        correlation = edition["correlation"]
+        depth = self.depth_of_influence
+        if edition["depth"] is not None:
+            depth = edition["depth"]
+
+        def rows():
+            for layer in self.layers:
+                if layer.text is None:
+                    soil_type = SOIL_TYPES[layer.soil]
+                    fines = FINES_VALUES[layer.fines]
+                else:
+                    soil_type, fines = layer.text
+                yield (
+                    layer.layer, layer.thickness, soil_type, fines, layer.n1,
+                    layer.computed_vsi(correlation),
+                )
+
+        weighted_vs, layers_used, breakdown = accumulate_weighted_vs(depth, rows())
+
+        return {
+            "weighted_vs": weighted_vs,
+            "site_class": determine_site_class(weighted_vs, edition),
+            "layers_used": layers_used,
+            "breakdown": breakdown
+        }
+
+
+class SiteArray:
+    """
+    Many sites in one LAYER_DTYPE structured array.
+    Site k owns records offsets[k]:offsets[k+1] and depth
+    depths[k]. `text` maps record index to the original
+    (soil_type, fines) strings for the few non-standard layers.
+    """
+
+    def __init__(self, records, offsets, depths, text=None):
+        self.records = records
+        self.offsets = offsets
+        self.depths = depths
+        self.text = text or {}
+
+    def __len__(self):
+        return len(self.depths)
+
+    def __getitem__(self, k):
+        return self.site(k)
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self.site(k)
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes + self.offsets.nbytes + self.depths.nbytes
+
+    @classmethod
+    def from_sites(cls, sites):
+        """
+        Packs site_data dicts or Site objects.
+        """
+
+        rows = []
+        offsets = [0]
+        depths = []
+        text = {}
+
+        for site in sites:
+            if isinstance(site, Site):
+                for layer in site.layers:
+                    if layer.text is not None:
+                        text[len(rows)] = layer.text
+                    rows.append((
+                        layer.layer, layer.thickness, layer.soil,
+                        layer.fines, layer.n1, layer.vsi,
+                    ))
+                depths.append(site.depth_of_influence)
+
+            else:
+                # Encoded straight from the dicts, without building
+                # Layer objects on the way
+                for layer in site["layers"]:
+                    soil_type = layer["soil_type"]
+                    fines = layer["fines_less_than_15"]
+                    soil = SOIL_CODES.get(soil_type, SOIL_UNKNOWN)
+                    fines_code = FINES_CODES.get(fines, FINES_OTHER)
+                    if soil == SOIL_UNKNOWN or fines_code == FINES_OTHER:
+                        text[len(rows)] = (soil_type, fines)
+                    rows.append((
+                        layer["layer"], layer["thickness"], soil,
+                        fines_code, layer["n1"], layer["vsi"],
+                    ))
+                depths.append(site["depth_of_influence"])
+
+            offsets.append(len(rows))
+
+        return cls(
+            np.array(rows, dtype=LAYER_DTYPE),
+            np.asarray(offsets, dtype=np.int64),
+            np.asarray(depths, dtype=np.float64),
+            text,
+        )
+
+    def site(self, k):
+        start, stop = int(self.offsets[k]), int(self.offsets[k + 1])
+
+        layers = []
+        for i, rec in enumerate(self.records[start:stop].tolist(), start):
+            layer_no, thickness, soil, fines, n1, vsi = rec
+            layers.append(Layer(
+                layer_no, thickness, soil, fines, _n1_value(n1), vsi,
+                self.text.get(i),
+            ))
+
+        return Site(float(self.depths[k]), layers)
+
+    def to_dicts(self):
+        return [site.to_dict() for site in self]
+
+    def columns(self, start=0, stop=None):
+        """
+        The flat columns taken by calculate_site_class_batch, for
+        sites start:stop. Numeric columns are views into the
+        records, not copies.
+        """
+
+        stop = len(self) if stop is None else stop
+        first, last = int(self.offsets[start]), int(self.offsets[stop])
+        records = self.records[first:last]
+
+        return {
+            "thickness": records["thickness"],
+            "soil_code": records["soil"],
+            "fines": records["fines"] == FINES_YES,
+            "n1": records["n1"],
+            "vsi": records["vsi"],
+            "offsets": self.offsets[start:stop + 1] - first,
+            "depths": self.depths[start:stop],
+        }
+
+    def calculate(self, breakdown=False, edition=None):
+        return calculate_site_class_batch(
+            **self.columns(), breakdown=breakdown, edition=edition
+        )
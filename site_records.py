@@ -0,0 +1,92 @@
+import re
+
+from backend import SOIL_TYPES
+
+# Accepted spellings of each site_data field in tabular inputs
+COLUMN_ALIASES = {
+    "site_id": ["site_id", "site", "borehole", "borehole_id", "bh", "bh_id"],
+    "depth_of_influence": ["depth_of_influence", "depth", "doi"],
+    "layer": ["layer", "layer_no", "layer_number"],
+    "thickness": ["thickness", "ti", "thickness_m"],
+    "soil_type": ["soil_type", "soil"],
+    "fines_less_than_15": ["fines_less_than_15", "fines", "fines_lt_15"],
+    "n1": ["n1", "n160", "(n1)60", "spt_n1"],
+    "vsi": ["vsi", "vs", "vs_value", "user_vsi"],
+}
+
+_ALIAS_LOOKUP = {
+    alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases
+}
+
+_SOIL_LOOKUP = {soil.lower(): soil for soil in SOIL_TYPES}
+
+
+def normalize_header(name):
+    """
+    Maps a column header onto its site_data field name, or None.
+    """
+
+    if name is None:
+        return None
+    key = str(name).strip().lower().replace(" ", "_").replace("-", "_")
+    if key not in _ALIAS_LOOKUP:
+        # Drop a unit suffix such as "Thickness (m)" or "Vsi [m/s]"
+        key = re.sub(r"_*[(\[][^)\]]*[)\]]$", "", key)
+    return _ALIAS_LOOKUP.get(key)
+
+
+def to_number(value, default=0):
+    """
+    Parses a cell or CSV value. Whole numbers come back as int,
+    blanks as default.
+    """
+
+    if value is None:
+        return default
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return default
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def normalize_soil(value):
+    text = str(value or "").strip()
+    return _SOIL_LOOKUP.get(text.lower(), text)
+
+
+def normalize_fines(value):
+    text = str(value or "").strip().lower()
+    if text in ("yes", "y", "true", "1"):
+        return "Yes"
+    if text in ("no", "n", "false", "0"):
+        return "No"
+    return ""
+
+
+def site_from_rows(rows, depth=None):
+    """
+    Builds a site_data dict from layer rows keyed by field name.
+    The depth of influence comes from the first row unless given.
+    """
+
+    layers = []
+
+    for i, row in enumerate(rows):
+        if depth is None:
+            depth = float(row["depth_of_influence"])
+        layers.append({
+            "layer": to_number(row.get("layer"), i + 1),
+            "thickness": float(row["thickness"]),
+            "soil_type": normalize_soil(row["soil_type"]),
+            "fines_less_than_15": normalize_fines(row.get("fines_less_than_15")),
+            "n1": to_number(row.get("n1")),
+            "vsi": float(to_number(row.get("vsi"))),
+        })
+
+    return {
+        "depth_of_influence": depth,
+        "num_layers": len(layers),
+        "layers": layers,
+    }
@@ -0,0 +1,397 @@
+import argparse
+import heapq
+import json
+import sys
+
+import numpy as np
+
+from backend import calculate_site_class
+from batch_engine import CLASS_LABELS
+from site_model import SiteArray
+
+# Points per leaf. Leaves are checked with one vector operation,
+# so fairly large leaves keep the Python-level traversal short.
+LEAF_SIZE = 64
+
+
+class KDTree:
+    """
+    Static 2-D KD-tree over projected coordinates (e.g. metres in
+    a UTM zone). Balanced and implicit: node i has children 2i+1
+    and 2i+2, and covers the contiguous slice lo[i]:hi[i] of the
+    point order, with its bounding box for pruning.
+    """
+
+    def __init__(self, x, y, leaf_size=LEAF_SIZE):
+        points = np.column_stack((
+            np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        ))
+        n = len(points)
+        if not np.isfinite(points).all():
+            raise ValueError("Coordinates must be finite.")
+
+        depth = max(0, int(np.ceil(np.log2(max(n, 1) / leaf_size))))
+        n_nodes = 2 ** (depth + 1) - 1
+        first_leaf = 2 ** depth - 1
+
+        lo = np.zeros(n_nodes, dtype=np.int64)
+        hi = np.zeros(n_nodes, dtype=np.int64)
+        hi[0] = n
+
+        # Level by level: sort each node's slice along the split
+        # axis in one segmented sort, then halve every slice.
+        order = np.arange(n)
+        for level in range(depth):
+            axis = level % 2
+            nodes = np.arange(2 ** level - 1, 2 ** (level + 1) - 1)
+            segment = np.repeat(np.arange(len(nodes)), hi[nodes] - lo[nodes])
+            order = order[np.lexsort((points[order, axis], segment))]
+
+            mid = (lo[nodes] + hi[nodes]) // 2
+            lo[2 * nodes + 1], hi[2 * nodes + 1] = lo[nodes], mid
+            lo[2 * nodes + 2], hi[2 * nodes + 2] = mid, hi[nodes]
+
+        self.points = points[order]
+        self.order = order
+        self.lo = lo
+        self.hi = hi
+        self.first_leaf = first_leaf
+
+        # Leaf boxes by reduceat over their slices, then each parent
+        # box from its two children, bottom up. Empty leaves get an
+        # inverted box that no query can reach.
+        box = np.empty((n_nodes, 4))
+        box[:, :2] = np.inf
+        box[:, 2:] = -np.inf
+
+        leaves = np.arange(first_leaf, n_nodes)
+        filled = leaves[hi[leaves] > lo[leaves]]
+        if len(filled):
+            starts = lo[filled]
+            box[filled, :2] = np.minimum.reduceat(self.points, starts, axis=0)
+            box[filled, 2:] = np.maximum.reduceat(self.points, starts, axis=0)
+
+        for level in range(depth - 1, -1, -1):
+            nodes = np.arange(2 ** level - 1, 2 ** (level + 1) - 1)
+            left, right = box[2 * nodes + 1], box[2 * nodes + 2]
+            box[nodes, :2] = np.minimum(left[:, :2], right[:, :2])
+            box[nodes, 2:] = np.maximum(left[:, 2:], right[:, 2:])
+
+        self.box = box
+
+    def __len__(self):
+        return len(self.points)
+
+    def _box_distance2(self, node, px, py):
+        x0, y0, x1, y1 = self.box[node]
+        dx = max(x0 - px, 0.0, px - x1)
+        dy = max(y0 - py, 0.0, py - y1)
+        return dx * dx + dy * dy
+
+    def query_radius(self, px, py, radius):
+        """
+        Indices and distances of the points within radius,
+        nearest first.
+        """
+
+        r2 = radius * radius
+        slices = []
+        stack = [0]
+
+        while stack:
+            node = stack.pop()
+            if self.hi[node] <= self.lo[node]:
+                continue
+            if self._box_distance2(node, px, py) > r2:
+                continue
+
+            # Whole box inside the circle: take the slice unchecked
+            x0, y0, x1, y1 = self.box[node]
+            far_x = max(px - x0, x1 - px)
+            far_y = max(py - y0, y1 - py)
+            if far_x * far_x + far_y * far_y <= r2 or node >= self.first_leaf:
+                slices.append((self.lo[node], self.hi[node]))
+            else:
+                stack += (2 * node + 1, 2 * node + 2)
+
+        return self._finish(slices, px, py, r2)
+
+    def query_box(self, xmin, ymin, xmax, ymax):
+        """
+        Indices of the points inside the box, edges included.
+        """
+
+        slices = []
+        stack = [0]
+
+        while stack:
+            node = stack.pop()
+            if self.hi[node] <= self.lo[node]:
+                continue
+            x0, y0, x1, y1 = self.box[node]
+            if x0 > xmax or x1 < xmin or y0 > ymax or y1 < ymin:
+                continue
+            if (x0 >= xmin and x1 <= xmax and y0 >= ymin and y1 <= ymax) \
+                    or node >= self.first_leaf:
+                slices.append((self.lo[node], self.hi[node]))
+            else:
+                stack += (2 * node + 1, 2 * node + 2)
+
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+
+        idx = np.concatenate([np.arange(a, b) for a, b in slices])
+        p = self.points[idx]
+        inside = (
+            (p[:, 0] >= xmin) & (p[:, 0] <= xmax)
+            & (p[:, 1] >= ymin) & (p[:, 1] <= ymax)
+        )
+        return np.sort(self.order[idx[inside]])
+
+    def query_nearest(self, px, py, k=1):
+        """
+        Indices and distances of the k nearest points, nearest
+        first. Best-first search: boxes are visited in order of
+        their distance until none can beat the k-th candidate.
+        """
+
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        best_idx = np.empty(0, dtype=np.int64)
+        best_d2 = np.empty(0)
+        bound = np.inf
+        heap = [(0.0, 0)]
+
+        while heap:
+            d2, node = heapq.heappop(heap)
+            if d2 > bound:
+                break
+            if self.hi[node] <= self.lo[node]:
+                continue
+
+            if node < self.first_leaf:
+                for child in (2 * node + 1, 2 * node + 2):
+                    child_d2 = self._box_distance2(child, px, py)
+                    if child_d2 <= bound:
+                        heapq.heappush(heap, (child_d2, child))
+                continue
+
+            idx = np.arange(self.lo[node], self.hi[node])
+            p = self.points[idx]
+            leaf_d2 = (p[:, 0] - px) ** 2 + (p[:, 1] - py) ** 2
+
+            best_idx = np.concatenate((best_idx, idx))
+            best_d2 = np.concatenate((best_d2, leaf_d2))
+            if len(best_d2) > k:
+                keep = np.argpartition(best_d2, k - 1)[:k]
+                best_idx, best_d2 = best_idx[keep], best_d2[keep]
+            if len(best_d2) == k:
+                bound = best_d2.max()
+
+        first = np.argsort(best_d2, kind="stable")
+        return self.order[best_idx[first]], np.sqrt(best_d2[first])
+
+    def _finish(self, slices, px, py, r2):
+        if not slices:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        idx = np.concatenate([np.arange(a, b) for a, b in slices])
+        p = self.points[idx]
+        d2 = (p[:, 0] - px) ** 2 + (p[:, 1] - py) ** 2
+        inside = d2 <= r2
+        idx, d2 = idx[inside], d2[inside]
+
+        first = np.argsort(d2, kind="stable")
+        return self.order[idx[first]], np.sqrt(d2[first])
+
+
+class BoreholeCatalog:
+    """
+    Boreholes with projected coordinates and their logs, indexed
+    by a KDTree. Logs are a SiteArray, a list of site_data dicts,
+    or a callable loading the site_data of a borehole id. Each hit
+    carries its calculate_site_class result, computed the first
+    time the borehole is hit and cached after that.
+    """
+
+    def __init__(self, site_ids, x, y, sites, leaf_size=LEAF_SIZE):
+        self.site_ids = np.asarray(site_ids)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        if not len(self.site_ids) == len(self.x) == len(self.y):
+            raise ValueError("site_ids, x and y must have the same length.")
+        if not callable(sites) and len(sites) != len(self.site_ids):
+            raise ValueError("Need one site per borehole.")
+
+        self.sites = sites
+        self.tree = KDTree(self.x, self.y, leaf_size)
+        self._results = {}
+
+    def __len__(self):
+        return len(self.site_ids)
+
+    @classmethod
+    def from_records(cls, records, leaf_size=LEAF_SIZE):
+        """
+        Builds a catalogue from (site_id, x, y, site_data) records,
+        packing the logs into a SiteArray.
+        """
+
+        site_ids, x, y, sites = [], [], [], []
+        for site_id, px, py, site_data in records:
+            site_ids.append(site_id)
+            x.append(px)
+            y.append(py)
+            sites.append(site_data)
+
+        return cls(site_ids, x, y, SiteArray.from_sites(sites), leaf_size)
+
+    def site_data(self, i):
+        if isinstance(self.sites, SiteArray):
+            return self.sites.site(i).to_dict()
+        if callable(self.sites):
+            return self.sites(self.site_ids[i].item())
+        return self.sites[i]
+
+    def result(self, i):
+        """
+        Cached calculate_site_class result of borehole i, or
+        {"error": message} for a log that cannot be classified.
+        """
+
+        i = int(i)
+        result = self._results.get(i)
+        if result is None:
+            try:
+                if isinstance(self.sites, SiteArray):
+                    result = self.sites.site(i).calculate()
+                else:
+                    result = calculate_site_class(self.site_data(i))
+            except ValueError as e:
+                result = {"error": str(e)}
+            self._results[i] = result
+        return result
+
+    def _hits(self, idx, distance=None, with_results=True):
+        hits = []
+        for n, i in enumerate(idx.tolist()):
+            hit = {
+                "site_id": self.site_ids[i].item(),
+                "x": float(self.x[i]),
+                "y": float(self.y[i]),
+            }
+            if distance is not None:
+                hit["distance"] = float(distance[n])
+            if with_results:
+                hit["result"] = self.result(i)
+            hits.append(hit)
+        return hits
+
+    def within_radius(self, x, y, radius, with_results=True):
+        """
+        Boreholes within radius of (x, y), nearest first.
+        """
+
+        idx, distance = self.tree.query_radius(x, y, radius)
+        return self._hits(idx, distance, with_results)
+
+    def nearest(self, x, y, k=5, with_results=True):
+        """
+        The k boreholes nearest to (x, y), nearest first.
+        """
+
+        idx, distance = self.tree.query_nearest(x, y, k)
+        return self._hits(idx, distance, with_results)
+
+    def in_box(self, xmin, ymin, xmax, ymax, with_results=True):
+        """
+        Boreholes inside the box, in catalogue order.
+        """
+
+        return self._hits(self.tree.query_box(xmin, ymin, xmax, ymax), None, with_results)
+
+
+def summarize_hits(hits):
+    """
+    Site class picture around a location from query hits: the
+    class of the nearest classified borehole, the count per class,
+    and the governing (softest) class among them.
+    """
+
+    classes = [
+        hit["result"]["site_class"] for hit in hits
+        if "result" in hit and "site_class" in hit["result"]
+    ]
+    counts = {str(label): classes.count(label) for label in CLASS_LABELS[::-1]}
+
+    softest = None
+    for label in CLASS_LABELS:
+        if counts[str(label)]:
+            softest = str(label)
+            break
+
+    return {
+        "boreholes": len(hits),
+        "classified": len(classes),
+        "nearest_class": classes[0] if classes else None,
+        "class_counts": counts,
+        "governing_class": softest,
+    }
+
+
+def read_catalog(stream):
+    """
+    Catalogue from NDJSON site records that also carry "x" and
+    "y"; records without coordinates are skipped.
+    """
+
+    from site_class_cli import read_ndjson
+
+    records = (
+        (site_id, site_data["x"], site_data["y"], site_data)
+        for site_id, site_data in read_ndjson(stream)
+        if site_data is not None and "x" in site_data and "y" in site_data
+    )
+    return BoreholeCatalog.from_records(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Site classes of the boreholes around a location."
+    )
+    parser.add_argument("catalog",
+                        help="NDJSON borehole logs with x and y coordinates")
+    parser.add_argument("x", type=float)
+    parser.add_argument("y", type=float)
+    query = parser.add_mutually_exclusive_group()
+    query.add_argument("--radius", type=float,
+                       help="boreholes within this distance")
+    query.add_argument("--nearest", type=int, default=5, metavar="K",
+                       help="the K nearest boreholes (default 5)")
+    args = parser.parse_args(argv)
+
+    with open(args.catalog, newline="") as stream:
+        catalog = read_catalog(stream)
+
+    if args.radius is not None:
+        hits = catalog.within_radius(args.x, args.y, args.radius)
+    else:
+        hits = catalog.nearest(args.x, args.y, args.nearest)
+
+    summary = summarize_hits(hits)
+
+    for hit in hits:
+        result = hit.pop("result")
+        hit.update(
+            {"error": result["error"]} if "error" in result else
+            {"weighted_vs": result["weighted_vs"], "site_class": result["site_class"]}
+        )
+        sys.stdout.write(json.dumps(hit) + "\n")
+
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
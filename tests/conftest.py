@@ -0,0 +1,51 @@
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import make_site  # noqa: E402
+
+
+def random_sites(n_sites, n_layers=10, seed=0, min_thickness=None):
+    """
+    Random site_data dicts from benchmarks.make_site. Every branch
+    of compute_layer_vsi is covered; min_thickness drops sites too
+    shallow for a fixed averaging depth.
+    """
+
+    rng = random.Random(seed)
+    sites = []
+    while len(sites) < n_sites:
+        site = make_site(rng, n_layers)
+        total = sum(layer["thickness"] for layer in site["layers"])
+        if min_thickness is None or total >= min_thickness:
+            sites.append(site)
+    return sites
+
+
+def layer(n, thickness, soil_type="Clays", fines="", n1=0, vsi=200.0):
+    return {
+        "layer": n,
+        "thickness": thickness,
+        "soil_type": soil_type,
+        "fines_less_than_15": fines,
+        "n1": n1,
+        "vsi": vsi,
+    }
+
+
+@pytest.fixture(autouse=True, scope="session")
+def throwaway_store(tmp_path_factory):
+    # The app and the CLIs open the store named by SITE_CLASS_STORE;
+    # never let a test run touch the real one
+    old = os.environ.get("SITE_CLASS_STORE")
+    os.environ["SITE_CLASS_STORE"] = str(tmp_path_factory.mktemp("store"))
+    yield
+    if old is None:
+        del os.environ["SITE_CLASS_STORE"]
+    else:
+        os.environ["SITE_CLASS_STORE"] = old
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from backend import calculate_site_class
+from conftest import ROOT
+from report_jobs import UNKNOWN, report_jobs
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+APP_PATH = os.path.join(ROOT, "app.py")
+
+
+def fill_layers(at, rows):
+    at.number_input[1].set_value(len(rows)).run()
+    for i, (thickness, vsi) in enumerate(rows):
+        at.selectbox(key=f"soil_{i}").set_value("Others").run()
+        at.number_input(key=f"th_{i}").set_value(thickness)
+        at.number_input(key=f"vs_{i}").set_value(vsi)
+    return at.run()
+
+
+def test_layer_table_calculates_and_invalidates():
+    at = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    at.number_input[0].set_value(5.0)
+    at = fill_layers(at, [(2.0, 150.0), (2.0, 300.0), (3.0, 500.0)])
+    assert not at.exception
+    assert at.session_state.table_total == 7.0
+
+    at.button[0].click().run()
+    expected = calculate_site_class(at.session_state.site_input_data)
+    metrics = {metric.label: metric.value for metric in at.metric}
+    assert metrics["Site Class"] == expected["site_class"]
+    assert float(metrics["Weighted Average Shear Wave Velocity (Vs)"]) == \
+        pytest.approx(expected["weighted_vs"], abs=1e-3)
+    assert "report_job" in at.session_state
+
+    # A job evicted from the shared queue is submitted again
+    # rather than polled for ever
+    evicted = at.session_state.report_job
+    report_jobs.discard(evicted)
+    at.run()
+    assert at.session_state.report_job != evicted
+    assert report_jobs.status(at.session_state.report_job) != UNKNOWN
+
+    # Editing a layer keeps the other rows and drops the stale result
+    at.number_input(key="vs_1").set_value(250.0).run()
+    assert at.session_state.table_layers[1]["vsi"] == 250.0
+    assert at.session_state.table_layers[0]["vsi"] == 150.0
+    assert "calculation_result" not in at.session_state
+    assert not at.metric
+
+
+def test_too_shallow_layers_disable_calculate():
+    at = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    at.number_input[0].set_value(10.0)
+    at = fill_layers(at, [(2.0, 150.0), (2.0, 300.0)])
+    assert at.button[0].disabled
+    assert any("greater than or equal" in w.value for w in at.warning)
+
+
+def test_profile_curve_is_cached_and_downsampled(monkeypatch):
+    import numpy as np
+    import pyarrow as pa
+
+    from depth_profile import DepthProfile
+    from profile_chart import CHART_BUCKETS
+
+    sweeps = []
+    sweep = DepthProfile.sweep
+    monkeypatch.setattr(DepthProfile, "sweep",
+                        lambda self, *args: sweeps.append(args) or sweep(self, *args))
+
+    rng = np.random.default_rng(12)
+    bottom = np.cumsum(rng.uniform(0.02, 0.05, 5000))
+    rows = "".join(f"{d:.4f},{v:.1f}\n" for d, v in zip(bottom, rng.uniform(150, 800, 5000)))
+
+    at = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    at.radio[0].set_value("High-resolution profile (CPT / MASW)").run()
+    at.get("file_uploader")[0].upload("cpt.csv", ("depth,vs\n" + rows).encode()).run()
+    assert not at.exception
+
+    chart = at.get("vega_lite_chart")[0].proto
+    points = pa.ipc.open_stream(chart.datasets[0].data.data).read_all().num_rows
+    assert 0 < points <= 4 * CHART_BUCKETS
+
+    at.run()
+    assert not at.exception
+    assert len(sweeps) == 1
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from backend import calculate_site_class
+from batch_engine import calculate_site_class_batch, determine_site_class_batch, sites_to_columns
+from class_margin import class_margins
+from conftest import layer, random_sites
+
+
+def batch(sites, **kwargs):
+    return calculate_site_class_batch(**sites_to_columns(sites), **kwargs)
+
+
+@pytest.mark.parametrize("n_layers", [1, 3, 10])
+def test_matches_scalar_exactly(n_layers):
+    sites = random_sites(500, n_layers, seed=n_layers)
+    out = batch(sites)
+
+    for k, site in enumerate(sites):
+        expected = calculate_site_class(site)
+        assert out["weighted_vs"][k] == expected["weighted_vs"]
+        assert out["site_class"][k] == expected["site_class"]
+        assert out["layers_used"][k] == expected["layers_used"]
+
+
+def test_mixed_layer_counts_and_breakdown():
+    sites = random_sites(50, 2, seed=1) + random_sites(50, 13, seed=2) + random_sites(5, 40, seed=3)
+    sites = [sites[k] for k in np.random.default_rng(0).permutation(len(sites))]
+    out = batch(sites, breakdown=True)
+
+    offsets = sites_to_columns(sites)["offsets"]
+    for k, site in enumerate(sites):
+        expected = calculate_site_class(site)
+        assert out["weighted_vs"][k] == expected["weighted_vs"]
+
+        rows = slice(offsets[k], offsets[k] + expected["layers_used"])
+        assert out["used"][rows].all()
+        assert not out["used"][offsets[k] + expected["layers_used"]:offsets[k + 1]].any()
+        assert list(out["effective_thickness"][rows]) == [
+            row["effective_thickness"] for row in expected["breakdown"]
+        ]
+        assert list(out["ti_over_vsi"][rows]) == [row["ti_over_vsi"] for row in expected["breakdown"]]
+
+
+def test_cut_layer_ends_exactly_at_depth():
+    # 0.1 + (0.3 - 0.1) rounds to one ulp short of 0.3
+    site = {"depth_of_influence": 0.3, "layers": [layer(1, 0.1), layer(2, 0.5)]}
+
+    expected = calculate_site_class(site)
+    out = batch([site])
+    assert out["weighted_vs"][0] == expected["weighted_vs"] == 200.0
+
+
+@pytest.mark.parametrize("bad_site, message", [
+    ({"depth_of_influence": 5.0, "layers": [layer(1, 2.0)]}, "Total thickness"),
+    ({"depth_of_influence": 1.0, "layers": [layer(1, 2.0, vsi=0.0)]}, "Vsi must be"),
+    ({"depth_of_influence": 1.0, "layers": [layer(1, 2.0, soil_type="Others", vsi=np.nan)]},
+     "finite"),
+    ({"depth_of_influence": 1.0, "layers": [layer(1, 2.0, n1=np.nan)]}, "finite"),
+])
+def test_errors_name_the_first_failing_site(bad_site, message):
+    # Site 3 has more layers than site 7, so it lands in a
+    # layer-count bucket that is processed later
+    sites = random_sites(10, 4)
+    deep = dict(bad_site, layers=bad_site["layers"] + [layer(9, 0.0)] * 8)
+    sites[3] = deep
+    sites[7] = bad_site
+
+    with pytest.raises(ValueError, match=message) as scalar:
+        calculate_site_class(bad_site)
+    with pytest.raises(ValueError) as error:
+        batch(sites)
+    assert str(error.value) == f"{scalar.value} (site 3)"
+
+
+def test_fixed_depth_edition_matches_scalar():
+    sites = random_sites(200, 12, seed=4, min_thickness=30.0)
+    out = batch(sites, edition="asce7_16")
+    for k, site in enumerate(sites):
+        expected = calculate_site_class(site, "asce7_16")
+        assert out["weighted_vs"][k] == expected["weighted_vs"]
+        assert out["site_class"][k] == expected["site_class"]
+
+
+def test_non_finite_vs_has_no_class():
+    with pytest.raises(ValueError, match=r"finite number. \(site 1\)"):
+        determine_site_class_batch([200.0, np.inf, np.nan])
+    with pytest.raises(ValueError, match="finite"):
+        class_margins([200.0, np.nan])
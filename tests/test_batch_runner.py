@@ -0,0 +1,33 @@
+from backend import calculate_site_class
+from batch_runner import SMALL_BATCH, process_site, run_batch
+from conftest import layer, random_sites
+
+
+def test_process_site_reports_errors():
+    assert process_site({"depth_of_influence": 9.0, "layers": [layer(1, 1.0)]}) == {
+        "error": "Total thickness is less than depth of influence."
+    }
+    assert process_site({"layers": []}) == {"error": "Malformed site record."}
+
+
+def test_pool_keeps_input_order():
+    sites = random_sites(SMALL_BATCH * 3, 5, seed=7)
+    sites[10] = {"depth_of_influence": 9.0, "layers": [layer(1, 1.0)]}
+
+    results, stats = run_batch(sites, workers=2, chunk_size=7, max_in_flight=3)
+
+    assert stats["mode"] == "process-pool"
+    assert stats["sites"] == len(sites)
+    assert "error" in results[10]
+    for k, (site, result) in enumerate(zip(sites, results)):
+        if k != 10:
+            assert result["weighted_vs"] == calculate_site_class(site)["weighted_vs"]
+
+
+def test_small_batches_run_in_process():
+    sites = random_sites(5, 3)
+    results, stats = run_batch(sites, workers=4)
+    assert stats["mode"] == "in-process"
+    assert [r["site_class"] for r in results] == [
+        calculate_site_class(site)["site_class"] for site in sites
+    ]
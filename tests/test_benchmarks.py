@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+from benchmarks import (
+    RESULTS_FORMAT, _store_at, compare_results, main, measure, run_suite, suite_cases,
+)
+
+
+def results(**cases):
+    return {"format": RESULTS_FORMAT, "cases": cases}
+
+
+def timing(best):
+    return {"best": best, "median": best, "loops": 1, "repeat": 1}
+
+
+BASELINE = results(same=timing(1.0), slower=timing(1.0), faster=timing(1.0),
+                   broken=timing(1.0), dropped=timing(1.0))
+CURRENT = results(same=timing(1.05), slower=timing(1.2), faster=timing(0.5),
+                  broken={"error": "ImportError: no streamlit"}, added=timing(1.0))
+
+
+def test_compare_statuses():
+    statuses = {row[0]: row[4] for row in compare_results(BASELINE, CURRENT, tolerance=0.1)}
+    assert statuses == {
+        "same": "ok", "slower": "slower", "faster": "faster",
+        "broken": "error", "dropped": "missing", "added": "new",
+    }
+
+
+def test_compare_exit_status(tmp_path, capsys):
+    paths = []
+    for name, data in (("base", BASELINE), ("current", CURRENT), ("ok", BASELINE)):
+        path = tmp_path / f"{name}.json"
+        path.write_text(json.dumps(data))
+        paths.append(str(path))
+
+    assert main(["compare", paths[0], paths[1]]) == 1
+    assert "slower (slower)" in capsys.readouterr().err
+    assert main(["compare", paths[0], paths[2]]) == 0
+
+
+def test_filtered_run_compares_only_selected_cases(tmp_path):
+    baseline = tmp_path / "base.json"
+    baseline.write_text(json.dumps(results(**{
+        "engine.scalar.layers_1": timing(1.0), "report.template_parse": timing(1.0),
+    })))
+    # Far faster than the made-up baseline, and the other case is not missing
+    assert main(["run", "-k", "engine.scalar.layers_1$", "--repeat", "1",
+                 "--min-time", "0", "--compare", str(baseline)]) == 0
+
+
+def test_run_records_setup_errors(monkeypatch):
+    def broken():
+        raise RuntimeError("no app")
+
+    monkeypatch.setattr("benchmarks.suite_cases", lambda: [
+        ("fast", lambda: (lambda: None), False), ("broken", broken, False),
+        ("slow", lambda: (lambda: None), True),
+    ])
+    out = run_suite(quick=True, repeat=2, min_time=0)
+    assert out["cases"]["broken"] == {"error": "RuntimeError: no app"}
+    assert out["cases"]["fast"]["repeat"] == 2
+    assert "slow" not in out["cases"]
+
+
+def test_measure_loops_fast_cases():
+    out = measure(lambda: None, repeat=3, min_time=0.01)
+    assert out["loops"] > 1 and out["best"] <= out["median"]
+
+
+def test_case_names_are_unique():
+    names = [name for name, _, _ in suite_cases()]
+    assert len(names) == len(set(names))
+
+
+@pytest.mark.parametrize("old", [None, "elsewhere"])
+def test_store_at_restores_the_environment(monkeypatch, old):
+    if old is None:
+        monkeypatch.delenv("SITE_CLASS_STORE", raising=False)
+    else:
+        monkeypatch.setenv("SITE_CLASS_STORE", old)
+
+    with pytest.raises(RuntimeError):
+        with _store_at("bench"):
+            assert os.environ["SITE_CLASS_STORE"] == "bench"
+            raise RuntimeError
+    assert os.environ.get("SITE_CLASS_STORE") == old
@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+import pytest
+
+from backend import calculate_site_class
+from borehole_archive import BoreholeArchive, classify_archive, main, write_archive
+from conftest import layer, random_sites
+from site_model import Site
+
+
+def records(n, seed=30):
+    return [(f"BH-{k}", site) for k, site in enumerate(random_sites(n, 8, seed=seed))]
+
+
+def test_pack_round_trip(tmp_path):
+    path = str(tmp_path / "logs.scarch")
+    data = records(50)
+    data[7][1]["layers"].append(layer(9, 1.0, soil_type="Peat", fines="maybe", n1=4.5))
+    data.insert(3, ("missing", None))
+    data.insert(9, ("broken", {"layers": [{"thickness": 1.0}]}))
+
+    skipped = write_archive(iter(data), path, {"project": "P"}, chunk_size=8)
+    assert skipped == ["missing", "broken"]
+
+    archive = BoreholeArchive(path)
+    kept = [(site_id, site) for site_id, site in data if site_id not in skipped]
+    assert len(archive) == 50 and archive.metadata == {"project": "P"}
+    assert archive.n_layers == sum(len(site["layers"]) for _, site in kept)
+    for (site_id, site), (read_id, read) in zip(kept, archive.iter_sites()):
+        assert read_id == site_id
+        assert read == Site.from_dict(site).to_dict()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_classify_matches_scalar(tmp_path, workers):
+    path = str(tmp_path / "logs.scarch")
+    data = records(60, seed=31)
+    data[11][1]["depth_of_influence"] = 1e6
+    write_archive(data, path)
+
+    out = classify_archive(path, workers=workers)
+    assert list(out["errors"]) == [11]
+    assert out["site_class"][11] == "" and np.isnan(out["weighted_vs"][11])
+    for k, (_, site) in enumerate(data):
+        if k == 11:
+            continue
+        expected = calculate_site_class(site)
+        assert out["weighted_vs"][k] == pytest.approx(expected["weighted_vs"], rel=1e-12)
+        assert out["site_class"][k] == expected["site_class"]
+
+
+def test_shards_cover_every_site(tmp_path):
+    path = str(tmp_path / "logs.scarch")
+    write_archive(records(100, seed=32), path)
+    shards = BoreholeArchive(path).shards(7)
+    assert shards[0][0] == 0 and shards[-1][1] == 100
+    assert all(a[1] == b[0] for a, b in zip(shards, shards[1:]))
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "plain.bin"
+    path.write_bytes(b"not an archive")
+    with pytest.raises(ValueError, match="Not a borehole archive"):
+        BoreholeArchive(str(path))
+
+
+def test_cli_pack_and_classify(tmp_path, capsys):
+    source = tmp_path / "logs.ndjson"
+    data = records(5, seed=33)
+    source.write_text("".join(json.dumps({"site_id": i, **s}) + "\n" for i, s in data))
+    archive = str(tmp_path / "logs.scarch")
+
+    main(["pack", str(source), "-o", archive])
+    capsys.readouterr()
+    main(["classify", archive, "--workers", "1"])
+    rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert [row["site_id"] for row in rows] == [i for i, _ in data]
+    assert [row["site_class"] for row in rows] == \
+        [calculate_site_class(s)["site_class"] for _, s in data]
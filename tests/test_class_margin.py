@@ -0,0 +1,70 @@
+import copy
+
+import numpy as np
+import pytest
+
+from backend import calculate_site_class
+from class_margin import analyze_sites, class_margins
+from conftest import layer, random_sites
+
+
+def test_margins_around_the_thresholds():
+    m = class_margins([170.0, 360.0, 2000.0])
+    assert list(m["site_class"]) == ["E", "C", "A"]
+    assert list(m["margin_up"]) == [10.0, 400.0, np.inf]
+    assert list(m["margin_down"]) == [np.inf, 0.0, 500.0]
+
+
+def test_derivatives_match_finite_differences():
+    site = {"depth_of_influence": 6.0, "layers": [
+        layer(1, 2.0, soil_type="Others", vsi=150.0),
+        layer(2, 2.0, soil_type="Others", vsi=300.0),
+        layer(3, 4.0, soil_type="Others", vsi=600.0),
+    ]}
+    out = analyze_sites([site])
+    base = calculate_site_class(site)["weighted_vs"]
+
+    h = 1e-4
+    for i in range(2):
+        for key, column in (("vsi", "dvs_dvsi"), ("thickness", "dvs_dti")):
+            bumped = copy.deepcopy(site)
+            bumped["layers"][i][key] += h
+            slope = (calculate_site_class(bumped)["weighted_vs"] - base) / h
+            assert out[column][i] == pytest.approx(slope, rel=1e-3)
+
+
+def test_single_layer_changes_flip_the_class():
+    sites = random_sites(40, 6, seed=16)
+    out = analyze_sites(sites)
+    offsets = out["offsets"]
+
+    checked = 0
+    for k, site in enumerate(sites):
+        for i in range(len(site["layers"])):
+            for column, nudge in (("n1_change_up", 1e-6), ("n1_change_down", -1e-6)):
+                change = out[column][offsets[k] + i]
+                if np.isnan(change):
+                    continue
+                moved = copy.deepcopy(site)
+                moved["layers"][i]["n1"] += change + nudge
+                assert calculate_site_class(moved)["site_class"] != out["site_class"][k]
+                checked += 1
+    assert checked > 10
+
+
+def test_uniform_change_flips_the_class():
+    # Every layer correlated, so the uniform change applies to all
+    site = {"depth_of_influence": 20.0, "layers": [
+        layer(1, 5.0, n1=25), layer(2, 5.0, n1=25), layer(3, 10.0, n1=30),
+    ]}
+    out = analyze_sites([site])
+    nominal = out["site_class"][0]
+
+    for column, nudge in (("uniform_n1_change_up", 1e-6), ("uniform_n1_change_down", -1e-6)):
+        change = out[column][0]
+        assert np.isfinite(change)
+        for shift, flips in ((change + nudge, True), (change - nudge, False)):
+            moved = copy.deepcopy(site)
+            for row in moved["layers"]:
+                row["n1"] += shift
+            assert (calculate_site_class(moved)["site_class"] != nominal) == flips
@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+import pytest
+
+from backend import calculate_site_class
+from batch_engine import calculate_site_class_batch, calculate_site_class_editions, sites_to_columns
+from class_margin import analyze_sites
+from code_editions import (
+    EDITIONS, IS_1893_2025_CORRELATION, band_labels, classify, get_edition, register_edition
+)
+from conftest import layer, random_sites
+from site_model import Site, SiteArray
+
+CUSTOM = {
+    "key": "custom",
+    "name": "Custom",
+    "classes": np.array(["E", "D", "C", "B", "A"]),
+    "thresholds": np.array([180.0, 360.0, 760.0, 1500.0]),
+    "correlation": {**IS_1893_2025_CORRELATION, "coefficient": 100, "n1_min": 5},
+    "depth": None,
+    "table": "Custom Site Classes",
+    "clause": None,
+}
+
+
+def test_thresholds_belong_to_the_faster_class():
+    assert classify(179.99) == "E"
+    assert classify(180.0) == "D"
+    assert list(classify([100.0, 760.0, 5000.0])) == ["E", "B", "A"]
+    assert band_labels()[0] == ("A", "Vₛ ≥ 1500")
+
+
+@pytest.mark.parametrize("vs", [math.nan, math.inf, [200.0, math.nan]])
+def test_non_finite_vs_has_no_class(vs):
+    with pytest.raises(ValueError, match="finite"):
+        classify(vs)
+
+
+def test_bad_editions_are_rejected():
+    with pytest.raises(ValueError, match="Unknown"):
+        get_edition("no_such_code")
+    with pytest.raises(ValueError, match="one class more"):
+        register_edition("bad", "Bad", ["B", "A"], [200, 300], {})
+    with pytest.raises(ValueError, match="increase"):
+        register_edition("bad", "Bad", ["C", "B", "A"], [300, 200], {})
+    with pytest.raises(ValueError, match="greater than zero"):
+        register_edition("bad", "Bad", ["B", "A"], [200], {}, depth=0)
+    assert "bad" not in EDITIONS
+
+
+def test_custom_correlation_reaches_every_engine():
+    site = {"depth_of_influence": 12.0, "layers": [
+        layer(1, 4.0, n1=7), layer(2, 4.0, n1=20), layer(3, 4.0, soil_type="Others", vsi=400.0),
+    ]}
+    default = calculate_site_class(site)
+    custom = calculate_site_class(site, CUSTOM)
+
+    # N1 = 7 is below the default minimum but not the custom one
+    assert custom["breakdown"][0]["computed_vsi"] == pytest.approx(100 * 7 ** 0.3)
+    assert default["breakdown"][0]["computed_vsi"] == 200.0
+    assert custom["weighted_vs"] != default["weighted_vs"]
+
+    assert Site.from_dict(site).calculate(CUSTOM) == custom
+    batch = calculate_site_class_batch(**sites_to_columns([site]), edition=CUSTOM)
+    assert batch["weighted_vs"][0] == pytest.approx(custom["weighted_vs"], rel=1e-12)
+    assert SiteArray.from_sites([site]).calculate(edition=CUSTOM)["weighted_vs"][0] == \
+        pytest.approx(custom["weighted_vs"], rel=1e-12)
+    assert analyze_sites([site], CUSTOM)["weighted_vs"][0] == \
+        pytest.approx(custom["weighted_vs"], rel=1e-12)
+
+
+def test_all_editions_in_one_pass():
+    sites = random_sites(40, 12, seed=17)
+    results = calculate_site_class_editions(sites_to_columns(sites))
+    assert set(results) == set(EDITIONS)
+
+    for key, out in results.items():
+        for k, site in enumerate(sites):
+            try:
+                expected = calculate_site_class(site, key)
+            except ValueError:
+                # Too shallow for the edition's fixed averaging depth
+                assert np.isnan(out["weighted_vs"][k]) and out["site_class"][k] == ""
+                continue
+            assert out["weighted_vs"][k] == pytest.approx(expected["weighted_vs"], rel=1e-12)
+            assert out["site_class"][k] == expected["site_class"]
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from backend import calculate_site_class
+from columnar_export import NULL_PARTITION, export_records, export_sites
+from conftest import random_sites
+from site_model import SiteArray
+
+pa = pytest.importorskip("pyarrow")
+ds = pytest.importorskip("pyarrow.dataset")
+
+
+def read(out_dir, table, format="parquet"):
+    dataset = ds.dataset(os.path.join(out_dir, table), format=format, partitioning="hive")
+    rows = dataset.to_table().to_pylist()
+    return sorted(rows, key=lambda row: (int(row["site_id"]), row.get("layer") or 0))
+
+
+@pytest.fixture(scope="module")
+def sites():
+    sites = random_sites(40, 6, seed=34)
+    sites[5]["depth_of_influence"] = 1e6
+    return sites
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_batch_and_record_paths_agree(tmp_path, sites, format):
+    batch_dir, record_dir = str(tmp_path / "batch"), str(tmp_path / "records")
+
+    def results():
+        for k, site in enumerate(sites):
+            try:
+                yield k, calculate_site_class(site)
+            except ValueError as e:
+                yield k, {"error": str(e)}
+
+    rows = export_sites(SiteArray.from_sites(sites), batch_dir, format=format, batch_sites=16)
+    assert rows == export_records(results(), record_dir, format=format, batch_sites=16)
+    assert os.path.isdir(os.path.join(batch_dir, "sites", f"site_class={NULL_PARTITION}"))
+
+    for table in ("sites", "layers"):
+        batch, records = read(batch_dir, table, format), read(record_dir, table, format)
+        assert len(batch) == rows[table]
+        for a, b in zip(batch, records):
+            assert a.keys() == b.keys()
+            for name, value in a.items():
+                if isinstance(value, float):
+                    assert value == pytest.approx(b[name], rel=1e-12)
+                else:
+                    assert value == b[name]
+
+
+def test_rows_match_the_scalar_results(tmp_path, sites):
+    out_dir = str(tmp_path / "out")
+    export_sites(SiteArray.from_sites(sites), out_dir, partition_by=None)
+
+    site_rows = read(out_dir, "sites")
+    assert site_rows[5]["site_class"] is None and site_rows[5]["error"]
+    for k, row in enumerate(site_rows):
+        if k == 5:
+            continue
+        expected = calculate_site_class(sites[k])
+        assert row["site_class"] == expected["site_class"]
+        assert row["weighted_vs"] == pytest.approx(expected["weighted_vs"], rel=1e-12)
+
+    layer_rows = [row for row in read(out_dir, "layers") if row["site_id"] == "0"]
+    breakdown = calculate_site_class(sites[0])["breakdown"]
+    assert [row["layer"] for row in layer_rows] == [layer["layer"] for layer in breakdown]
+    assert [row["soil_type"] for row in layer_rows] == [layer["soil_type"] for layer in breakdown]
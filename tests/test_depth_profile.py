@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from backend import calculate_site_class
+from conftest import layer, random_sites
+from depth_profile import DepthProfile
+
+
+def test_every_depth_matches_scalar():
+    for site in random_sites(40, 8, seed=2):
+        profile = DepthProfile.from_site_data(site)
+        total = profile.total_thickness
+        depths = np.concatenate((
+            np.linspace(0.05, total, 50),
+            profile.cum_t[1:],
+            np.nextafter(profile.cum_t[1:], 0),
+        ))
+        depths = depths[(depths > 0) & (depths <= total)]
+
+        vs = profile.weighted_vs(depths)
+        classes = profile.site_class(depths)
+        for d, v, c in zip(depths, vs, classes):
+            expected = calculate_site_class(dict(site, depth_of_influence=float(d)))
+            assert v == expected["weighted_vs"]
+            assert c == expected["site_class"]
+
+
+def test_scalar_depth_returns_scalars():
+    profile = DepthProfile([layer(1, 2.0, vsi=100.0), layer(2, 2.0, vsi=300.0)])
+    assert profile.weighted_vs(2.0) == 100.0
+    assert profile.weighted_vs(4.0) == pytest.approx(4 / (2 / 100 + 2 / 300))
+    assert profile.site_class(2.0) == "E"
+
+
+@pytest.mark.parametrize("layers", [
+    [layer(1, 2.0), layer(2, 1.0, vsi=-5.0)],
+    [layer(1, 2.0), layer(2, 1.0, vsi=-5.0), layer(3, 1.0)],
+    [layer(1, 2.0), layer(2, 0.0), layer(3, 1.0, vsi=0.0)],
+    [layer(1, 2.0), layer(2, 1.0)],
+])
+def test_errors_match_scalar(layers):
+    profile = DepthProfile(layers)
+    for depth in (1.0, 2.0, 2.5, 3.0, 3.5, 10.0):
+        try:
+            expected = calculate_site_class({"depth_of_influence": depth, "layers": layers})
+        except ValueError as e:
+            with pytest.raises(ValueError, match=str(e)):
+                profile.weighted_vs(depth)
+            with pytest.raises(ValueError, match=str(e)):
+                profile.weighted_vs([1.0, depth])
+        else:
+            assert profile.weighted_vs(depth) == expected["weighted_vs"]
+
+
+def test_sweep_drops_depths_beyond_the_profile():
+    profile = DepthProfile([layer(1, 2.0), layer(2, 1.0, vsi=400.0)])
+    depths, vs, classes = profile.sweep(0.5, 5.0, 0.5)
+    assert depths[-1] == 3.0
+    assert len(depths) == len(vs) == len(classes) == 6
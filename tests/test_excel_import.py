@@ -0,0 +1,65 @@
+import pytest
+from openpyxl import Workbook
+
+from backend import calculate_site_class
+from conftest import random_sites
+from excel_import import classify_workbook, iter_workbook_sites
+from report_generator import generate_site_class_report
+
+HEADER = ["Site ID", "Depth of Influence", "Layer", "Thickness", "Soil Type",
+          "Fines", "N1", "Vsi"]
+
+
+def layer_rows(site_id, site):
+    for row in site["layers"]:
+        yield [site_id, site["depth_of_influence"], row["layer"], row["thickness"],
+               row["soil_type"], row["fines_less_than_15"], row["n1"], row["vsi"]]
+
+
+def test_long_format_sheet(tmp_path):
+    sites = random_sites(3, 4, seed=8)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Logs"
+    ws.append(["Project borehole logs"])
+    ws.append(HEADER)
+    for k, site in enumerate(sites):
+        for row in layer_rows(f"BH-{k}", site):
+            ws.append(row)
+    path = tmp_path / "logs.xlsx"
+    wb.save(path)
+
+    read = list(iter_workbook_sites(str(path)))
+    assert [site_id for site_id, _ in read] == ["BH-0", "BH-1", "BH-2"]
+    for (_, site_data), site in zip(read, sites):
+        assert calculate_site_class(site_data)["weighted_vs"] == calculate_site_class(site)["weighted_vs"]
+
+
+def test_single_site_sheet_with_depth_line(tmp_path):
+    site = random_sites(1, 3, seed=9)[0]
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "BH-7"
+    ws.append(["Depth of Influence", site["depth_of_influence"]])
+    ws.append(HEADER[2:])
+    for row in layer_rows(None, site):
+        ws.append(row[2:])
+    ws.append([])
+    path = tmp_path / "bh7.xlsx"
+    wb.save(path)
+
+    (site_id, site_data), = iter_workbook_sites(str(path))
+    assert site_id == "BH-7"
+    assert site_data["depth_of_influence"] == site["depth_of_influence"]
+
+
+def test_report_round_trip(tmp_path):
+    site = random_sites(1, 6, seed=10)[0]
+    result = calculate_site_class(site)
+    path = tmp_path / "BH-1.xlsx"
+    generate_site_class_report(site, result, str(path))
+
+    (site_id, result_again), = classify_workbook(str(path))
+    assert site_id == "BH-1"
+    assert result_again["site_class"] == result["site_class"]
+    assert result_again["weighted_vs"] == pytest.approx(result["weighted_vs"], rel=1e-5)
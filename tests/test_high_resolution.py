@@ -0,0 +1,53 @@
+import io
+
+import numpy as np
+import pytest
+from openpyxl import load_workbook
+
+from backend import calculate_site_class
+from high_resolution import aggregate_breakdown, read_profile
+from report_generator import INTERVALS_SHEET, TEMPLATE_LAYER_ROWS, render_site_class_report
+
+
+def cpt_profile(n, seed=0):
+    rng = np.random.default_rng(seed)
+    bottom = np.round(np.cumsum(rng.uniform(0.02, 0.1, n)), 4)
+    vs = np.round(rng.uniform(120, 900, n), 1)
+    return bottom, vs
+
+
+def test_csv_depths_and_units():
+    data = b"Depth (m),Vs [m/s]\n1.0,150\n2.5,300\n4.0,500\n"
+    layers = read_profile(data, "sounding.csv")
+    assert [layer["thickness"] for layer in layers] == [1.0, 1.5, 1.5]
+    assert {layer["soil_type"] for layer in layers} == {"Others"}
+
+
+@pytest.mark.parametrize("text, message", [
+    (b"depth\n1\n", "Vs column"),
+    (b"from to vs\n0 1 100\n2 3 200\n", "contiguous"),
+    (b"depth vs\n2 100\n1 200\n", "increase"),
+])
+def test_bad_profiles(text, message):
+    with pytest.raises(ValueError, match=message):
+        read_profile(text, "profile.txt")
+
+
+def test_aggregation_keeps_weighted_vs():
+    bottom, vs = cpt_profile(2000)
+    text = "depth vs\n" + "\n".join(f"{d} {v}" for d, v in zip(bottom, vs))
+    layers = read_profile(text.encode(), "cpt.txt")
+    site = {"depth_of_influence": float(bottom[-1]), "layers": layers}
+    result = calculate_site_class(site)
+
+    merged = aggregate_breakdown(result["breakdown"], TEMPLATE_LAYER_ROWS)
+    assert len(merged) == TEMPLATE_LAYER_ROWS
+    assert sum(layer["effective_thickness"] for layer in merged) == pytest.approx(bottom[-1])
+    vs_merged = (sum(layer["effective_thickness"] for layer in merged)
+                 / sum(layer["ti_over_vsi"] for layer in merged))
+    assert vs_merged == pytest.approx(result["weighted_vs"], rel=1e-12)
+
+    # The report groups the intervals and lists them all on a second sheet
+    wb = load_workbook(io.BytesIO(render_site_class_report(site, result)), read_only=True)
+    assert wb["Site Class Report"]["B11"].value.startswith("Layers 1–")
+    assert wb[INTERVALS_SHEET].max_row > len(layers)
@@ -0,0 +1,26 @@
+from openpyxl import load_workbook
+
+from conftest import layer, random_sites
+from portfolio_export import SUMMARY_HEADER, export_portfolio
+from site_class_cli import classify_stream
+
+
+def test_summary_and_breakdown_sheets(tmp_path):
+    sites = random_sites(3, 4, seed=11)
+    short = {"depth_of_influence": 9.0, "layers": [layer(1, 1.0)]}
+    records = [("BH/1", sites[0]), ("bh:1", sites[1]), ("bad", short), ("Summary", sites[2])]
+    path = tmp_path / "portfolio.xlsx"
+
+    count = export_portfolio(classify_stream(records), str(path), breakdown_sheets=True)
+    assert count == 4
+
+    wb = load_workbook(path, read_only=True)
+    rows = list(wb["Summary"].iter_rows(values_only=True))
+    assert list(rows[0]) == SUMMARY_HEADER + ["Breakdown Sheet"]
+    assert [row[0] for row in rows[1:]] == ["BH/1", "bh:1", "bad", "Summary"]
+    assert rows[3][4] == "Total thickness is less than depth of influence."
+
+    # Error rows stop after the message
+    titles = [row[5] for row in rows[1:] if len(row) > 5 and row[5]]
+    assert titles == ["BH_1", "bh_1~2", "Summary~2"]
+    assert wb.sheetnames == ["Summary"] + titles
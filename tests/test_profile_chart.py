@@ -0,0 +1,33 @@
+import numpy as np
+
+from profile_chart import downsample_minmax, step_series, vs_profile_chart
+
+
+def test_step_series_corners():
+    depth, vs = step_series([1.0, 2.0], [100.0, 300.0])
+    assert list(depth) == [0.0, 1.0, 1.0, 3.0]
+    assert list(vs) == [100.0, 100.0, 300.0, 300.0]
+
+
+def test_downsampling_keeps_every_bucket_extreme():
+    rng = np.random.default_rng(1)
+    depth, vs = step_series(rng.uniform(0.01, 0.05, 20000), rng.uniform(100, 1000, 20000))
+    n_buckets = 100
+    keep = downsample_minmax(depth, vs, n_buckets)
+
+    assert len(keep) <= 4 * n_buckets
+    assert keep[0] == 0 and keep[-1] == len(depth) - 1
+    assert np.all(np.diff(keep) > 0)
+
+    bucket = np.minimum(((depth - depth[0]) / (depth[-1] - depth[0]) * n_buckets).astype(int),
+                        n_buckets - 1)
+    for b in range(n_buckets):
+        full = vs[bucket == b]
+        kept = vs[keep][bucket[keep] == b]
+        assert kept.min() == full.min() and kept.max() == full.max()
+
+
+def test_short_profiles_are_kept_whole():
+    depth, vs = step_series([1.0, 2.0, 3.0], [100.0, 200.0, 300.0])
+    assert list(downsample_minmax(depth, vs)) == list(range(6))
+    assert vs_profile_chart(depth, vs, 4.0, 180.0).to_dict()["layer"]
@@ -0,0 +1,100 @@
+import csv
+import gc
+import io
+import os
+import time
+import zipfile
+
+import pytest
+from openpyxl import load_workbook
+
+from backend import calculate_site_class
+from conftest import random_sites
+from report_bundle import SUMMARY_NAME, BundleFile, _member_name, sweep_bundles, write_report_zip
+
+
+def records():
+    sites = random_sites(6, 4, seed=35)
+    sites[2]["depth_of_influence"] = 1e6
+    data = [(f"BH/{k}", site) for k, site in enumerate(sites)]
+    data.append(("bh/0", sites[0]))
+    data.append(("missing", None))
+    return data
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_zip_holds_every_report_and_the_summary(workers):
+    data = records()
+    buffer = io.BytesIO()
+    done = []
+    counts = write_report_zip(data, buffer, workers=workers, progress=done.append)
+
+    assert counts == {"sites": 8, "reports": 6, "errors": 2}
+    assert done == list(range(1, 9))
+
+    with zipfile.ZipFile(buffer) as bundle:
+        names = bundle.namelist()
+        assert names[-1] == SUMMARY_NAME
+        rows = list(csv.DictReader(io.TextIOWrapper(bundle.open(SUMMARY_NAME), "utf-8")))
+        by_id = {row["site_id"]: row for row in rows}
+
+        assert len(rows) == 8 and len(names) == 7
+        assert by_id["BH/2"]["error"] and not by_id["BH/2"]["report"]
+        assert by_id["missing"]["error"] == "Malformed site record."
+        # Case-insensitive duplicates get their own member
+        assert {by_id["BH/0"]["report"], by_id["bh/0"]["report"]} == {"BH_0.xlsx", "bh_0~2.xlsx"}
+
+        for site_id, site in data:
+            row = by_id[site_id]
+            if not row["report"]:
+                continue
+            expected = calculate_site_class(site)
+            assert row["site_class"] == expected["site_class"]
+            assert float(row["weighted_vs"]) == pytest.approx(expected["weighted_vs"])
+            load_workbook(io.BytesIO(bundle.read(row["report"])), read_only=True)
+
+
+def test_member_names_are_portable():
+    used = set()
+    assert _member_name("  .hidden. ", used) == "hidden.xlsx"
+    assert _member_name("", used) == "site.xlsx"
+    assert _member_name('a<b>c|d?"e*', used) == "a_b_c_d__e_.xlsx"
+    assert len(_member_name("x" * 500, used)) == 120 + len(".xlsx")
+
+
+def test_bundle_file_is_removed_with_its_owner(tmp_path):
+    bundle = BundleFile(str(tmp_path))
+    path = bundle.path
+    with open(path, "wb") as f:
+        f.write(b"zip")
+    assert bundle.read() == b"zip"
+
+    del bundle
+    gc.collect()
+    assert not os.path.exists(path)
+
+    other = BundleFile(str(tmp_path))
+    other.discard()
+    assert not other.exists()
+    other.discard()
+
+
+def test_sweep_keeps_the_newest(tmp_path):
+    now = time.time()
+    for k in range(5):
+        path = tmp_path / f"{k}.zip"
+        path.write_bytes(b"")
+        os.utime(path, (now - k * 60, now - k * 60))
+    (tmp_path / "old.zip").write_bytes(b"")
+    os.utime(tmp_path / "old.zip", (now - 10 * 86400,) * 2)
+    (tmp_path / "keep.txt").write_bytes(b"")
+
+    assert sweep_bundles(str(tmp_path), max_files=3) == 3
+    assert sorted(os.listdir(tmp_path)) == ["0.zip", "1.zip", "2.zip", "keep.txt"]
+
+    # Each new bundle makes room for itself
+    bundle = BundleFile(str(tmp_path), max_files=3)
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".zip")]) == 3
+    bundle.discard()
+
+    assert sweep_bundles(str(tmp_path / "nowhere")) == 0
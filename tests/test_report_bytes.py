@@ -0,0 +1,40 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from openpyxl import load_workbook
+
+from backend import calculate_site_class
+from conftest import random_sites
+from report_generator import generate_site_class_report, render_site_class_report_openpyxl
+
+
+def sheet(data):
+    return load_workbook(io.BytesIO(data))["Site Class Report"]
+
+
+def test_report_holds_the_result():
+    site = random_sites(1, 5, seed=3)[0]
+    result = calculate_site_class(site)
+    ws = sheet(render_site_class_report_openpyxl(site, result))
+
+    assert ws["N3"].value == round(result["weighted_vs"], 3)
+    assert ws["G4"].value == result["site_class"]
+    assert ws["H7"].value == site["depth_of_influence"]
+
+
+def test_renders_in_parallel_threads():
+    sites = random_sites(8, 4, seed=5)
+    results = [calculate_site_class(site) for site in sites]
+
+    with ThreadPoolExecutor(4) as pool:
+        reports = list(pool.map(render_site_class_report_openpyxl, sites, results))
+
+    for report, result in zip(reports, results):
+        assert sheet(report)["N3"].value == round(result["weighted_vs"], 3)
+
+
+def test_generate_writes_the_file(tmp_path):
+    site = random_sites(1, 3)[0]
+    path = tmp_path / "report.xlsx"
+    assert generate_site_class_report(site, calculate_site_class(site), str(path)) == str(path)
+    assert sheet(path.read_bytes())["G4"].value
@@ -0,0 +1,79 @@
+import io
+import zipfile
+
+import pytest
+from openpyxl import load_workbook
+
+from backend import calculate_site_class
+from code_editions import EDITIONS, get_edition
+from conftest import layer, random_sites
+from report_compiler import MODIFIED_RE, compile_report, precompile_layouts, render_compiled
+from report_generator import TEMPLATE_LAYER_ROWS, render_site_class_report_openpyxl
+
+
+def cells(data):
+    wb = load_workbook(io.BytesIO(data))
+    out = {}
+    for ws in wb.worksheets:
+        out[ws.title] = sorted(str(r) for r in ws.merged_cells.ranges)
+        for row in ws.iter_rows():
+            for cell in row:
+                if cell.value is not None or cell.has_style:
+                    out[ws.title, cell.coordinate] = (
+                        cell.value, cell.number_format, repr(cell.font), repr(cell.fill),
+                        repr(cell.border), repr(cell.alignment), repr(cell.protection),
+                    )
+    return out
+
+
+def parts(data):
+    # Every package part, with the save time taken out
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {
+            info.filename: MODIFIED_RE.sub(rb"\1\2", archive.read(info))
+            for info in archive.infolist()
+        }
+
+
+def assert_same_report(compiled, reference):
+    assert compiled is not None
+    assert parts(compiled) == parts(reference)
+    assert cells(compiled) == cells(reference)
+
+
+@pytest.mark.parametrize("edition", list(EDITIONS))
+def test_compiled_matches_openpyxl(edition):
+    for site in random_sites(2, 12, seed=36, min_thickness=30.0):
+        result = calculate_site_class(site, edition)
+        assert_same_report(render_compiled(site, result, edition),
+                           render_site_class_report_openpyxl(site, result, edition))
+
+
+def test_text_is_escaped():
+    site = {"depth_of_influence": 4.0, "layers": [
+        layer(1, 2.0, soil_type='Peat & "<soft>"', fines="<15%", vsi=120.0),
+        layer(2, 2.0, soil_type="Dry Sands", fines="Yes", n1=25),
+    ]}
+    result = calculate_site_class(site)
+    assert_same_report(render_compiled(site, result),
+                       render_site_class_report_openpyxl(site, result))
+
+
+def test_falls_back_when_the_layout_does_not_fit():
+    site = random_sites(1, TEMPLATE_LAYER_ROWS + 1, seed=37)[0]
+    site["depth_of_influence"] = sum(row["thickness"] for row in site["layers"])
+    assert render_compiled(site, calculate_site_class(site)) is None
+
+    # An edition that is not the registered one under its key
+    custom = dict(get_edition(), correlation={**get_edition()["correlation"], "coefficient": 100})
+    site = random_sites(1, 4, seed=38)[0]
+    assert render_compiled(site, calculate_site_class(site, custom), custom) is None
+
+
+def test_precompile_covers_every_class():
+    classes = EDITIONS["asce7_16"]["classes"]
+    assert precompile_layouts(["asce7_16"], max_layers=2) == 2 * len(classes)
+    before = compile_report.cache_info().hits
+    site = {"depth_of_influence": 30.0, "layers": [layer(1, 15.0, n1=20), layer(2, 15.0, n1=40)]}
+    render_compiled(site, calculate_site_class(site, "asce7_16"), "asce7_16")
+    assert compile_report.cache_info().hits == before + 1
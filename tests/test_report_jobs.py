@@ -0,0 +1,103 @@
+import io
+import threading
+
+import pytest
+from openpyxl import load_workbook
+
+import report_jobs
+from backend import calculate_site_class
+from conftest import random_sites
+from report_jobs import DONE, FAILED, UNKNOWN, ReportJobs
+from result_cache import shared_cache
+
+
+@pytest.fixture
+def jobs():
+    shared_cache.clear()
+    jobs = ReportJobs(workers=1)
+    yield jobs
+    jobs.shutdown()
+    shared_cache.clear()
+
+
+def test_same_inputs_share_one_job(jobs):
+    site = random_sites(1, 4, seed=21)[0]
+    result = calculate_site_class(site)
+
+    job_id = jobs.submit(site, result)
+    assert jobs.submit(dict(site), result) == job_id
+
+    report = jobs.result(job_id, timeout=30)
+    assert jobs.status(job_id) == DONE
+    assert load_workbook(io.BytesIO(report), read_only=True).sheetnames
+    assert jobs.report_bytes(site, result, job_id=job_id) is report
+
+    # Once cached, a fresh queue serves the bytes without rendering
+    other = ReportJobs()
+    assert other.result(other.submit(site, result)) == report
+
+
+def test_failed_job_is_rendered_again_after_discard(jobs, monkeypatch):
+    site = random_sites(1, 4, seed=22)[0]
+    result = calculate_site_class(site)
+
+    def broken(*args):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(report_jobs, "_render", broken)
+    job_id = jobs.submit(site, result)
+    with pytest.raises(RuntimeError):
+        jobs.result(job_id, timeout=30)
+    assert jobs.status(job_id) == FAILED
+
+    monkeypatch.undo()
+    error = jobs.discard(job_id)
+    assert isinstance(error, RuntimeError)
+    assert jobs.status(job_id) == UNKNOWN
+
+    retry = jobs.submit(site, result)
+    assert retry != job_id
+    assert jobs.result(retry, timeout=30)
+    assert jobs.status(retry) == DONE
+
+
+def test_queued_job_renders_on_the_caller(jobs, monkeypatch):
+    gate = threading.Event()
+    render = report_jobs._render
+
+    def slow(*args):
+        gate.wait(30)
+        return render(*args)
+
+    monkeypatch.setattr(report_jobs, "_render", slow)
+    first, second = random_sites(2, 3, seed=23)
+    busy = jobs.submit(first, calculate_site_class(first))
+    queued = jobs.submit(second, calculate_site_class(second))
+
+    # The only worker is blocked, so this renders here
+    monkeypatch.setattr(report_jobs, "_render", render)
+    assert jobs.result(queued, timeout=30)
+    assert jobs.status(queued) == DONE
+
+    gate.set()
+    assert jobs.result(busy, timeout=30)
+
+
+def test_unknown_jobs(jobs):
+    assert jobs.status("missing") == UNKNOWN
+    assert jobs.discard("missing") is None
+    with pytest.raises(KeyError):
+        jobs.result("missing")
+
+
+def test_oldest_finished_jobs_are_evicted():
+    shared_cache.clear()
+    jobs = ReportJobs(workers=1, max_jobs=2)
+    ids = []
+    for site in random_sites(3, 3, seed=39):
+        ids.append(jobs.submit(site, calculate_site_class(site)))
+        jobs.result(ids[-1], timeout=30)
+
+    assert [jobs.status(job_id) for job_id in ids] == [UNKNOWN, DONE, DONE]
+    jobs.shutdown()
+    shared_cache.clear()
@@ -0,0 +1,32 @@
+import os
+
+from backend import calculate_site_class
+from conftest import layer
+from report_compiler import compile_report, render_compiled
+from report_generator import TEMPLATE_PATH, build_formula_text, load_template
+
+
+def test_template_copies_are_independent():
+    first = load_template()
+    first["Site Class Report"]["N3"] = "changed"
+
+    second = load_template()
+    assert second["Site Class Report"]["N3"].value != "changed"
+
+
+def test_template_found_from_any_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert os.path.isabs(TEMPLATE_PATH)
+    assert "Site Class Report" in load_template().sheetnames
+
+    # The compiled layouts come from the same template file
+    compile_report.cache_clear()
+    site = {"depth_of_influence": 3.0, "layers": [layer(1, 3.0)]}
+    assert render_compiled(site, calculate_site_class(site)).startswith(b"PK")
+
+
+def test_formula_text():
+    row = {"soil_type": "Dry Sands", "n1": 20, "fines": "Yes"}
+    assert build_formula_text(row) == "80[(N₁)₆₀ᵢ]⁰·⁵"
+    assert build_formula_text(dict(row, n1=9)) == "NA"
+    assert build_formula_text(dict(row, soil_type="Others")) == "NA"
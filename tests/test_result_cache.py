@@ -0,0 +1,53 @@
+import copy
+
+from conftest import random_sites
+from result_cache import ResultCache, canonical_site_key
+from result_store import ResultStore
+
+
+def test_key_ignores_float_noise_and_extra_fields():
+    site = random_sites(1, 3)[0]
+    noisy = copy.deepcopy(site)
+    noisy["layers"][0]["thickness"] += 1e-12
+    noisy["num_layers"] = 99
+
+    assert canonical_site_key(noisy) == canonical_site_key(site)
+
+    changed = copy.deepcopy(site)
+    changed["layers"][0]["vsi"] += 1
+    assert canonical_site_key(changed) != canonical_site_key(site)
+
+
+def test_lru_eviction_and_stats():
+    cache = ResultCache(maxsize=2)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == ({"v": 1}, None)
+    cache.put("c", {"v": 3})
+
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_get_or_compute_adds_the_report_later():
+    cache = ResultCache()
+    site = random_sites(1, 3)[0]
+
+    result, report = cache.get_or_compute(site)
+    assert report is None
+    again, report = cache.get_or_compute(site, with_report=True)
+    assert again is result
+    assert report[:2] == b"PK"
+    assert cache.get_or_compute(site, with_report=True)[1] is report
+
+
+def test_misses_fall_through_to_the_store(tmp_path):
+    store = ResultStore(str(tmp_path))
+    site = random_sites(1, 3)[0]
+    result, _ = ResultCache(store=store).get_or_compute(site)
+
+    fresh = ResultCache(store=store)
+    assert fresh.get(canonical_site_key(site))[0] == result
+    store.close()
@@ -0,0 +1,119 @@
+import os
+import time
+
+import pytest
+
+from backend import calculate_site_class
+from conftest import random_sites
+from result_cache import canonical_site_key
+from result_store import BLOB_DIR, ResultStore, _parse_size, iter_warm_start
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "store"))
+    yield store
+    store.close()
+
+
+def entry(site, report=None, site_id=None):
+    return canonical_site_key(site), calculate_site_class(site), report, site, site_id
+
+
+def blob_files(store):
+    return sorted(
+        name for _, _, files in os.walk(os.path.join(store.path, BLOB_DIR)) for name in files
+    )
+
+
+def test_round_trip_across_reopen(store):
+    sites = random_sites(3, 4, seed=24)
+    store.put_many([entry(site, b"xlsx", f"BH{k}") for k, site in enumerate(sites)],
+                   project="P1")
+    store.close()
+
+    again = ResultStore(store.path)
+    key, result, report = again.lookup("P1", "BH1")
+    assert key == canonical_site_key(sites[1])
+    assert result == calculate_site_class(sites[1])
+    assert report == b"xlsx"
+    assert [row["site_id"] for row in again.project_sites("P1")] == ["BH0", "BH1", "BH2"]
+    assert again.lookup("P1", "BH9") is None
+    assert again.get(key, "asce7_16") is None
+    again.close()
+
+
+def test_put_without_report_keeps_the_stored_one(store):
+    site = random_sites(1, 3, seed=25)[0]
+    key = canonical_site_key(site)
+    store.put(key, calculate_site_class(site), b"first", site)
+    store.put(key, calculate_site_class(site))
+    assert store.get(key)[1] == b"first"
+    assert store.stats()["reports"] == 1
+
+
+def test_gc_by_age_then_size(store):
+    sites = random_sites(4, 3, seed=26)
+    for k, site in enumerate(sites):
+        store.put(*entry(site, b"x" * 1000)[:4])
+    keys = [canonical_site_key(site) for site in sites]
+    now = time.time()
+    store._db.execute("UPDATE results SET accessed = ? WHERE input_hash = ?",
+                      (now - 10 * 86400, keys[0]))
+    store._db.execute("UPDATE results SET accessed = ? WHERE input_hash = ?",
+                      (now - 86400, keys[1]))
+
+    out = store.gc(max_age_days=5, grace=0)
+    assert out["removed"] == 1 and store.get(keys[0]) is None
+
+    size = store.stats()["bytes"]
+    out = store.gc(max_bytes=size - 1, grace=0)
+    # The least recently used entry goes first
+    assert out["removed"] == 1 and store.get(keys[1]) is None
+    assert store.get(keys[2]) is not None
+    assert len(blob_files(store)) == 2
+
+
+def test_gc_spares_recent_orphans(store):
+    orphan = os.path.join(store.path, BLOB_DIR, "ab", "orphan.xlsx")
+    os.makedirs(os.path.dirname(orphan))
+    with open(orphan, "wb") as f:
+        f.write(b"x")
+
+    assert store.gc()["orphan_files"] == 0
+    assert os.path.exists(orphan)
+
+    assert store.gc(now=time.time() + 2 * 3600)["orphan_files"] == 1
+    assert not os.path.exists(os.path.dirname(orphan))
+
+
+def test_path_comes_from_the_environment_at_open(tmp_path, monkeypatch):
+    monkeypatch.setenv("SITE_CLASS_STORE", str(tmp_path / "later"))
+    store = ResultStore()
+    assert store.path == str(tmp_path / "later")
+    store.close()
+
+
+def test_warm_start_computes_only_misses(store):
+    sites = random_sites(6, 4, seed=27)
+    calls = []
+
+    def compute(batch):
+        calls.extend(batch)
+        return [calculate_site_class(site) for site in batch]
+
+    records = [(f"S{k}", site) for k, site in enumerate(sites)]
+    first = list(iter_warm_start(records[:4], store, compute, window=3))
+    second = list(iter_warm_start(records, store, compute, project="P", window=3))
+
+    # The second pass computes only the two new sites
+    assert calls == sites
+    assert [site_id for site_id, _ in second] == [f"S{k}" for k in range(6)]
+    assert second[:4] == first
+    assert len(store.project_sites("P")) == 6
+
+
+def test_parse_size():
+    assert _parse_size("512") == 512
+    assert _parse_size("2k") == 2048
+    assert _parse_size("1.5MB") == 3 * 2**19
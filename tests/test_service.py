@@ -0,0 +1,121 @@
+import asyncio
+import io
+import json
+
+import pytest
+from openpyxl import load_workbook
+
+from backend import calculate_site_class
+from code_editions import EDITIONS
+from conftest import layer, random_sites
+from service import INLINE_JSON_BYTES, SiteClassService
+
+
+def call(app, method, path, payload=None, query="", chunk=65536):
+    """
+    Runs one ASGI request; the body is sent in chunks. Returns
+    (status, headers, body bytes).
+    """
+
+    body = b"" if payload is None else (
+        payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    )
+    chunks = [body[i:i + chunk] for i in range(0, len(body), chunk)] or [b""]
+    sent = []
+
+    async def receive():
+        data = chunks.pop(0)
+        return {"type": "http.request", "body": data, "more_body": bool(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode()}
+    asyncio.run(app(scope, receive, send))
+    return (sent[0]["status"], dict(sent[0]["headers"]),
+            b"".join(m.get("body", b"") for m in sent[1:]))
+
+
+@pytest.fixture
+def app():
+    app = SiteClassService(report_workers=1, precompile_reports=False)
+    yield app
+    app.shutdown()
+
+
+def test_health_and_editions(app):
+    assert call(app, "GET", "/health")[2] == b'{"status": "ok"}'
+    status, _, body = call(app, "GET", "/editions")
+    assert status == 200
+    assert [edition["key"] for edition in json.loads(body)] == list(EDITIONS)
+
+
+def test_classify_matches_backend(app):
+    site = random_sites(1, 30, seed=18, min_thickness=30.0)[0]
+    for edition in EDITIONS:
+        status, _, body = call(app, "POST", "/classify", site, f"edition={edition}&breakdown=1")
+        assert status == 200
+        assert json.loads(body) == json.loads(json.dumps(calculate_site_class(site, edition)))
+
+    body = json.loads(call(app, "POST", "/classify", site)[2])
+    assert "breakdown" not in body
+
+
+def test_batch_reports_errors_per_site(app):
+    sites = random_sites(5, 6, seed=19)
+    for k, site in enumerate(sites):
+        site["site_id"] = f"S{k}"
+    sites[2]["layers"][0]["vsi"] = 0.0
+    sites[2]["layers"][0]["soil_type"] = "Others"
+    sites[4]["layers"][0]["n1"] = float("nan")
+
+    status, _, body = call(app, "POST", "/classify/batch", {"sites": sites})
+    results = json.loads(body)
+    assert status == 200
+    assert [r["site_id"] for r in results] == ["S0", "S1", "S2", "S3", "S4"]
+    assert "error" in results[2]
+    assert results[4]["error"] == "Weighted Vs must be a finite number."
+    assert b"NaN" not in body
+    assert results[0]["weighted_vs"] == pytest.approx(calculate_site_class(sites[0])["weighted_vs"])
+
+
+def test_large_bodies_are_read_in_chunks(app):
+    sites = random_sites(400, 10, seed=20)
+    body = json.dumps(sites).encode()
+    assert len(body) > INLINE_JSON_BYTES
+
+    status, _, out = call(app, "POST", "/classify/batch", body, chunk=4096)
+    assert status == 200 and len(json.loads(out)) == 400
+
+
+def test_report_streams_a_workbook(app):
+    site = {"depth_of_influence": 6.0, "layers": [layer(1, 3.0, n1=20), layer(2, 3.0, n1=30)]}
+    status, headers, body = call(app, "POST", "/report", site)
+    assert status == 200
+    assert int(headers[b"content-length"]) == len(body)
+    load_workbook(io.BytesIO(body), read_only=True)
+
+
+@pytest.mark.parametrize("method, path, payload, query, expected", [
+    ("POST", "/classify", b"{bad", "", 400),
+    ("POST", "/classify", [1, 2], "", 400),
+    ("POST", "/classify", {"layers": []}, "", 400),
+    ("POST", "/classify", {}, "edition=no_such_code", 400),
+    ("POST", "/classify/batch", {"no": "sites"}, "", 400),
+    ("GET", "/classify", None, "", 405),
+    ("GET", "/nowhere", None, "", 404),
+])
+def test_bad_requests(app, method, path, payload, query, expected):
+    status, _, body = call(app, method, path, payload, query)
+    assert status == expected
+    assert "error" in json.loads(body)
+
+
+def test_oversized_requests_are_refused():
+    app = SiteClassService(max_body_bytes=1000, max_batch_sites=3,
+                           precompile_reports=False)
+    status, _, body = call(app, "POST", "/classify", b"x" * 2000)
+    assert status == 413 and b"1000 bytes" in body
+    status, _, body = call(app, "POST", "/classify/batch", [{}] * 4)
+    assert status == 413 and b"3 sites" in body
+    app.shutdown()
@@ -0,0 +1,95 @@
+import io
+import json
+
+import pytest
+
+from backend import calculate_site_class
+from conftest import random_sites
+from site_class_cli import classify_stream, main, read_long_csv, read_ndjson
+
+
+def long_csv(sites):
+    lines = ["site_id,depth_of_influence,layer,thickness,soil_type,fines_less_than_15,n1,vsi"]
+    for k, site in enumerate(sites):
+        for row in site["layers"]:
+            lines.append(
+                f"s{k},{site['depth_of_influence']},{row['layer']},{row['thickness']},"
+                f"{row['soil_type']},{row['fines_less_than_15']},{row['n1']},{row['vsi']}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def test_csv_and_ndjson_read_the_same_sites():
+    sites = random_sites(5, 4, seed=6)
+    from_csv = list(read_long_csv(io.StringIO(long_csv(sites))))
+    from_json = list(read_ndjson(io.StringIO(
+        "".join(json.dumps(dict(site, site_id=f"s{k}")) + "\n" for k, site in enumerate(sites))
+    )))
+
+    assert [site_id for site_id, _ in from_csv] == [site_id for site_id, _ in from_json]
+    for (_, a), (_, b) in zip(from_csv, from_json):
+        assert calculate_site_class(a)["weighted_vs"] == calculate_site_class(b)["weighted_vs"]
+
+
+def test_csv_headers_match_the_workbook_importer(tmp_path):
+    from openpyxl import Workbook
+
+    from excel_import import iter_workbook_sites
+
+    text = long_csv(random_sites(3, 4, seed=40)).replace(
+        "site_id,depth_of_influence,layer,thickness,soil_type,fines_less_than_15,n1,vsi",
+        "Borehole,Depth of Influence (m),Layer,Thickness (m),Soil Type,Fines,(N1)60,Vsi [m/s]",
+    )
+    wb = Workbook()
+    for line in text.splitlines():
+        wb.active.append(line.split(","))
+    wb.save(tmp_path / "logs.xlsx")
+
+    from_csv = list(read_long_csv(io.StringIO(text)))
+    assert [site_id for site_id, _ in from_csv] == ["s0", "s1", "s2"]
+    assert from_csv == list(iter_workbook_sites(str(tmp_path / "logs.xlsx")))
+
+
+def test_malformed_lines_become_error_records():
+    records = list(read_ndjson(io.StringIO('{"depth_of_influence": 1}\nnot json\n\n[1]\n')))
+    results = dict(classify_stream(records))
+    assert set(results) == {"1", "2", "4"}
+    assert all("error" in result for result in results.values())
+
+
+def test_csv_without_site_id_is_a_usage_error(tmp_path, capsys):
+    path = tmp_path / "logs.csv"
+    path.write_text("id,depth_of_influence\n1,2\n")
+
+    with pytest.raises(ValueError, match="site_id"):
+        read_long_csv(io.StringIO(path.read_text()))
+    with pytest.raises(SystemExit) as exit:
+        main([str(path)])
+    assert exit.value.code == 2
+    assert "no site_id column" in capsys.readouterr().err
+
+
+def test_xlsx_from_stdin_is_rejected(capsys):
+    with pytest.raises(SystemExit):
+        main(["--format", "xlsx", "-"])
+    assert "xlsx input must be a file" in capsys.readouterr().err
+
+
+def test_report_names_stay_inside_the_directory(tmp_path, monkeypatch, capsys):
+    site = random_sites(1, 3)[0]
+    ids = ["../escape", "book/Sheet1", "a:b", "A:B", "plain"]
+    path = tmp_path / "in.ndjson"
+    path.write_text("".join(json.dumps(dict(site, site_id=i)) + "\n" for i in ids))
+
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    monkeypatch.chdir(run_dir)
+    main([str(path), "--reports", "reports"])
+
+    out = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [row["site_id"] for row in out] == ids
+    assert sorted(p.name for p in run_dir.iterdir()) == ["reports"]
+    # a:b and A:B only differ in case, which some file systems ignore
+    assert sorted(p.name for p in (run_dir / "reports").iterdir()) == [
+        "A_B~2.xlsx", "_escape.xlsx", "a_b.xlsx", "book_Sheet1.xlsx", "plain.xlsx",
+    ]
@@ -0,0 +1,36 @@
+import pytest
+
+from backend import calculate_site_class
+from code_editions import EDITIONS
+from conftest import layer, random_sites
+from site_model import Layer, Site, SiteArray
+
+
+def test_round_trip_keeps_unknown_text():
+    site = random_sites(1, 4, seed=12)[0]
+    site["layers"].append(layer(5, 1.5, soil_type="Gravel", fines="maybe", n1=12.5))
+    site["num_layers"] = 5
+
+    assert Site.from_dict(site).to_dict() == site
+    assert SiteArray.from_sites([site, Site.from_dict(site)]).to_dicts() == [site, site]
+    assert Layer.from_dict(site["layers"][-1]).soil_type == "Gravel"
+
+
+@pytest.mark.parametrize("edition", list(EDITIONS))
+def test_calculate_matches_backend(edition):
+    sites = random_sites(50, 12, seed=13, min_thickness=30.0)
+    array = SiteArray.from_sites(sites)
+    out = array.calculate(edition=edition)
+
+    for k, site in enumerate(sites):
+        expected = calculate_site_class(site, edition)
+        assert Site.from_dict(site).calculate(edition) == expected
+        assert out["weighted_vs"][k] == expected["weighted_vs"]
+
+
+def test_columns_are_views():
+    array = SiteArray.from_sites(random_sites(10, 3))
+    columns = array.columns(2, 5)
+    assert len(columns["depths"]) == 3
+    assert columns["thickness"].base is not None
+    assert columns["offsets"][0] == 0
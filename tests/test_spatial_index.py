@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from backend import calculate_site_class
+from conftest import random_sites
+from spatial_index import BoreholeCatalog, KDTree, summarize_hits
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(28)
+    # Clustered, with duplicates, as borehole grids tend to be
+    x = np.concatenate((rng.uniform(0, 1000, 3000), rng.normal(500, 5, 1000), [250.0] * 20))
+    y = np.concatenate((rng.uniform(0, 1000, 3000), rng.normal(500, 5, 1000), [250.0] * 20))
+    return x, y
+
+
+@pytest.mark.parametrize("leaf_size", [1, 16, 64, 10_000])
+def test_queries_match_brute_force(points, leaf_size):
+    x, y = points
+    tree = KDTree(x, y, leaf_size)
+    rng = np.random.default_rng(leaf_size)
+
+    for px, py in [(250.0, 250.0), (500.0, 500.0), (-50.0, 1200.0), *rng.uniform(0, 1000, (10, 2))]:
+        d = np.hypot(x - px, y - py)
+
+        idx, dist = tree.query_radius(px, py, 40.0)
+        assert sorted(idx) == sorted(np.flatnonzero(d <= 40.0))
+        assert np.all(np.diff(dist) >= 0)
+        assert dist == pytest.approx(d[idx])
+
+        idx, dist = tree.query_nearest(px, py, 7)
+        assert dist == pytest.approx(np.sort(d)[:7])
+        assert dist == pytest.approx(d[idx])
+
+        box = (px - 30, py - 20, px + 30, py + 20)
+        inside = (x >= box[0]) & (x <= box[2]) & (y >= box[1]) & (y <= box[3])
+        assert list(tree.query_box(*box)) == list(np.flatnonzero(inside))
+
+
+def test_small_and_empty_trees():
+    tree = KDTree([1.0, 2.0], [0.0, 0.0])
+    idx, dist = tree.query_nearest(0.0, 0.0, k=10)
+    assert list(idx) == [0, 1] and list(dist) == [1.0, 2.0]
+
+    empty = KDTree([], [])
+    assert len(empty.query_radius(0.0, 0.0, 1.0)[0]) == 0
+    assert len(empty.query_nearest(0.0, 0.0)[0]) == 0
+    with pytest.raises(ValueError, match="finite"):
+        KDTree([0.0, np.nan], [0.0, 0.0])
+
+
+def test_catalog_hits_carry_results():
+    sites = random_sites(20, 5, seed=29)
+    sites[3]["depth_of_influence"] = 1e6
+    records = [(f"BH{k}", float(k), 0.0, site) for k, site in enumerate(sites)]
+    catalog = BoreholeCatalog.from_records(records)
+
+    hits = catalog.nearest(3.2, 0.0, k=3)
+    assert [hit["site_id"] for hit in hits] == ["BH3", "BH4", "BH2"]
+    assert "error" in hits[0]["result"]
+    assert hits[1]["result"] == calculate_site_class(sites[4])
+
+    summary = summarize_hits(hits)
+    assert summary["boreholes"] == 3 and summary["classified"] == 2
+    assert summary["nearest_class"] == hits[1]["result"]["site_class"]
+
+    assert [hit["site_id"] for hit in catalog.in_box(0, -1, 2, 1, with_results=False)] == \
+        ["BH0", "BH1", "BH2"]
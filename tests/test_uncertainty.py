@@ -0,0 +1,38 @@
+import pytest
+
+from backend import calculate_site_class
+from conftest import layer, random_sites
+from uncertainty import simulate_site_class
+
+
+def test_zero_spread_reproduces_the_deterministic_result():
+    site = random_sites(1, 8, seed=14)[0]
+    out = simulate_site_class(site, 500, n1_cov=0, vsi_cov=0, thickness_cov=0,
+                              seed=0, return_samples=True)
+
+    nominal = calculate_site_class(site)
+    assert out["n_valid"] == 500
+    assert out["samples"] == pytest.approx(nominal["weighted_vs"], rel=1e-12)
+    assert out["class_probabilities"][nominal["site_class"]] == 1.0
+    assert out["deterministic"]["site_class"] == nominal["site_class"]
+
+
+def test_seeded_runs_repeat_and_chunking_does_not_matter():
+    site = random_sites(1, 6, seed=15)[0]
+    whole = simulate_site_class(site, 3000, seed=42, return_samples=True)
+    chunked = simulate_site_class(site, 3000, seed=42, return_samples=True, max_chunk_bytes=4096)
+
+    assert chunked["chunk_size"] < whole["chunk_size"]
+    assert sum(whole["class_probabilities"].values()) == pytest.approx(1.0)
+    assert whole["samples"] == pytest.approx(
+        simulate_site_class(site, 3000, seed=42, return_samples=True)["samples"]
+    )
+    assert chunked["vs_mean"] == pytest.approx(whole["vs_mean"], rel=0.05)
+
+
+def test_straddling_site_splits_between_classes():
+    # Vs right on the D/C boundary of 360 m/s
+    site = {"depth_of_influence": 10.0, "layers": [layer(1, 10.0, soil_type="Others", vsi=360.0)]}
+    out = simulate_site_class(site, 20000, vsi_cov=0.1, seed=1)
+    assert 0.3 < out["class_probabilities"]["C"] < 0.7
+    assert 0.3 < out["class_probabilities"]["D"] < 0.7
@@ -0,0 +1,179 @@
+import numpy as np
+
+from backend import calculate_site_class
+from batch_engine import exponent_table
+from code_editions import get_edition
+from site_model import FINES_YES, encode_fines, encode_soil
+
+# Default coefficients of variation, used for every layer
+# unless per-layer values are given
+N1_COV = 0.25
+VSI_COV = 0.15
+THICKNESS_COV = 0.05
+
+PERCENTILES = (5, 16, 50, 84, 95)
+
+# Working memory per chunk. About ten float64 arrays of
+# (samples, layers) are alive at once.
+MAX_CHUNK_BYTES = 64 * 2**20
+_ARRAYS_PER_CHUNK = 10
+
+
+def _per_layer(value, n_layers, name):
+    value = np.broadcast_to(np.asarray(value, dtype=np.float64), (n_layers,))
+    if np.any(value < 0):
+        raise ValueError(f"{name} must not be negative.")
+    return value
+
+
+def _lognormal(rng, mean, cov, n_samples):
+    """
+    Positive samples with the given per-layer mean and COV.
+    Zero means (and zero COVs) stay exact.
+    """
+
+    sigma = np.sqrt(np.log1p(cov ** 2))
+    mu = np.log(np.where(mean > 0, mean, 1.0)) - sigma ** 2 / 2
+
+    samples = np.exp(mu + sigma * rng.standard_normal((n_samples, len(mean))))
+
+    exact = (mean <= 0) | (cov == 0)
+    if exact.any():
+        samples[:, exact] = mean[exact]
+    return samples
+
+
+def _sample_chunk(rng, n_samples, depth, thickness, n1, user_vsi, exponent,
+                  correlated, coefficient, covs):
+    """
+    Weighted Vs for one chunk of samples, shape (n_samples,).
+    Follows compute_weighted_vs: per-layer Vsi, then the harmonic
+    average of the layers truncated at the depth of influence.
+    """
+
+    n1_cov, vsi_cov, thickness_cov = covs
+
+    t = _lognormal(rng, thickness, thickness_cov, n_samples)
+
+    # The profile is taken to continue in the last layer's material,
+    # so thinner samples still reach the depth of influence
+    above = t[:, :-1].sum(axis=1)
+    np.maximum(t[:, -1], depth - above, out=t[:, -1])
+
+    vsi = _lognormal(rng, user_vsi, vsi_cov, n_samples)
+    if correlated.any():
+        n1_samples = _lognormal(rng, n1[correlated], n1_cov[correlated], n_samples)
+        vsi[:, correlated] = coefficient * n1_samples ** exponent[correlated]
+
+    top = np.cumsum(t, axis=1)
+    top -= t
+    ti = np.clip(depth - top, 0.0, t)
+
+    # Layers below the depth of influence add nothing, even
+    # if they have no valid Vsi
+    ratio = np.zeros_like(ti)
+    with np.errstate(divide="ignore"):
+        np.divide(ti, vsi, out=ratio, where=ti > 0)
+        return ti.sum(axis=1) / ratio.sum(axis=1)
+
+
+def simulate_site_class(site_data, n_samples=100_000, n1_cov=N1_COV,
+                        vsi_cov=VSI_COV, thickness_cov=THICKNESS_COV,
+                        seed=None, max_chunk_bytes=MAX_CHUNK_BYTES,
+                        percentiles=PERCENTILES, return_samples=False,
+                        edition=None):
+    """
+    Monte Carlo site class under uncertain N1, user Vsi and layer
+    thickness. Each is sampled per layer from a lognormal with the
+    layer's input as mean; the COVs are scalars or per-layer
+    sequences. Whether a layer uses the N1 correlation or its user
+    Vsi is fixed by its nominal inputs, as compute_layer_vsi
+    decides it, so N1 noise only moves correlated Vsi values.
+
+    Samples are drawn in chunks sized to max_chunk_bytes.
+    The correlation, classes and averaging depth are those of the
+    code edition. Returns class probabilities, Vs statistics and
+    the deterministic result, plus the samples if asked.
+    """
+
+    edition = get_edition(edition)
+    correlation = edition["correlation"]
+
+    # Deterministic run first: raises the usual ValueErrors
+    nominal = calculate_site_class(site_data, edition)
+
+    layers = site_data["layers"]
+    n_layers = len(layers)
+    depth = float(site_data["depth_of_influence"])
+    if edition["depth"] is not None:
+        depth = float(edition["depth"])
+
+    thickness = np.array([layer["thickness"] for layer in layers], dtype=np.float64)
+    n1 = np.array([layer["n1"] for layer in layers], dtype=np.float64)
+    user_vsi = np.array([layer["vsi"] for layer in layers], dtype=np.float64)
+
+    soil = np.array([encode_soil(layer["soil_type"]) for layer in layers])
+    fines = np.array([
+        encode_fines(layer["fines_less_than_15"]) == FINES_YES for layer in layers
+    ])
+    exponent = exponent_table(correlation).ravel()[soil * 2 + fines]
+    correlated = ~np.isnan(exponent) & (n1 >= correlation["n1_min"])
+
+    covs = (
+        _per_layer(n1_cov, n_layers, "n1_cov"),
+        _per_layer(vsi_cov, n_layers, "vsi_cov"),
+        _per_layer(thickness_cov, n_layers, "thickness_cov"),
+    )
+
+    chunk = max_chunk_bytes // (8 * _ARRAYS_PER_CHUNK * n_layers)
+    chunk = int(max(1, min(chunk, n_samples)))
+
+    rng = np.random.default_rng(seed)
+    weighted_vs = np.empty(n_samples)
+
+    for start in range(0, n_samples, chunk):
+        stop = min(start + chunk, n_samples)
+        weighted_vs[start:stop] = _sample_chunk(
+            rng, stop - start, depth, thickness, n1, user_vsi, exponent,
+            correlated, correlation["coefficient"], covs
+        )
+
+    # Samples can only fail when thicker upper layers pull a
+    # layer without a valid Vsi above the depth of influence
+    valid = np.isfinite(weighted_vs) & (weighted_vs > 0)
+    vs = weighted_vs[valid]
+    n_valid = len(vs)
+
+    labels = edition["classes"]
+    counts = np.bincount(
+        np.searchsorted(edition["thresholds"], vs, side="right"),
+        minlength=len(labels)
+    )
+
+    result = {
+        "n_samples": n_samples,
+        "n_valid": n_valid,
+        "chunk_size": chunk,
+        "class_probabilities": {
+            str(label): float(count / n_valid) if n_valid else 0.0
+            for label, count in zip(labels[::-1], counts[::-1])
+        },
+        "vs_mean": float(vs.mean()) if n_valid else float("nan"),
+        "vs_std": float(vs.std()) if n_valid else float("nan"),
+        "vs_percentiles": {
+            p: float(v) for p, v in zip(
+                percentiles,
+                np.percentile(vs, percentiles) if n_valid
+                else [float("nan")] * len(percentiles)
+            )
+        },
+        "deterministic": {
+            "weighted_vs": nominal["weighted_vs"],
+            "site_class": nominal["site_class"],
+        },
+    }
+
+    if return_samples:
+        result["samples"] = weighted_vs
+
+    return result